@@ -18,21 +18,29 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import print_function
+from __future__ import absolute_import, print_function
 
 import six
 import copy
+import io
+import json
 import re
+import sys
+
+import dns.exception
+import dns.rdatatype
+import dns.zone
 
 from ipaclient.frontend import MethodOverride
-from ipalib import errors
+from ipalib import errors, messages, output
 from ipalib.dns import (get_record_rrtype,
                         has_cli_options,
                         iterate_rrparams_by_parts,
                         part_name_format,
                         record_name_format)
-from ipalib.frontend import Command
-from ipalib.parameters import Bool, Str
+from ipalib.frontend import Command, Local
+from ipalib.parameters import (Bool, DNSNameParam, File, Int, Str,
+                               StrEnum)
 from ipalib.plugable import Registry
 from ipalib import _, ngettext
 from ipalib import util
@@ -48,6 +56,12 @@ _top_record_types = ('A', 'AAAA', )
 _rev_top_record_types = ('PTR', )
 _zone_top_record_types = ('NS', 'MX', 'LOC', )
 
+# number of records sent to the server by one dnsrecord_import call
+DNSRECORD_IMPORT_BATCH_SIZE = 1000
+
+# number of DNS names retrieved by one dnsrecord_find call of dnsrecord_export
+DNSRECORD_EXPORT_PAGE_SIZE = 1000
+
 
 def __get_part_param(rrtype, cmd, part, output_kw, default=None):
     name = part_name_format % (rrtype.lower(), part.name)
@@ -381,6 +395,285 @@ class dnsrecord_del(MethodOverride):
                 kw[param.name] = tuple(deleted_values)
 
 
+def zone_file_records(text, zone):
+    """
+    Convert zone file ``text`` of ``zone`` to records in
+    "NAME TTL CLASS TYPE DATA" format accepted by dnsrecord_import
+
+    SOA records are skipped, the zone in IPA already has its own.
+    """
+    try:
+        zone_data = dns.zone.from_text(
+            text, origin=zone.make_absolute(), relativize=False,
+            check_origin=False)
+    except dns.exception.DNSException as e:
+        raise errors.ValidationError(name='file', error=unicode(e))
+
+    records = []
+    for name in sorted(zone_data.nodes):
+        for rdataset in zone_data.nodes[name]:
+            if rdataset.rdtype == dns.rdatatype.SOA:
+                continue
+            rrtype = dns.rdatatype.to_text(rdataset.rdtype)
+            for rdata in rdataset:
+                records.append(u'%s %d IN %s %s' % (
+                    name.to_text(), rdataset.ttl, rrtype,
+                    rdata.to_text(relativize=False)))
+    return records
+
+
+def _import_batches(records, size=DNSRECORD_IMPORT_BATCH_SIZE):
+    """
+    Split records into batches of about ``size`` records without splitting
+    adjacent records of the same name
+    """
+    batch = []
+    for record in records:
+        if (len(batch) >= size and
+                record.split(None, 1)[0] != batch[-1].split(None, 1)[0]):
+            yield batch
+            batch = []
+        batch.append(record)
+    if batch:
+        yield batch
+
+
+@register(override=True, no_fail=True)
+class dnsrecord_import(MethodOverride):
+    takes_args = (
+        File('file?',
+             label=_('Zone file'),
+             doc=_('File to load DNS records in zone file format from'),
+             include='cli',
+        ),
+    )
+
+    def get_args(self):
+        for arg in super(dnsrecord_import, self).get_args():
+            if arg.name != 'records' or self.api.env.context != 'cli':
+                yield arg
+
+    def get_options(self):
+        for arg in super(dnsrecord_import, self).get_args():
+            if arg.name == 'records' and self.api.env.context == 'cli':
+                yield arg.clone(required=False)
+        for option in super(dnsrecord_import, self).get_options():
+            yield option
+
+    def forward(self, *args, **options):
+        if self.api.env.context == 'cli':
+            if len(args) > 1 and 'records' in options:
+                raise errors.MutuallyExclusiveError(
+                    reason=_("cannot specify both records and file"))
+            if len(args) > 1:
+                records = zone_file_records(args[1], args[0])
+                if not records:
+                    raise errors.ValidationError(
+                        name='file',
+                        error=_('no DNS records found in the file'))
+                args = (args[0], records)
+            elif 'records' in options:
+                args = (args[0], options.pop('records'))
+            else:
+                raise errors.RequirementError(name='file')
+
+        # import in batches to keep the calls within the HTTP timeout
+        zone, records = args
+        result = dict(completed=0, failed={'dnsrecord': []})
+        for batch in _import_batches(records):
+            res = super(dnsrecord_import, self).forward(
+                zone, batch, **options)
+            result['completed'] += res['completed']
+            result['failed']['dnsrecord'].extend(res['failed']['dnsrecord'])
+            if 'messages' in res:
+                result.setdefault('messages', []).extend(res['messages'])
+        return result
+
+
+def _export_records(zone, entry):
+    """
+    Get (name, ttl, type, data) of records of raw ``entry`` returned by
+    dnsrecord_find in ``zone``
+
+    ``name`` is relative to the zone, ``ttl`` is None if the record has
+    no TTL of its own.
+    """
+    entry = {attr.lower(): value for attr, value in entry.items()}
+    name = entry['idnsname'][0]
+    if name in (u'', u'@'):
+        name = DNSName.empty
+    else:
+        name = DNSName(name)
+        if name.is_absolute():
+            name = name.relativize(zone)
+    ttl = entry.get('dnsttl')
+    if ttl:
+        ttl = int(ttl[0])
+    else:
+        ttl = None
+
+    for attr in sorted(entry):
+        rrtype = get_record_rrtype(attr)
+        if rrtype is None:
+            continue
+        for data in entry[attr]:
+            yield name, ttl, rrtype, data
+
+
+def _export_soa_record(zone):
+    """
+    Get (name, ttl, type, data) of SOA record of raw ``zone`` entry
+    returned by dnszone_show
+    """
+    zone = {attr.lower(): value[0] for attr, value in zone.items()}
+    data = u' '.join(
+        unicode(zone[attr]) for attr in (
+            'idnssoamname', 'idnssoarname', 'idnssoaserial',
+            'idnssoarefresh', 'idnssoaretry', 'idnssoaexpire',
+            'idnssoaminimum'))
+    return DNSName.empty, None, u'SOA', data
+
+
+def format_zone_file_record(name, ttl, rrtype, data):
+    """
+    Format record as a zone file line relative to the zone origin
+    """
+    return u'%s\t%s\tIN\t%s\t%s\n' % (
+        name.to_text(), u'' if ttl is None else ttl, rrtype, data)
+
+
+def format_json_record(zone, default_ttl, name, ttl, rrtype, data):
+    """
+    Format record as a JSON object on a single line
+    """
+    return u'%s\n' % json.dumps(dict(
+        name=name.derelativize(zone).ToASCII(),
+        ttl=default_ttl if ttl is None else ttl,
+        type=rrtype,
+        data=data,
+    ), sort_keys=True)
+
+
+@register()
+class dnsrecord_export(Local):
+    __doc__ = _('Export DNS resource records of a zone.')
+
+    takes_args = (
+        DNSNameParam(
+            'dnszoneidnsname',
+            cli_name='dnszone',
+            label=_('Zone name'),
+            only_absolute=True,
+        ),
+    )
+
+    takes_options = (
+        StrEnum(
+            'format?',
+            label=_('Format'),
+            doc=_('Output format, zone file or JSON object per line'),
+            values=(u'zone', u'jsonl'),
+            default=u'zone',
+            autofill=True,
+        ),
+        Str(
+            'out?',
+            doc=_('File to store the records in, standard output if not '
+                  'specified'),
+        ),
+        Int(
+            'page_size?',
+            label=_('Page size'),
+            doc=_('Number of DNS names to retrieve in one request'),
+            minvalue=1,
+            default=DNSRECORD_EXPORT_PAGE_SIZE,
+            autofill=True,
+        ),
+    )
+
+    has_output = (
+        output.summary,
+        output.Output(
+            'count',
+            type=int,
+            doc=_('Number of exported records'),
+            flags=['no_display'],
+        ),
+    )
+
+    def execute(self, *args, **options):
+        zone = args[0].make_absolute()
+        out = options.get('out')
+        if out is not None:
+            util.check_writable_file(out)
+
+        if self.api.env.in_server:
+            backend = self.api.Backend.ldap2
+        else:
+            backend = self.api.Backend.rpcclient
+        if not backend.isconnected():
+            backend.connect()
+
+        zone_entry = self.api.Command.dnszone_show(
+            zone, all=True, raw=True)['result']
+        zone_attrs = {attr.lower(): value[0]
+                      for attr, value in zone_entry.items()}
+        default_ttl = int(zone_attrs.get('dnsdefaultttl',
+                                         zone_attrs['idnssoaminimum']))
+
+        if options['format'] == u'jsonl':
+            def format_record(record):
+                return format_json_record(zone, default_ttl, *record)
+        else:
+            def format_record(record):
+                return format_zone_file_record(*record)
+
+        if out is not None:
+            f = io.open(out, 'w', encoding='utf-8')
+        else:
+            f = sys.stdout
+
+        count = 0
+        try:
+            if options['format'] == u'zone':
+                f.write(u'$ORIGIN %s\n' % zone.ToASCII())
+                f.write(u'$TTL %d\n' % default_ttl)
+            f.write(format_record(_export_soa_record(zone_entry)))
+            count += 1
+
+            # walk the zone page by page, only one page of records is kept
+            # in memory at a time
+            search_options = dict(all=True, raw=True,
+                                  page_size=options['page_size'])
+            while True:
+                result = self.api.Command.dnsrecord_find(
+                    zone, **search_options)
+                for entry in result['result']:
+                    for record in _export_records(zone, entry):
+                        f.write(format_record(record))
+                        count += 1
+                f.flush()
+
+                cursor = None
+                for message in result.get('messages', ()):
+                    if message['code'] == messages.SearchResultPaged.errno:
+                        cursor = message['data']['cursor']
+                if cursor is None:
+                    break
+                search_options['cursor'] = cursor
+        finally:
+            if out is not None:
+                f.close()
+
+        if out is not None:
+            summary = ngettext('Exported %(count)d record to %(out)s',
+                               'Exported %(count)d records to %(out)s',
+                               count) % dict(count=count, out=out)
+        else:
+            summary = None
+        return dict(summary=summary, count=count)
+
+
 @register(override=True, no_fail=True)
 class dnsconfig_mod(MethodOverride):
     def interactive_prompt_callback(self, kw):
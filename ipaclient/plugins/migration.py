@@ -71,6 +71,13 @@ can use their Kerberos accounts.''')
                 result['failed'][ldap_obj_name], attr_order=self.migrate_order,
                 one_value_per_line=True,
             )
+        for ldap_obj_name in self.migrate_order:
+            stats = result.get('stats', {}).get(ldap_obj_name)
+            if stats:
+                textui.print_plain(
+                    'Processed %ss: %d (%d skipped), %.1f per second' % (
+                        ldap_obj_name, stats['processed'], stats['skipped'],
+                        stats['rate']))
         textui.print_plain('-' * len(self.name))
         if not any_migrated:
             textui.print_plain('No users/groups were migrated from %s' %
@@ -5,6 +5,7 @@
 import errno
 import json
 import logging
+import marshal
 import os
 import sys
 import tempfile
@@ -22,6 +23,7 @@ from ipalib.errors import SchemaUpToDate
 from ipalib.frontend import Object
 from ipalib.output import Output
 from ipalib.parameters import DefaultFrom, Flag, Password, Str
+from ipalib.util import classproperty
 from ipapython import ipautil
 from ipapython.ipautil import fsdecode
 from ipapython.dn import DN
@@ -36,7 +38,7 @@ else:
 
 logger = logging.getLogger(__name__)
 
-FORMAT = '1'
+FORMAT = '2'
 
 if six.PY3:
     unicode = str
@@ -77,11 +79,49 @@ def json_default(obj):
     raise TypeError
 
 
-class _SchemaCommand(ClientCommand):
+def _json_loads(data):
+    return json.loads(data.decode('utf-8'))
+
+
+class _LazySchemaPlugin(object):
+    """
+    Plugin class created from the help of a schema member.
+
+    Params and outputs are created from the full schema of the member when
+    the plugin is finalized, so that only the schema of plugins which are
+    actually used is decoded.
+    """
+    _schema_plugin = None
+
+    @classmethod
+    def __doc_getter(cls):
+        if cls._schema_plugin is None:
+            return cls.__doc__
+        return cls._schema_plugin.doc
+
+    doc = classproperty(__doc_getter)
+
+    @classmethod
+    def __summary_getter(cls):
+        if cls._schema_plugin is None:
+            return None
+        return cls._schema_plugin.summary
+
+    summary = classproperty(__summary_getter)
+
+    def _on_finalize(self):
+        attributes = self._schema_plugin.get_attributes(self.api)
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+        super(_LazySchemaPlugin, self)._on_finalize()
+
+
+class _SchemaCommand(_LazySchemaPlugin, ClientCommand):
     pass
 
 
-class _SchemaMethod(ClientMethod):
+class _SchemaMethod(_LazySchemaPlugin, ClientMethod):
     @property
     def obj_name(self):
         return self.api.Object[self.obj_full_name].name
@@ -91,7 +131,7 @@ class _SchemaMethod(ClientMethod):
         return self.api.Object[self.obj_full_name].version
 
 
-class _SchemaObject(Object):
+class _SchemaObject(_LazySchemaPlugin, Object):
     pass
 
 
@@ -104,28 +144,23 @@ class _SchemaPlugin(object):
         self.full_name = full_name
         self._schema = schema
         self._class = None
+        self._attributes = None
 
     @property
     def doc(self):
-        if self._class is not None:
-            return self._class.doc
-        else:
-            schema = self._schema[self.schema_key][self.full_name]
-            try:
-                return schema['doc']
-            except KeyError:
-                return None
+        schema = self._schema[self.schema_key][self.full_name]
+        try:
+            return schema['doc']
+        except KeyError:
+            return None
 
     @property
     def summary(self):
-        if self._class is not None:
-            return self._class.summary
-        else:
-            halp = self._schema[self.schema_key].get_help(self.full_name)
-            try:
-                return halp['summary']
-            except KeyError:
-                return u'<%s>' % self.full_name
+        halp = self._schema[self.schema_key].get_help(self.full_name)
+        try:
+            return halp['summary']
+        except KeyError:
+            return u'<%s>' % self.full_name
 
     def _create_default_from(self, api, name, keys):
         cmd_name = self.full_name
@@ -214,28 +249,42 @@ class _SchemaPlugin(object):
 
         return param
 
-    def _create_class(self, api, schema):
+    def _create_class(self, api, halp):
         class_dict = {}
 
-        class_dict['name'] = str(schema['name'])
-        class_dict['version'] = str(schema['version'])
-        class_dict['full_name'] = str(schema['full_name'])
-        if 'doc' in schema:
-            class_dict['doc'] = schema['doc']
-        if 'topic_topic' in schema:
-            class_dict['topic'] = str(schema['topic_topic']).partition('/')[0]
+        class_dict['name'] = str(halp['name'])
+        class_dict['version'] = self.version
+        class_dict['full_name'] = self.full_name
+        if 'topic_topic' in halp:
+            class_dict['topic'] = str(halp['topic_topic']).partition('/')[0]
         else:
             class_dict['topic'] = None
-
-        class_dict['takes_params'] = tuple(self._create_param(api, s)
-                                           for s in schema.get('params', []))
+        class_dict['_schema_plugin'] = self
 
         return self.name, self.bases, class_dict
 
+    def _create_attributes(self, api, schema):
+        attributes = {}
+
+        attributes['takes_params'] = tuple(
+            self._create_param(api, s) for s in schema.get('params', []))
+
+        return attributes
+
+    def get_attributes(self, api):
+        """
+        Get attributes of the plugin created from the full schema.
+        """
+        if self._attributes is None:
+            schema = self._schema[self.schema_key][self.full_name]
+            self._attributes = self._create_attributes(api, schema)
+
+        return self._attributes
+
     def __call__(self, api):
         if self._class is None:
-            schema = self._schema[self.schema_key][self.full_name]
-            name, bases, class_dict = self._create_class(api, schema)
+            halp = self._schema[self.schema_key].get_help(self.full_name)
+            name, bases, class_dict = self._create_class(api, halp)
             self._class = type(name, bases, class_dict)
 
         return self._class(api)
@@ -247,22 +296,16 @@ class _SchemaCommandPlugin(_SchemaPlugin):
 
     @property
     def topic(self):
-        if self._class is not None:
-            return self._class.topic
-        else:
-            halp = self._schema[self.schema_key].get_help(self.full_name)
-            try:
-                return str(halp['topic_topic']).partition('/')[0]
-            except KeyError:
-                return None
+        halp = self._schema[self.schema_key].get_help(self.full_name)
+        try:
+            return str(halp['topic_topic']).partition('/')[0]
+        except KeyError:
+            return None
 
     @property
     def NO_CLI(self):
-        if self._class is not None:
-            return self._class.NO_CLI
-        else:
-            halp = self._schema[self.schema_key].get_help(self.full_name)
-            return 'cli' in halp.get('exclude', [])
+        halp = self._schema[self.schema_key].get_help(self.full_name)
+        return 'cli' in halp.get('exclude', [])
 
     def _create_output(self, api, schema):
         if schema.get('multivalue', False):
@@ -289,32 +332,38 @@ class _SchemaCommandPlugin(_SchemaPlugin):
 
         return Output(str(schema['name']), **kwargs)
 
-    def _create_class(self, api, schema):
+    def _create_class(self, api, halp):
         name, bases, class_dict = (
-            super(_SchemaCommandPlugin, self)._create_class(api, schema))
+            super(_SchemaCommandPlugin, self)._create_class(api, halp))
 
-        if 'obj_class' in schema or 'attr_name' in schema:
+        if 'obj_class' in halp or 'attr_name' in halp:
             bases = (_SchemaMethod,)
 
-        if 'obj_class' in schema:
-            class_dict['obj_full_name'] = str(schema['obj_class'])
-        if 'attr_name' in schema:
-            class_dict['attr_name'] = str(schema['attr_name'])
-        if 'exclude' in schema and u'cli' in schema['exclude']:
+        if 'obj_class' in halp:
+            class_dict['obj_full_name'] = str(halp['obj_class'])
+        if 'attr_name' in halp:
+            class_dict['attr_name'] = str(halp['attr_name'])
+        if 'exclude' in halp and u'cli' in halp['exclude']:
             class_dict['NO_CLI'] = True
 
+        return name, bases, class_dict
+
+    def _create_attributes(self, api, schema):
+        attributes = (
+            super(_SchemaCommandPlugin, self)._create_attributes(api, schema))
+
         args = set(str(s['name']) for s in schema['params']
                    if s.get('positional', s.get('required', True)))
-        class_dict['takes_args'] = tuple(
-            p for p in class_dict['takes_params'] if p.name in args)
-        class_dict['takes_options'] = tuple(
-            p for p in class_dict['takes_params'] if p.name not in args)
-        del class_dict['takes_params']
+        attributes['takes_args'] = tuple(
+            p for p in attributes['takes_params'] if p.name in args)
+        attributes['takes_options'] = tuple(
+            p for p in attributes['takes_params'] if p.name not in args)
+        del attributes['takes_params']
 
-        class_dict['has_output'] = tuple(
+        attributes['has_output'] = tuple(
             self._create_output(api, s) for s in schema['output'])
 
-        return name, bases, class_dict
+        return attributes
 
 
 class _SchemaObjectPlugin(_SchemaPlugin):
@@ -374,11 +423,16 @@ class Schema(object):
     """
     namespaces = {'classes', 'commands', 'topics'}
     _DIR = os.path.join(USER_CACHE_PATH, 'ipa', 'schema', FORMAT)
+    # marshal format is specific to the Python version
+    _COMPILED_DIR = os.path.join(
+        USER_CACHE_PATH, 'ipa', 'schema', 'compiled', FORMAT,
+        'py{}{}'.format(*sys.version_info[:2]))
 
     def __init__(self, client, fingerprint=None):
         self._dict = {}
         self._namespaces = {}
         self._help = None
+        self._loads = _json_loads
 
         for ns in self.namespaces:
             self._dict[ns] = {}
@@ -405,6 +459,8 @@ class Schema(object):
                 self._write_schema(fingerprint)
             except Exception as e:
                 logger.warning("Failed to write schema: %s", e)
+            else:
+                self._write_compiled_schema(fingerprint)
 
         self.fingerprint = fingerprint
         self.ttl = ttl
@@ -444,6 +500,9 @@ class Schema(object):
         return (fp, ttl,)
 
     def _read_schema(self, fingerprint):
+        if self._read_compiled_schema(fingerprint):
+            return
+
         # It's more efficient to read zip file members at once than to open
         # the zip file a couple of times, see #6690.
         filename = os.path.join(self._DIR, fingerprint)
@@ -455,6 +514,83 @@ class Schema(object):
                 elif name == '_help':
                     self._help = schema.read(name)
 
+        self._write_compiled_schema(fingerprint)
+
+    def _read_compiled_schema(self, fingerprint):
+        """
+        Read the schema from the compiled cache.
+
+        Members are kept marshalled and are unmarshalled on first access.
+        Return False if the compiled cache is missing or unusable.
+        """
+        filename = os.path.join(self._COMPILED_DIR, fingerprint)
+        try:
+            with open(filename, 'rb') as f:
+                compiled = marshal.load(f)
+            if compiled['fingerprint'] != fingerprint:
+                raise ValueError("fingerprint mismatch")
+            namespaces = compiled['namespaces']
+            halp = compiled['help']
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                logger.debug("Failed to read compiled schema: %s", e)
+            return False
+        except Exception as e:
+            logger.debug("Failed to read compiled schema: %s", e)
+            return False
+
+        for ns in self.namespaces:
+            self._dict[ns] = dict(namespaces.get(ns, {}))
+        self._help = halp
+        self._loads = marshal.loads
+
+        return True
+
+    def _compile_value(self, value):
+        if isinstance(value, bytes):
+            value = self._loads(value)
+        else:
+            # normalize the value the same way as when it's read from the
+            # zip file
+            value = json.loads(json.dumps(value, default=json_default))
+        return marshal.dumps(value)
+
+    def _write_compiled_schema(self, fingerprint):
+        try:
+            compiled = {
+                'fingerprint': fingerprint,
+                'namespaces': {
+                    ns: {
+                        member: self._compile_value(value)
+                        for member, value in self._dict[ns].items()
+                    }
+                    for ns in self.namespaces
+                },
+                'help': self._compile_value(self._help),
+            }
+
+            try:
+                os.makedirs(self._COMPILED_DIR)
+            except EnvironmentError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            with tempfile.NamedTemporaryFile('wb', prefix=fingerprint,
+                                             dir=self._COMPILED_DIR,
+                                             delete=False) as f:
+                try:
+                    marshal.dump(compiled, f)
+                    ipautil.flush_sync(f)
+                    f.close()
+                except Exception:
+                    os.unlink(f.name)
+                    raise
+                else:
+                    os.rename(f.name,
+                              os.path.join(self._COMPILED_DIR, fingerprint))
+        except Exception as e:
+            logger.warning("Failed to write compiled schema: %s", e)
+
     def __getitem__(self, key):
         try:
             return self._namespaces[key]
@@ -464,7 +600,7 @@ class Schema(object):
     def _generate_help(self, schema):
         halp = {}
 
-        for namespace in ('commands', 'topics'):
+        for namespace in ('classes', 'commands', 'topics'):
             halp[namespace] = {}
 
             for member_schema in schema[namespace].values():
@@ -479,6 +615,10 @@ class Schema(object):
                     topic['topic_topic'] = member_schema['topic_topic']
                 if 'exclude' in member_schema:
                     topic['exclude'] = member_schema['exclude']
+                if 'obj_class' in member_schema:
+                    topic['obj_class'] = member_schema['obj_class']
+                if 'attr_name' in member_schema:
+                    topic['attr_name'] = member_schema['attr_name']
 
         return halp
 
@@ -522,7 +662,7 @@ class Schema(object):
         value = self._dict[namespace][member]
 
         if isinstance(value, bytes):
-            value = json.loads(value.decode('utf-8'))
+            value = self._loads(value)
             self._dict[namespace][member] = value
 
         return value
@@ -532,9 +672,7 @@ class Schema(object):
 
     def get_help(self, namespace, member):
         if isinstance(self._help, bytes):
-            self._help = json.loads(
-                self._help.decode('utf-8')  # pylint: disable=no-member
-            )
+            self._help = self._loads(self._help)
 
         return self._help[namespace][member]
 
@@ -17,8 +17,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import shlex
+import collections
 import re
+import threading
 
 import six
 
@@ -28,6 +29,13 @@ import six
 ACIPat = re.compile(r'\(version\s+3.0\s*;\s*ac[li]\s+\"([^\"]*)\"\s*;'
                     r'\s*(.*);\s*\)', re.UNICODE)
 
+# Match a single target: (keyword = "value") or (keyword != value)
+TargetPat = re.compile(r'\s*\(\s*([\w.]+)\s*(!?=)\s*'
+                       r'(?:"([^"]*)"|([^()"]*?))\s*\)\s*', re.UNICODE)
+
+# Split targetattr of the form attr || attr || ...
+TargetAttrSplitPat = re.compile(r'[^a-zA-Z0-9;\*]+')
+
 # Break the permissions/bind_rules out
 PermPat = re.compile(r'(\w+)\s*\(([^()]*)\)\s*(.*)', re.UNICODE)
 
@@ -40,6 +48,189 @@ ACTIONS = ["allow", "deny"]
 PERMISSIONS = ["read", "write", "add", "delete", "search", "compare",
                "selfwrite", "proxy", "all"]
 
+ACI_CACHE_SIZE = 4096
+
+# Immutable result of parsing an ACI string. ``target`` is a tuple of
+# (keyword, operator, expression) triples, the expression of targetattr is
+# a tuple of attributes. ``bindrule`` is a (keyword, operator, expression)
+# triple.
+ParsedACI = collections.namedtuple(
+    'ParsedACI', ['name', 'target', 'action', 'permissions', 'bindrule'])
+
+_parsed_acis = collections.OrderedDict()
+_parsed_acis_lock = threading.Lock()
+
+
+def _parse_target(aci):
+    """
+    Parse the target part of an ACI in a single pass and return a tuple
+    of (keyword, operator, expression) triples
+    """
+    targets = []
+    pos = 0
+    end = len(aci)
+    while pos < end:
+        match = TargetPat.match(aci, pos)
+        if match is None:
+            if aci[pos:].strip():
+                raise SyntaxError(
+                    "malformed target, unable to parse '%s'" % aci[pos:])
+            break
+        keyword, operator, quoted, unquoted = match.groups()
+        value = quoted if quoted is not None else unquoted
+        if keyword == 'targetattr':
+            value = tuple(TargetAttrSplitPat.split(value))
+        targets.append((keyword, operator, value))
+        pos = match.end()
+    return tuple(targets)
+
+
+def _parse_bindrule(bindrule):
+    if bindrule.startswith('(') != bindrule.endswith(')'):
+        raise SyntaxError("non-matching parentheses in bindrule")
+
+    match = BindPat.match(bindrule)
+    if not match or len(match.groups()) < 3:
+        raise SyntaxError("malformed bind rule")
+    return (match.group(1), match.group(2), match.group(3).replace('"', ''))
+
+
+def _parse_acistr(acistr):
+    vstart = acistr.find('version 3.0')
+    if vstart < 0:
+        raise SyntaxError("malformed ACI, unable to find version %s" % acistr)
+    acimatch = ACIPat.match(acistr[vstart-1:])
+    if not acimatch or len(acimatch.groups()) < 2:
+        raise SyntaxError("malformed ACI, match for version and bind rule failed %s" % acistr)
+    target = _parse_target(acistr[:vstart-1])
+    bindperms = PermPat.match(acimatch.group(2))
+    if not bindperms or len(bindperms.groups()) < 3:
+        raise SyntaxError("malformed ACI, permissions match failed %s" % acistr)
+    return ParsedACI(
+        name=acimatch.group(1),
+        target=target,
+        action=bindperms.group(1),
+        permissions=tuple(bindperms.group(2).replace(' ', '').split(',')),
+        bindrule=_parse_bindrule(bindperms.group(3)),
+    )
+
+
+def parse_aci(acistr):
+    """
+    Parse an ACI string and return an immutable `ParsedACI`.
+
+    Results are kept in a LRU cache keyed by the ACI string, so ACIs which
+    are parsed repeatedly, e.g. all ACIs of the root entry, are only
+    tokenized once.
+
+    :raises SyntaxError: if the ACI string is malformed
+    """
+    with _parsed_acis_lock:
+        try:
+            parsed = _parsed_acis.pop(acistr)
+        except KeyError:
+            parsed = None
+        else:
+            _parsed_acis[acistr] = parsed
+    if parsed is not None:
+        return parsed
+
+    parsed = _parse_acistr(acistr)
+    with _parsed_acis_lock:
+        _parsed_acis[acistr] = parsed
+        while len(_parsed_acis) > ACI_CACHE_SIZE:
+            _parsed_acis.popitem(last=False)
+    return parsed
+
+
+class ACIIndex(object):
+    """
+    Index of the ACIs of an entry.
+
+    ACIs are indexed by name, target attribute, permission, bind rule
+    expression and the expression of the other target keywords, so
+    lookups only touch the matching ACIs. ACI strings that fail to parse
+    are listed in ``unparseable``.
+    """
+    def __init__(self, acistrs):
+        self.acistrs = tuple(acistrs)
+        self.unparseable = []
+        self._positions = []
+        self._index = collections.defaultdict(dict)
+        self._lower_names = {}
+        for pos, acistr in enumerate(self.acistrs):
+            try:
+                parsed = parse_aci(acistr)
+            except SyntaxError:
+                self.unparseable.append(acistr)
+                continue
+            self._positions.append(pos)
+            self._add(self._lower_names, parsed.name.lower(), pos)
+            self._add(self._index['name'], parsed.name, pos)
+            # like in ACI, a repeated target keyword overrides the previous
+            targets = dict((keyword, expression)
+                           for keyword, _op, expression in parsed.target)
+            for keyword, expression in targets.items():
+                if keyword == 'targetattr':
+                    for attr in set(a.lower() for a in expression):
+                        self._add(self._index[keyword], attr, pos)
+                else:
+                    self._add(self._index[keyword], expression, pos)
+            for permission in set(parsed.permissions):
+                self._add(self._index['permission'], permission, pos)
+            self._add(self._index['bindrule'], parsed.bindrule[2], pos)
+
+    @staticmethod
+    def _add(index, key, pos):
+        index.setdefault(key, []).append(pos)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _select(self, postings):
+        if not postings:
+            postings = [self._positions]
+        postings = sorted(postings, key=len)
+        positions = set(postings[0])
+        for posting in postings[1:]:
+            positions.intersection_update(posting)
+        return [self.acistrs[pos] for pos in sorted(positions)]
+
+    def get(self, name):
+        """
+        Return ACI strings with the given name, compared case-insensitively
+        """
+        return self._select([self._lower_names.get(name.lower(), ())])
+
+    def find(self, *criteria):
+        """
+        Return ACI strings matching all criteria, in the original order.
+
+        Each criterion is a ``(field, value)`` tuple, where field is
+        ``name``, ``permission``, ``bindrule`` (the bind rule expression) or
+        a target keyword such as ``target``, ``targetfilter`` or
+        ``targetattr``. Attributes of ``targetattr`` are compared
+        case-insensitively. The value is either compared for equality or,
+        if it is callable, called with each distinct indexed value of the
+        field.
+        """
+        postings = []
+        for field, value in criteria:
+            index = self._index.get(field, {})
+            if callable(value):
+                posting = []
+                for key, positions in index.items():
+                    if value(key):
+                        posting.extend(positions)
+            else:
+                if field == 'targetattr':
+                    value = value.lower()
+                posting = index.get(value, ())
+            if not posting:
+                return []
+            postings.append(posting)
+        return self._select(postings)
+
 
 class ACI(object):
     """
@@ -92,65 +283,21 @@ class ACI(object):
         aci = aci + "(version 3.0;acl \"%s\";%s (%s) %s %s \"%s\"" % (self.name, self.action, ",".join(self.permissions), self.bindrule['keyword'], self.bindrule['operator'], self.bindrule['expression']) + ";)"
         return aci
 
-    def _remove_quotes(self, s):
-        # Remove leading and trailing quotes
-        if s.startswith('"'):
-            s = s[1:]
-        if s.endswith('"'):
-            s = s[:-1]
-        return s
-
-    def _parse_target(self, aci):
-        if six.PY2:
-            aci = aci.encode('utf-8')
-        lexer = shlex.shlex(aci)
-        lexer.wordchars = lexer.wordchars + "."
-
-        var = False
-        op = "="
-        for token in lexer:
-            # We should have the form (a = b)(a = b)...
-            if token == "(":
-                var = next(lexer).strip()
-                operator = next(lexer)
-                if operator not in ("=", "!="):
-                    # Peek at the next char before giving up
-                    operator = operator + next(lexer)
-                    if operator not in ("=", "!="):
-                        raise SyntaxError("No operator in target, got '%s'" % operator)
-                op = operator
-                val = next(lexer).strip()
-                val = self._remove_quotes(val)
-                end = next(lexer)
-                if end != ")":
-                    raise SyntaxError('No end parenthesis in target, got %s' % end)
-
-            if var == 'targetattr':
-                # Make a string of the form attr || attr || ... into a list
-                t = re.split('[^a-zA-Z0-9;\*]+', val)
-                self.target[var] = {}
-                self.target[var]['operator'] = op
-                self.target[var]['expression'] = t
-            else:
-                self.target[var] = {}
-                self.target[var]['operator'] = op
-                self.target[var]['expression'] = val
-
     def _parse_acistr(self, acistr):
-        vstart = acistr.find('version 3.0')
-        if vstart < 0:
-            raise SyntaxError("malformed ACI, unable to find version %s" % acistr)
-        acimatch = ACIPat.match(acistr[vstart-1:])
-        if not acimatch or len(acimatch.groups()) < 2:
-            raise SyntaxError("malformed ACI, match for version and bind rule failed %s" % acistr)
-        self._parse_target(acistr[:vstart-1])
-        self.name = acimatch.group(1)
-        bindperms = PermPat.match(acimatch.group(2))
-        if not bindperms or len(bindperms.groups()) < 3:
-            raise SyntaxError("malformed ACI, permissions match failed %s" % acistr)
-        self.action = bindperms.group(1)
-        self.permissions = bindperms.group(2).replace(' ','').split(',')
-        self.set_bindrule(bindperms.group(3))
+        parsed = parse_aci(acistr)
+        self.name = parsed.name
+        self.target = {}
+        for keyword, operator, expression in parsed.target:
+            if isinstance(expression, tuple):
+                expression = list(expression)
+            self.target[keyword] = {
+                'operator': operator,
+                'expression': expression,
+            }
+        self.action = parsed.action
+        self.permissions = list(parsed.permissions)
+        self.bindrule = dict(
+            zip(('keyword', 'operator', 'expression'), parsed.bindrule))
 
     def validate(self):
         """Do some basic verification that this will produce a
@@ -200,15 +347,10 @@ class ACI(object):
         self.target['target']['operator'] = operator
 
     def set_bindrule(self, bindrule):
-        if bindrule.startswith('(') != bindrule.endswith(')'):
-            raise SyntaxError("non-matching parentheses in bindrule")
-
-        match = BindPat.match(bindrule)
-        if not match or len(match.groups()) < 3:
-            raise SyntaxError("malformed bind rule")
-        self.set_bindrule_keyword(match.group(1))
-        self.set_bindrule_operator(match.group(2))
-        self.set_bindrule_expression(match.group(3).replace('"',''))
+        keyword, operator, expression = _parse_bindrule(bindrule)
+        self.set_bindrule_keyword(keyword)
+        self.set_bindrule_operator(operator)
+        self.set_bindrule_expression(expression)
 
     def set_bindrule_keyword(self, keyword):
         self.bindrule['keyword'] = keyword
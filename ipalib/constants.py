@@ -149,9 +149,27 @@ DEFAULT_CONFIG = (
     ('startup_timeout', 300),
     # How long http connection should wait for reply [seconds].
     ('http_timeout', 30),
+    # How long to wait for a reply of each master when all masters are
+    # queried at once [seconds].
+    ('ldap_replica_timeout', 10),
     # How long to wait for an entry to appear on a replica
     ('replication_wait_timeout', 300),
 
+    # Per-process pool of bound LDAP connections in the server, keyed by
+    # principal; 0 disables pooling. Timeouts are in seconds.
+    ('ldap_pool_size', 0),
+    ('ldap_pool_idle_timeout', 60),
+    ('ldap_pool_check_interval', 5),
+
+    # Per-process pool of keep-alive HTTPS connections to Dogtag; the size
+    # limits connections per host, 0 disables pooling. Timeout in seconds.
+    ('dogtag_pool_size', 8),
+    ('dogtag_pool_idle_timeout', 30),
+
+    # Maximum number of workers executing the read-only methods of a
+    # concurrent batch; 1 disables concurrent execution.
+    ('batch_max_workers', 4),
+
     # Web Application mount points
     ('mount_ipa', '/ipa/'),
 
@@ -204,6 +222,10 @@ DEFAULT_CONFIG = (
     # Ignore TTL. Perform schema call and download schema if not in cache.
     ('force_schema_check', False),
 
+    # Log the time spent creating and finalizing each plugin when the API is
+    # finalized.
+    ('startup_report', False),
+
     # ********************************************************
     #  The remaining keys are never set from the values here!
     # ********************************************************
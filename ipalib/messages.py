@@ -487,6 +487,17 @@ class FailedToAddHostDNSRecords(PublicMessage):
                "%(reason)s")
 
 
+class SearchResultPaged(PublicMessage):
+    """
+    **13031** More entries matching the search are available
+    """
+
+    errno = 13031
+    type = "info"
+    format = _("More entries are available, continue the search with "
+               "--cursor=%(cursor)s")
+
+
 def iter_messages(variables, base):
     """Return a tuple with all subclasses
     """
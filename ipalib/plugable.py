@@ -29,6 +29,7 @@ import operator
 import re
 import sys
 import threading
+import time
 import os
 from os import path
 import optparse  # pylint: disable=deprecated-module
@@ -144,6 +145,7 @@ class Plugin(ReadOnly):
         self.__finalize_called = False
         self.__finalized = False
         self.__finalize_lock = threading.RLock()
+        self.__finalize_time = None
         log_mgr.get_logger(self, True)
 
     @classmethod
@@ -203,6 +205,16 @@ class Plugin(ReadOnly):
     def Command(self):
         return self.__api.Command
 
+    @property
+    def finalize_time(self):
+        """
+        Return the duration of `_on_finalize()` in seconds.
+
+        The duration includes on-demand finalization of other plugins. None
+        is returned if the plugin is not finalized yet.
+        """
+        return self.__finalize_time
+
     def finalize(self):
         """
         Finalize plugin initialization.
@@ -218,7 +230,9 @@ class Plugin(ReadOnly):
                 # No recursive calls!
                 return
             self.__finalize_called = True
+            start = time.time()
             self._on_finalize()
+            self.__finalize_time = time.time() - start
             self.__finalized = True
             if not self.__api.is_production_mode():
                 lock(self)
@@ -300,9 +314,12 @@ class APINameSpace(Mapping):
         if self.__plugins is not None and self.__plugins_by_key is not None:
             return
 
+        # The namespace may be enumerated from several threads at once when
+        # plugins are created on demand, so publish the results only after
+        # they are complete.
         default_map = self.__api._API__default_map
         plugins = set()
-        key_dict = self.__plugins_by_key = {}
+        key_dict = {}
 
         for plugin in self.__api._API__plugins:
             if not any(issubclass(b, self.__base) for b in plugin.bases):
@@ -314,6 +331,7 @@ class APINameSpace(Mapping):
             if plugin.version == default_map.get(plugin.name, '1'):
                 key_dict[plugin.name] = plugin
 
+        self.__plugins_by_key = key_dict
         self.__plugins = sorted(plugins, key=operator.attrgetter('full_name'))
 
     def __len__(self):
@@ -357,6 +375,8 @@ class API(ReadOnly):
         self.__plugins_by_key = {}
         self.__default_map = {}
         self.__instances = {}
+        self.__instances_lock = threading.RLock()
+        self.__init_times = {}
         self.__next = {}
         self.__done = set()
         self.env = Env()
@@ -741,6 +761,7 @@ class API(ReadOnly):
         `API.bootstrap` will automatically be called if it hasn't been
         already.
         """
+        start = time.time()
         self.__doing('finalize')
         self.__do_if_not_done('load_plugins')
 
@@ -792,6 +813,9 @@ class API(ReadOnly):
 
         self.__finalized = True
 
+        if self.env.startup_report:
+            self.__log_startup_report(time.time() - start)
+
         if not production_mode:
             lock(self)
 
@@ -802,12 +826,58 @@ class API(ReadOnly):
             raise KeyError(plugin)
 
         try:
-            instance = self.__instances[plugin]
+            return self.__instances[plugin]
         except KeyError:
-            instance = self.__instances[plugin] = plugin(self)
+            pass
+
+        # Plugins are created on demand from any thread, make sure each is
+        # created only once. The lock is reentrant because creating a plugin
+        # may create other plugins.
+        with self.__instances_lock:
+            try:
+                instance = self.__instances[plugin]
+            except KeyError:
+                start = time.time()
+                instance = plugin(self)
+                self.__init_times[plugin] = time.time() - start
+                self.__instances[plugin] = instance
 
         return instance
 
+    def get_startup_report(self):
+        """
+        Return the time spent creating and finalizing plugins.
+
+        Return a list of ``(full_name, init_time, finalize_time)`` tuples for
+        all plugins created so far, slowest first. ``finalize_time`` is None
+        for plugins which are not finalized yet.
+        """
+        with self.__instances_lock:
+            instances = list(self.__instances.items())
+
+        report = [
+            (plugin.full_name,
+             self.__init_times.get(plugin, 0.0),
+             instance.finalize_time)
+            for plugin, instance in instances
+        ]
+        report.sort(key=lambda r: r[1] + (r[2] or 0.0), reverse=True)
+        return report
+
+    def __log_startup_report(self, duration):
+        report = self.get_startup_report()
+        logger.info(
+            "API finalized in %.3f seconds, %d plugins created, "
+            "%d finalized",
+            duration, len(report),
+            sum(1 for r in report if r[2] is not None))
+        for full_name, init_time, finalize_time in report:
+            if finalize_time is None:
+                logger.info("%s: init %.4fs", full_name, init_time)
+            else:
+                logger.info("%s: init %.4fs, finalize %.4fs",
+                            full_name, init_time, finalize_time)
+
     def get_plugin_next(self, plugin):
         if not callable(plugin):
             raise TypeError('plugin must be callable; got %r' % plugin)
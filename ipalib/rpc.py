@@ -62,7 +62,7 @@ from ipapython import session_storage
 from ipapython.cookie import Cookie
 from ipapython.dnsutil import DNSName, query_srv
 from ipalib.text import _
-from ipalib.util import create_https_connection
+from ipalib.util import create_https_context, ResumableHTTPSConnection
 from ipalib.krb_utils import KRB5KDC_ERR_S_PRINCIPAL_UNKNOWN, KRB5KRB_AP_ERR_TKT_EXPIRED, \
                              KRB5_FCC_PERM, KRB5_FCC_NOFILE, KRB5_CC_FORMAT, \
                              KRB5_REALM_CANT_RESOLVE, KRB5_CC_NOTFOUND, get_principal
@@ -83,9 +83,9 @@ except ImportError:
 
 # pylint: disable=import-error
 if six.PY3:
-    from http.client import RemoteDisconnected
+    from http.client import HTTPResponse, RemoteDisconnected
 else:
-    from httplib import BadStatusLine as RemoteDisconnected
+    from httplib import HTTPResponse, BadStatusLine as RemoteDisconnected
 # pylint: enable=import-error
 
 
@@ -420,6 +420,61 @@ def json_encode_binary(val, version, pretty_print=False):
         return json.dumps(result)
 
 
+def json_iterencode_binary(val, version, chunk_size=65536):
+    """Serialize a Python object structure to JSON incrementally
+
+    Dicts are serialized member by member and lists item by item, each item
+    is primed and serialized on its own. Unlike json_encode_binary(), no
+    primed copy of the whole structure and no complete JSON document are
+    ever held in memory, only the item being serialized and the current
+    chunk. The joined chunks are equal to the output of json_encode_binary().
+
+    :param object val: Python object structure
+    :param str version: client version
+    :param int chunk_size: minimal size of yielded chunks
+    :return: iterator of text chunks
+    :see: json_encode_binary
+    """
+    primer = _JSONPrimer(version)
+    convert = primer.convert
+    encode = json.JSONEncoder().encode
+
+    def iterencode(obj):
+        if isinstance(obj, dict):
+            sep = '{'
+            for k, v in six.iteritems(obj):
+                if isinstance(k, six.string_types):
+                    k = encode(k)
+                else:
+                    # json.dumps() converts keys of other types to strings
+                    k = '"%s"' % encode(k)
+                yield sep + k + ': '
+                for chunk in iterencode(v):
+                    yield chunk
+                sep = ', '
+            yield '}' if sep == ', ' else '{}'
+        elif isinstance(obj, (list, tuple)):
+            sep = '['
+            for item in obj:
+                yield sep + encode(convert(item))
+                sep = ', '
+            yield ']' if sep == ', ' else '[]'
+        else:
+            yield encode(convert(obj))
+
+    chunks = []
+    size = 0
+    for chunk in iterencode(val):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield ''.join(chunks)
+            chunks = []
+            size = 0
+    if chunks:
+        yield ''.join(chunks)
+
+
 def _ipa_obj_hook(dct, _iteritems=six.iteritems, _list=list):
     """JSON object hook
 
@@ -556,7 +611,17 @@ class LanguageAwareTransport(MultiProtocolTransport):
 
 
 class SSLTransport(LanguageAwareTransport):
-    """Handles an HTTPS transaction to an XML-RPC server."""
+    """Handles an HTTPS transaction to an XML-RPC server.
+
+    The connection is kept alive between requests. SSL contexts and the
+    last TLS session to each server are shared by all transports of the
+    process, so new connections resume the TLS session instead of doing
+    a full handshake.
+    """
+    # (host, cafile, tls_version_min, tls_version_max) ->
+    #     (SSLContext, TLS session)
+    _tls_state = {}
+
     def make_connection(self, host):
         host, self._extra_headers, _x509 = self.get_host_info(host)
 
@@ -564,18 +629,59 @@ class SSLTransport(LanguageAwareTransport):
             logger.debug("HTTP connection keep-alive (%s)", host)
             return self._connection[1]
 
-        conn = create_https_connection(
-            host, 443,
-            getattr(context, 'ca_certfile', None),
-            tls_version_min=api.env.tls_version_min,
-            tls_version_max=api.env.tls_version_max)
-
+        key = (host, getattr(context, 'ca_certfile', None),
+               api.env.tls_version_min, api.env.tls_version_max)
+        try:
+            ctx, tls_session = self._tls_state[key]
+        except KeyError:
+            ctx = create_https_context(
+                cafile=key[1],
+                tls_version_min=api.env.tls_version_min,
+                tls_version_max=api.env.tls_version_max)
+            tls_session = None
+
+        conn = ResumableHTTPSConnection(host, 443, context=ctx)
+        conn.tls_session = tls_session
+        conn.tls_state_key = key
         conn.connect()
-        logger.debug("New HTTP connection (%s)", host)
+        self._tls_state[key] = ctx, getattr(conn.sock, 'session', None)
+        logger.debug("New HTTP connection (%s), TLS session reused: %s",
+                     host, getattr(conn.sock, 'session_reused', False))
 
         self._connection = host, conn
         return self._connection[1]
 
+    def close(self):
+        conn = self._connection[1]
+        LanguageAwareTransport.close(self)
+        if getattr(conn, 'tls_session', None) is not None:
+            key = conn.tls_state_key
+            self._tls_state[key] = self._tls_state[key][0], conn.tls_session
+
+
+class _PipelinedSocket(object):
+    """
+    Socket handing out a shared reader to HTTP responses, so responses
+    to pipelined requests are read one after another from a single buffer.
+    """
+    def __init__(self, reader):
+        self._reader = reader
+
+    def makefile(self, *args, **kwargs):
+        return _SharedReader(self._reader)
+
+
+class _SharedReader(object):
+    def __init__(self, reader):
+        self._reader = reader
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+    def close(self):
+        # closing a response must not affect the following responses
+        pass
+
 
 class KerbTransport(SSLTransport):
     """
@@ -583,6 +689,9 @@ class KerbTransport(SSLTransport):
     """
     flags = [gssapi.RequirementFlag.mutual_authentication,
              gssapi.RequirementFlag.out_of_sequence_detection]
+    # use the session cookie received from the server in following
+    # requests instead of negotiating again
+    reuse_session_cookie = True
 
     def __init__(self, *args, **kwargs):
         SSLTransport.__init__(self, *args, **kwargs)
@@ -760,6 +869,91 @@ class KerbTransport(SSLTransport):
             self.send_content(connection, request_body)
             return connection
 
+    def _format_request(self, host, handler, request_body):
+        headers = [('Host', host)]
+        if self.accept_gzip_encoding and gzip:
+            headers.append(('Accept-Encoding', 'gzip'))
+        headers.extend(self._extra_headers)
+        headers.append(('User-Agent', self.user_agent))
+        if self.protocol == 'json':
+            headers.append(('Content-Type', 'application/json'))
+        else:
+            headers.append(('Content-Type', 'text/xml'))
+        headers.append(('Content-Length', str(len(request_body))))
+
+        lines = ['POST %s HTTP/1.1' % handler]
+        lines.extend('%s: %s' % header for header in headers)
+        lines.extend(['', ''])
+        return '\r\n'.join(lines).encode('latin-1') + request_body
+
+    def _request_pipelined(self, host, handler, request_bodies, responses):
+        """
+        Send all requests before reading any response.
+
+        Response bodies of successful requests are stored in ``responses``
+        by index of the request.
+        """
+        h = self.make_connection(host)
+        self.get_auth_info()
+        if not any(name == 'Cookie' for name, _v in self._extra_headers):
+            # authentication needs a round trip
+            return
+
+        if h.sock is None:
+            h.connect()
+        h.sock.sendall(b''.join(
+            self._format_request(host, handler, request_body)
+            for request_body in request_bodies))
+
+        reader = h.sock.makefile('rb')
+        try:
+            for i in range(len(request_bodies)):
+                response = HTTPResponse(_PipelinedSocket(reader),
+                                        method='POST')
+                response.begin()
+                if response.status == 200:
+                    responses[i] = self.parse_response(response)
+                else:
+                    response.read()
+                if response.will_close:
+                    break
+        finally:
+            reader.close()
+        if len(responses) < len(request_bodies):
+            self.close()
+
+    def request_pipelined(self, host, handler, request_bodies, verbose=0):
+        """
+        Send several requests on the keep-alive connection at once and
+        return list of response bodies.
+
+        Requests are pipelined only when a session cookie is available,
+        i.e. no authentication round trips are needed. Requests which are
+        not answered successfully are sent again one by one, so pipelined
+        requests should be idempotent.
+        """
+        self.verbose = verbose
+        responses = {}
+        if len(request_bodies) > 1:
+            try:
+                self._request_pipelined(
+                    host, handler, request_bodies, responses)
+            except gssapi.exceptions.GSSError as e:
+                self._handle_exception(e)
+            except (RemoteDisconnected, socket.error) as e:
+                # the unanswered requests are sent again below
+                self.close()
+                logger.debug("HTTP pipelining failed (%s): %s", host, e)
+            except BaseException:
+                self.close()
+                raise
+
+        return [
+            responses[i] if i in responses
+            else self.request(host, handler, request_body, verbose)
+            for i, request_body in enumerate(request_bodies)
+        ]
+
     # Find all occurrences of the expiry component
     expiry_re = re.compile(r'.*?(&expiry=\d+).*?')
 
@@ -828,6 +1022,8 @@ class KerbTransport(SSLTransport):
         cookie_string = self._slice_session_cookie(session_cookie)
         logger.debug("storing cookie '%s' for principal %s",
                      cookie_string, principal)
+        if self.reuse_session_cookie:
+            setattr(context, 'session_cookie', cookie_string)
         try:
             update_persistent_client_session_data(principal, cookie_string)
         except Exception as e:
@@ -851,6 +1047,7 @@ class DelegatedKerbTransport(KerbTransport):
     flags = [gssapi.RequirementFlag.delegate_to_peer,
              gssapi.RequirementFlag.mutual_authentication,
              gssapi.RequirementFlag.out_of_sequence_detection]
+    reuse_session_cookie = False
 
 
 class RPCClient(Connectible):
@@ -1221,7 +1418,7 @@ class JSONServerProxy(object):
         # by calling serverproxy('transport')
         self._ServerProxy__transport = transport
 
-    def __request(self, name, args):
+    def __encode(self, name, args):
         print_json = self.__verbose >= 2
         payload = {'method': unicode(name), 'params': args, 'id': 0}
         version = args[1].get('version', VERSION_WITHOUT_CAPABILITIES)
@@ -1234,13 +1431,48 @@ class JSONServerProxy(object):
                 payload
             )
 
+        return payload.encode('utf-8')
+
+    def __request(self, name, args):
         response = self.__transport.request(
             self.__host,
             self.__handler,
-            payload.encode('utf-8'),
+            self.__encode(name, args),
             verbose=self.__verbose >= 3,
         )
+        return self.__decode(response)
+
+    def _request_pipelined(self, calls):
+        """
+        Call several methods at once, ``calls`` is a list of (name, args).
+
+        The HTTP requests are pipelined if the transport supports it. Errors
+        of individual calls are returned in place of their results.
+        """
+        payloads = [self.__encode(name, args) for name, args in calls]
+        verbose = self.__verbose >= 3
+        request_pipelined = getattr(
+            self.__transport, 'request_pipelined', None)
+        if request_pipelined is not None:
+            responses = request_pipelined(
+                self.__host, self.__handler, payloads, verbose=verbose)
+        else:
+            responses = [
+                self.__transport.request(
+                    self.__host, self.__handler, payload, verbose=verbose)
+                for payload in payloads
+            ]
+
+        results = []
+        for response in responses:
+            try:
+                results.append(self.__decode(response))
+            except errors.PublicError as e:
+                results.append(e)
+        return results
 
+    def __decode(self, response):
+        print_json = self.__verbose >= 2
         if print_json:
             logger.info(
                 'Response: %s',
@@ -1280,3 +1512,29 @@ class jsonclient(RPCClient):
     server_proxy_class = JSONServerProxy
     protocol = 'json'
     env_rpc_uri_key = 'jsonrpc_uri'
+
+    def forward_pipelined(self, calls):
+        """
+        Forward several independent calls at once.
+
+        The HTTP requests are pipelined on the keep-alive connection when
+        a session cookie is available. Calls may be sent again if the
+        connection is lost, so they should not depend on each other and
+        should be safe to repeat.
+
+        :param calls: List of (name, args, kw) tuples, see `forward`.
+        :return: List of results. Errors of individual calls are returned
+            as exception instances in place of their results.
+        """
+        server = getattr(context, 'request_url', None)
+        logger.debug("Forwarding %d pipelined calls to %s server '%s'",
+                     len(calls), self.protocol, server)
+        try:
+            return self.conn._request_pipelined(
+                [(name, (tuple(args), kw)) for name, args, kw in calls])
+        except ProtocolError as e:
+            raise NetworkError(uri=server, error=e.errmsg)
+        except (SSLError, socket.error) as e:
+            raise NetworkError(uri=server, error=str(e))
+        except (OverflowError, TypeError) as e:
+            raise XMLRPCMarshallError(error=str(e))
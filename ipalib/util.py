@@ -48,10 +48,10 @@ from netaddr.core import AddrFormatError
 import six
 
 try:
-    from httplib import HTTPSConnection
+    from httplib import HTTPConnection, HTTPSConnection
 except ImportError:
     # Python 3
-    from http.client import HTTPSConnection
+    from http.client import HTTPConnection, HTTPSConnection
 
 from ipalib import errors, messages
 from ipalib.constants import (
@@ -276,6 +276,31 @@ def get_proper_tls_version_span(tls_version_min, tls_version_max):
     return TLS_VERSIONS[min_version_idx:max_version_idx+1]
 
 
+class ResumableHTTPSConnection(HTTPSConnection):
+    """
+    HTTPS connection which resumes the TLS session in ``tls_session``.
+
+    The TLS session is kept in ``tls_session`` when the connection is
+    closed, so reconnecting avoids a full handshake.
+    """
+    tls_session = None
+
+    def connect(self):
+        # pylint: disable=access-member-before-definition
+        HTTPConnection.connect(self)
+        kwargs = {}
+        if self.tls_session is not None:
+            kwargs['session'] = self.tls_session
+        self.sock = self._context.wrap_socket(
+            self.sock, server_hostname=self.host, **kwargs)
+
+    def close(self):
+        session = getattr(self.sock, 'session', None)
+        if session is not None:
+            self.tls_session = session
+        HTTPSConnection.close(self)
+
+
 def create_https_connection(
     host, port=HTTPSConnection.default_port,
     cafile=None,
@@ -291,6 +316,32 @@ def create_https_connection(
     :param host:  The host to connect to
     :param port:  The port to connect to, defaults to
                HTTPSConnection.default_port
+
+    See create_https_context() for the other arguments.
+
+    :returns An established HTTPS connection to host:port
+    """
+    ctx = create_https_context(
+        cafile=cafile,
+        client_certfile=client_certfile,
+        client_keyfile=client_keyfile,
+        keyfile_passwd=keyfile_passwd,
+        tls_version_min=tls_version_min,
+        tls_version_max=tls_version_max)
+
+    return HTTPSConnection(host, port, context=ctx, **kwargs)
+
+
+def create_https_context(
+    cafile=None,
+    client_certfile=None, client_keyfile=None,
+    keyfile_passwd=None,
+    tls_version_min="tls1.1",
+    tls_version_max="tls1.2"
+):
+    """
+    Create a customized SSLContext object for HTTPS connections.
+
     :param cafile:  A PEM-format file containning the trusted
                     CA certificates
     :param client_certfile:
@@ -303,7 +354,7 @@ def create_https_connection(
             A path to the file which stores the password that is used to
             encrypt client_keyfile. Leave default value if the keyfile
             is not encrypted.
-    :returns An established HTTPS connection to host:port
+    :returns An SSLContext verifying the server certificate
     """
     # pylint: disable=no-member
     tls_cutoff_map = {
@@ -363,7 +414,7 @@ def create_https_connection(
             passwd = None
         ctx.load_cert_chain(client_certfile, client_keyfile, passwd)
 
-    return HTTPSConnection(host, port, context=ctx, **kwargs)
+    return ctx
 
 
 def validate_dns_label(dns_label, allow_underscore=False, allow_slash=False):
@@ -538,6 +538,41 @@ def rdn_key(rdn):
     return (len(rdn),) + tuple(ava_key(k) for k in rdn)
 
 
+# Cache of parsed DN strings, maps the string to a (rdns, key) tuple.
+# Container DNs and the base DN are parsed over and over again; like the
+# re module, the cache is simply cleared when it is full.
+_MAX_PARSE_CACHE = 2048
+_parse_cache = {}
+
+
+def _parse_dn(value):
+    """
+    Parse DN string ``value``; return a (rdns, key) tuple.
+
+    The returned rdns must not be modified.
+    """
+    try:
+        return _parse_cache[value]
+    except KeyError:
+        pass
+
+    str_value = value
+    try:
+        if isinstance(str_value, six.text_type):
+            str_value = val_encode(str_value)
+        rdns = str2dn(str_value)
+    except DECODING_ERROR:
+        raise ValueError("malformed RDN string = \"%s\"" % value)
+    for rdn in rdns:
+        sort_avas(rdn)
+    result = (rdns, tuple(rdn_key(rdn) for rdn in rdns))
+
+    if len(_parse_cache) >= _MAX_PARSE_CACHE:
+        _parse_cache.clear()
+    _parse_cache[value] = result
+    return result
+
+
 if six.PY2:
     # Python 2: Input/output is unicode; we store UTF-8 bytes
     def val_encode(s):
@@ -556,6 +591,15 @@ else:
         return s
 
 
+def _getstate_uncached(obj):
+    # the cached hash depends on the string hash seed of the process, it
+    # must not be carried over to another process by pickle
+    state = obj.__dict__.copy()
+    state.pop('_key', None)
+    state.pop('_hash', None)
+    return state
+
+
 @functools.total_ordering
 class AVA(object):
     '''
@@ -611,9 +655,20 @@ class AVA(object):
     The str method of an AVA returns the string representation in RFC 4514 DN
     syntax with proper escaping.
     '''
+    # normalized form and hash, computed on first use
+    _key = None
+    _hash = None
+    __getstate__ = _getstate_uncached
+
     def __init__(self, *args):
         self._ava = get_ava(*args)
 
+    def _get_key(self):
+        key = self._key
+        if key is None:
+            key = self._key = ava_key(self._ava)
+        return key
+
     def _get_attr(self):
         return val_decode(self._ava[0])
 
@@ -622,6 +677,7 @@ class AVA(object):
             self._ava[0] = _normalize_ava_input(new_attr)
         except Exception as e:
             raise ValueError('unable to convert attr "%s": %s' % (new_attr, e))
+        self._key = self._hash = None
 
     attr = property(_get_attr)
 
@@ -633,6 +689,7 @@ class AVA(object):
             self._ava[1] = _normalize_ava_input(new_value)
         except Exception as e:
             raise ValueError('unable to convert value "%s": %s' % (new_value, e))
+        self._key = self._hash = None
 
     value = property(_get_value)
 
@@ -657,13 +714,16 @@ class AVA(object):
             raise KeyError("\"%s\" not found in %s" % (key, self.__str__()))
 
     def __hash__(self):
-        # Hash is computed from AVA's string representation.
+        # Hash is computed from AVA's normalized form.
         #
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
 
-        return hash(str(self).lower())
+        h = self._hash
+        if h is None:
+            h = self._hash = hash(self._get_key())
+        return h
 
     def __eq__(self, other):
         '''
@@ -691,7 +751,7 @@ class AVA(object):
             return False
 
         # Perform comparison between objects of same type
-        return ava_key(self._ava) == ava_key(other._ava)
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -702,7 +762,7 @@ class AVA(object):
         if not isinstance(other, AVA):
             raise TypeError("expected AVA but got %s" % (other.__class__.__name__))
 
-        return ava_key(self._ava) < ava_key(other._ava)
+        return self._get_key() < other._get_key()
 
 
 @functools.total_ordering
@@ -814,9 +874,20 @@ class RDN(object):
 
     AVA_type = AVA
 
+    # normalized form and hash, computed on first use
+    _key = None
+    _hash = None
+    __getstate__ = _getstate_uncached
+
     def __init__(self, *args, **kwds):
         self._avas = self._avas_from_sequence(args, kwds.get('raw', False))
 
+    def _get_key(self):
+        key = self._key
+        if key is None:
+            key = self._key = rdn_key(self._avas)
+        return key
+
     def _avas_from_sequence(self, args, raw=False):
         avas = []
         sort = 0
@@ -883,6 +954,7 @@ class RDN(object):
             raise IndexError("No AVA's in this RDN")
 
         self._avas[0][0] = val_encode(six.text_type(new_attr))
+        self._key = self._hash = None
 
     attr  = property(_get_attr)
 
@@ -895,17 +967,21 @@ class RDN(object):
         if len(self._avas) == 0:
             raise IndexError("No AVA's in this RDN")
         self._avas[0][1] = val_encode(six.text_type(new_value))
+        self._key = self._hash = None
 
     value = property(_get_value)
 
     def __hash__(self):
-        # Hash is computed from RDN's string representation.
+        # Hash is computed from RDN's normalized form.
         #
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
 
-        return hash(str(self).lower())
+        h = self._hash
+        if h is None:
+            h = self._hash = hash(self._get_key())
+        return h
 
     def __eq__(self, other):
         # Try coercing string to RDN, if successful compare to coerced object
@@ -921,7 +997,7 @@ class RDN(object):
             return False
 
         # Perform comparison between objects of same type
-        return rdn_key(self._avas) == rdn_key(other._avas)
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -930,7 +1006,7 @@ class RDN(object):
         if not isinstance(other, RDN):
             raise TypeError("expected RDN but got %s" % (other.__class__.__name__))
 
-        return rdn_key(self._avas) < rdn_key(other._avas)
+        return self._get_key() < other._get_key()
 
     def __add__(self, other):
         result = self.__class__(self)
@@ -1103,9 +1179,35 @@ class DN(object):
     AVA_type = AVA
     RDN_type = RDN
 
+    # normalized form (a tuple of RDN keys) and hash, computed on first use
+    _key = None
+    _hash = None
+    __getstate__ = _getstate_uncached
+
     def __init__(self, *args, **kwds):
+        if len(args) == 1:
+            # fast paths for the most common cases
+            value = args[0]
+            if isinstance(value, six.string_types):
+                rdns, self._key = _parse_dn(value)
+                # the AVA lists are shared with the parse cache, which is
+                # fine as DN is immutable
+                self.rdns = list(rdns)
+                return
+            elif isinstance(value, DN):
+                self.rdns = value._copy_rdns()
+                self._key = value._key
+                self._hash = value._hash
+                return
+
         self.rdns = self._rdns_from_sequence(args)
 
+    def _get_key(self):
+        key = self._key
+        if key is None:
+            key = self._key = tuple(rdn_key(rdn) for rdn in self.rdns)
+        return key
+
     def _copy_rdns(self, rdns=None):
         if not rdns:
             rdns = self.rdns
@@ -1113,14 +1215,7 @@ class DN(object):
 
     def _rdns_from_value(self, value):
         if isinstance(value, six.string_types):
-            try:
-                if isinstance(value, six.text_type):
-                    value = val_encode(value)
-                rdns = str2dn(value)
-            except DECODING_ERROR:
-                raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
+            rdns = list(_parse_dn(value)[0])
         elif isinstance(value, DN):
             rdns = value._copy_rdns()
         elif isinstance(value, (tuple, list, AVA)):
@@ -1184,6 +1279,8 @@ class DN(object):
             cls = self.__class__
             new_dn = cls.__new__(cls)
             new_dn.rdns = self.rdns[key]
+            if self._key is not None:
+                new_dn._key = self._key[key]
             return new_dn
         elif isinstance(key, six.string_types):
             for rdn in self.rdns:
@@ -1196,19 +1293,16 @@ class DN(object):
                                 (key.__class__.__name__))
 
     def __hash__(self):
-        # Hash is computed from DN's string representation.
+        # Hash is computed from DN's normalized form.
         #
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
 
-        str_dn = ';,'.join([
-            '++'.join([
-                '=='.join((atype, avalue or ''))
-                for atype, avalue, _dummy in rdn
-            ]) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+        h = self._hash
+        if h is None:
+            h = self._hash = hash(self._get_key())
+        return h
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1223,11 +1317,18 @@ class DN(object):
         if not isinstance(other, DN):
             return False
 
-        if len(self) != len(other):
+        if self is other:
+            return True
+
+        if len(self.rdns) != len(other.rdns):
+            return False
+
+        if (self._hash is not None and other._hash is not None and
+                self._hash != other._hash):
             return False
 
         # Perform comparison between objects of same type
-        return self._cmp_sequence(other, 0, len(self)) == 0
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -1239,7 +1340,7 @@ class DN(object):
         if len(self) != len(other):
             return len(self) < len(other)
 
-        return self._cmp_sequence(other, 0, len(self)) < 0
+        return self._get_key() < other._get_key()
 
     def _cmp_sequence(self, pattern, self_start, pat_len):
         self_idx = self_start
@@ -1286,6 +1387,16 @@ class DN(object):
                     return True
             return False
 
+        if (isinstance(suffix, DN) and start == 0 and
+                end == sys.maxsize):
+            # fast path: compare the tail of the normalized forms
+            suffix_len = len(suffix.rdns)
+            if suffix_len > len(self.rdns):
+                return False
+            if suffix_len == 0:
+                return True
+            return self._get_key()[-suffix_len:] == suffix._get_key()
+
         return self._tailmatch(suffix, start, end, +1)
 
     def _tailmatch(self, pattern, start, end, direction):
@@ -1317,7 +1428,7 @@ class DN(object):
                 start = end - pat_len
 
         if end-start >= pat_len:
-            return not self._cmp_sequence(pattern, start, pat_len)
+            return self._get_key()[start:start + pat_len] == pattern._get_key()
         return 0
 
     def __contains__(self, other):
@@ -1329,12 +1440,13 @@ class DN(object):
         if isinstance(other, RDN):
             other = DN(other)
         if isinstance(other, DN):
-            other_len = len(other)
-            end = len(self) - other_len
+            key = self._get_key()
+            other_key = other._get_key()
+            other_len = len(other_key)
+            end = len(key) - other_len
             i = 0
             while i <= end:
-                result = self._cmp_sequence(other, i, other_len)
-                if result == 0:
+                if key[i:i + other_len] == other_key:
                     return True
                 i += 1
             return False
@@ -1367,9 +1479,10 @@ class DN(object):
         i = start
         stop = max(start, end - pat_len)
 
+        key = self._get_key()
+        pat_key = pattern._get_key()
         while i <= stop:
-            result = self._cmp_sequence(pattern, i, pat_len)
-            if result == 0:
+            if key[i:i + pat_len] == pat_key:
                 return i
             i += 1
         return -1
@@ -1410,9 +1523,10 @@ class DN(object):
         i = max(start, min(end, self_len - pat_len))
         stop = start
 
+        key = self._get_key()
+        pat_key = pattern._get_key()
         while i >= stop:
-            result = self._cmp_sequence(pattern, i, pat_len)
-            if result == 0:
+            if key[i:i + pat_len] == pat_key:
                 return i
             i -= 1
         return -1
@@ -21,6 +21,9 @@ import collections
 import gzip
 import io
 import logging
+import socket
+import threading
+import time
 import xml.dom.minidom
 import zlib
 
@@ -31,7 +34,8 @@ from six.moves.urllib.parse import urlencode
 
 # pylint: disable=ipa-forbidden-import
 from ipalib import api, errors
-from ipalib.util import create_https_connection
+from ipalib.util import (
+    create_https_connection, create_https_context, ResumableHTTPSConnection)
 from ipalib.errors import NetworkError
 from ipalib.text import _
 # pylint: enable=ipa-forbidden-import
@@ -149,13 +153,272 @@ def ca_status(ca_host=None):
     return _parse_ca_status(body)
 
 
+# requests which can be repeated without changing the result, RFC 7231
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT',
+                                'DELETE'])
+
+
+def _closed_before_response(e):
+    """
+    Check whether ``e`` means that the server closed the connection
+    without sending any part of a response.
+    """
+    remote_disconnected = getattr(httplib, 'RemoteDisconnected', None)
+    if remote_disconnected is not None:
+        return isinstance(e, remote_disconnected)
+    # Python 2 reports an empty status line
+    return (isinstance(e, httplib.BadStatusLine) and
+            e.line in ('', "''"))
+
+
+class HTTPSConnectionPool(object):
+    """
+    Per-process pool of keep-alive client authenticated HTTPS connections.
+
+    Connections are keyed by host, port and TLS settings (trusted CAs,
+    client certificate and TLS versions). Each key has its own SSLContext
+    and the TLS session of the last connection is resumed by new
+    connections, so the certificate chain is loaded only once and most
+    new connections avoid a full handshake.
+
+    At most ``max_per_host`` connections to a host and port are in use at
+    the same time; further requests wait up to ``timeout`` seconds for a
+    connection to be released. Connections idle for more than
+    ``idle_timeout`` seconds are closed.
+    """
+
+    def __init__(self, max_per_host=8, idle_timeout=30, timeout=None):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        # key -> SSLContext
+        self._contexts = {}
+        # key -> last TLS session
+        self._sessions = {}
+        # key -> list of (conn, last_used), least recently used first
+        self._idle = {}
+        # (host, port) -> number of connections in use
+        self._active = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reconnects = 0
+
+    def _evict_expired(self, now):
+        """
+        Remove expired idle connections; must be called with lock held.
+        Returns the list of removed connections.
+        """
+        expired = []
+        for key, idle in list(self._idle.items()):
+            expired.extend(conn for conn, last_used in idle
+                           if now - last_used > self.idle_timeout)
+            idle = [item for item in idle
+                    if now - item[1] <= self.idle_timeout]
+            if idle:
+                self._idle[key] = idle
+            else:
+                del self._idle[key]
+        self.evictions += len(expired)
+        return expired
+
+    @staticmethod
+    def _close(conns):
+        for conn in conns:
+            conn.close()
+
+    def _get_context(self, key):
+        """
+        Return the SSLContext for ``key``; must be called with lock held.
+        """
+        try:
+            return self._contexts[key]
+        except KeyError:
+            _host, _port, ssl_options = key
+            ctx = create_https_context(**dict(ssl_options))
+            self._contexts[key] = ctx
+            return ctx
+
+    def acquire(self, host, port, **ssl_options):
+        """
+        Return a connection to ``host``:``port`` using the TLS settings
+        ``ssl_options`` (see ``create_https_context``).
+
+        The returned connection is either an idle connection which was
+        used before or a new one, which is not connected yet.
+        """
+        key = (host, port, tuple(sorted(ssl_options.items())))
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+
+        with self._cond:
+            while self._active.get((host, port), 0) >= self.max_per_host:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise NetworkError(
+                            uri='https://%s' % ipautil.format_netloc(
+                                host, port),
+                            error=_('too many concurrent connections'))
+                    self._cond.wait(remaining)
+
+            expired = self._evict_expired(time.time())
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()[0]
+                if not idle:
+                    del self._idle[key]
+                self.hits += 1
+            else:
+                ctx = self._get_context(key)
+                conn = ResumableHTTPSConnection(host, port, context=ctx)
+                conn.tls_session = self._sessions.get(key)
+                self.misses += 1
+            conn.pool_key = key
+            self._active[host, port] = self._active.get((host, port), 0) + 1
+        self._close(expired)
+        return conn
+
+    def release(self, conn, reuse=True):
+        """
+        Return a connection acquired from the pool.
+
+        If ``reuse`` is False, the connection is closed instead of being
+        kept for the next request.
+        """
+        key = conn.pool_key
+        session = getattr(conn.sock, 'session', None)
+        if not reuse or conn.sock is None:
+            conn.close()
+            reuse = False
+        with self._cond:
+            host, port, _ssl_options = key
+            self._active[host, port] -= 1
+            if session is not None:
+                self._sessions[key] = session
+            expired = self._evict_expired(time.time())
+            if reuse:
+                idle = self._idle.setdefault(key, [])
+                idle.append((conn, time.time()))
+                while len(idle) > self.max_per_host:
+                    expired.append(idle.pop(0)[0])
+                    self.evictions += 1
+            self._cond.notify()
+        self._close(expired)
+
+    def request(self, host, port, method, url, body, headers,
+                **ssl_options):
+        """
+        Perform an HTTPS request on a pooled connection.
+
+        A reused connection may have been closed by the server in the
+        meantime. The request is retried once on a new connection if it
+        could not have been processed by the server, i.e. sending it
+        failed or the server closed the connection without a response,
+        or if the method is idempotent. Timeouts are never retried.
+
+        :return:  (response, http_body)
+        """
+        retried = False
+        while True:
+            conn = self.acquire(host, port, **ssl_options)
+            reused = conn.sock is not None
+            sent = False
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                sent = True
+                res = conn.getresponse()
+                http_body = res.read()
+            except (httplib.BadStatusLine, socket.error) as e:
+                self.release(conn, reuse=False)
+                if (not reused or retried or
+                        isinstance(e, socket.timeout) or
+                        not (not sent or _closed_before_response(e) or
+                             method.upper() in IDEMPOTENT_METHODS)):
+                    raise
+                logger.debug("reused connection failed, reconnecting: %s",
+                             e)
+                # the other idle connections were most likely closed by
+                # the server as well, retry on a new connection
+                with self._cond:
+                    self.reconnects += 1
+                    stale = [item[0]
+                             for item in self._idle.pop(conn.pool_key, [])]
+                    self.evictions += len(stale)
+                self._close(stale)
+                retried = True
+                continue
+            except BaseException:
+                self.release(conn, reuse=False)
+                raise
+            self.release(conn, reuse=not res.will_close)
+            return res, http_body
+
+    def clear(self):
+        """
+        Close all idle connections.
+        """
+        with self._cond:
+            conns = [item[0] for idle in self._idle.values()
+                     for item in idle]
+            self._idle = {}
+        self._close(conns)
+
+    def stats(self):
+        """
+        Return pool counters for monitoring.
+        """
+        with self._cond:
+            return dict(
+                size=sum(len(idle) for idle in self._idle.values()),
+                active=sum(self._active.values()),
+                max_per_host=self.max_per_host,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                reconnects=self.reconnects,
+            )
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Return the process-wide pool of HTTPS connections to Dogtag.
+
+    The pool is configured by ``dogtag_pool_size`` and
+    ``dogtag_pool_idle_timeout`` when first used. Returns None if pooling
+    is disabled.
+    """
+    global _connection_pool
+
+    if api.env.dogtag_pool_size <= 0:
+        return None
+
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = HTTPSConnectionPool(
+                max_per_host=api.env.dogtag_pool_size,
+                idle_timeout=api.env.dogtag_pool_idle_timeout,
+                timeout=api.env.http_timeout)
+        return _connection_pool
+
+
 def https_request(
         host, port, url, cafile, client_certfile, client_keyfile,
-        method='POST', headers=None, body=None, **kw):
+        method='POST', headers=None, body=None, pool=None, **kw):
     """
     :param method: HTTP request method (defalut: 'POST')
     :param url: The path (not complete URL!) to post to.
     :param body: The request body (encodes kw if None)
+    :param pool: HTTPSConnectionPool to take the connection from; a new
+                 connection is used if None
     :param kw:  Keyword arguments to encode into POST body.
     :return:   (http_status, http_headers, http_body)
                as (integer, dict, str)
@@ -174,6 +437,19 @@ def https_request(
 
     if body is None:
         body = urlencode(kw)
+
+    if pool is not None:
+        return _httplib_request(
+            'https', host, port, url, None, body,
+            method=method, headers=headers,
+            connection_options=dict(
+                cafile=cafile,
+                client_certfile=client_certfile,
+                client_keyfile=client_keyfile,
+                tls_version_min=api.env.tls_version_min,
+                tls_version_max=api.env.tls_version_max),
+            pool=pool)
+
     return _httplib_request(
         'https', host, port, url, connection_factory, body,
         method=method, headers=headers)
@@ -202,7 +478,7 @@ def http_request(host, port, url, timeout=None, **kw):
 
 def _httplib_request(
         protocol, host, port, path, connection_factory, request_body,
-        method='POST', headers=None, connection_options=None):
+        method='POST', headers=None, connection_options=None, pool=None):
     """
     :param request_body: Request body
     :param connection_factory: Connection class to use. Will be called
@@ -210,6 +486,9 @@ def _httplib_request(
     :param method: HTTP request method (default: 'POST')
     :param connection_options: a dictionary that will be passed to
         connection_factory as keyword arguments.
+    :param pool: HTTPSConnectionPool to take the connection from instead
+        of calling connection_factory; connection_options are passed to
+        the pool as TLS settings.
 
     Perform a HTTP(s) request.
     """
@@ -228,14 +507,19 @@ def _httplib_request(
         headers['content-type'] = 'application/x-www-form-urlencoded'
 
     try:
-        conn = connection_factory(host, port, **connection_options)
-        conn.request(method, uri, body=request_body, headers=headers)
-        res = conn.getresponse()
+        if pool is not None:
+            res, http_body = pool.request(
+                host, port, method, uri, request_body, headers,
+                **connection_options)
+        else:
+            conn = connection_factory(host, port, **connection_options)
+            conn.request(method, uri, body=request_body, headers=headers)
+            res = conn.getresponse()
+            http_body = res.read()
+            conn.close()
 
         http_status = res.status
         http_headers = res.msg
-        http_body = res.read()
-        conn.close()
     except Exception as e:
         logger.debug("httplib request failed:", exc_info=True)
         raise NetworkError(uri=uri, error=str(e))
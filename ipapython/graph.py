@@ -10,16 +10,29 @@ class Graph(object):
 
     G = (V, E) where G is graph, V set of vertices and E list of edges.
     E = (tail, head) where tail and head are vertices
+
+    Forward and reverse adjacency sets are maintained so that adding and
+    removing edges and getting heads and tails of a vertex don't need to
+    scan all edges.
     """
 
     def __init__(self):
         self.vertices = set()
-        self.edges = []
         self._adj = dict()
+        self._radj = dict()
+
+    @property
+    def edges(self):
+        return [
+            (tail, head)
+            for tail, heads in self._adj.items()
+            for head in heads
+        ]
 
     def add_vertex(self, vertex):
         self.vertices.add(vertex)
-        self._adj[vertex] = []
+        self._adj[vertex] = set()
+        self._radj[vertex] = set()
 
     def add_edge(self, tail, head):
         if tail not in self.vertices:
@@ -28,17 +41,17 @@ class Graph(object):
         if head not in self.vertices:
             raise ValueError("head is not a vertex")
 
-        self.edges.append((tail, head))
-        self._adj[tail].append(head)
+        self._adj[tail].add(head)
+        self._radj[head].add(tail)
 
     def remove_edge(self, tail, head):
         try:
-            self.edges.remove((tail, head))
+            self._adj[tail].remove(head)
         except KeyError:
             raise ValueError(
                 "graph does not contain edge: ({0}, {1})".format(tail, head)
             )
-        self._adj[tail].remove(head)
+        self._radj[head].remove(tail)
 
     def remove_vertex(self, vertex):
         try:
@@ -48,35 +61,34 @@ class Graph(object):
                 "graph does not contain vertex: {0}".format(vertex)
             )
 
-        # delete _adjacencies
-        del self._adj[vertex]
-        for adj in self._adj.values():
-            adj[:] = [v for v in adj if v != vertex]
-
-        # delete edges
-        self.edges = [
-            e for e in self.edges if vertex not in (e[0], e[1])
-        ]
+        # delete adjacencies
+        for head in self._adj.pop(vertex):
+            self._radj[head].discard(vertex)
+        for tail in self._radj.pop(vertex):
+            self._adj[tail].discard(vertex)
 
     def get_tails(self, head):
         """
         Get list of vertices where a vertex is on the right side of an edge
         """
-        return [e[0] for e in self.edges if e[1] == head]
+        return list(self._radj.get(head, ()))
 
     def get_heads(self, tail):
         """
         Get list of vertices where a vertex is on the left side of an edge
         """
-        return [e[1] for e in self.edges if e[0] == tail]
+        return list(self._adj.get(tail, ()))
 
-    def bfs(self, start=None):
+    def bfs(self, start=None, excluded=frozenset()):
         """
         Breadth-first search traversal of the graph from `start` vertex.
         Return a set of all visited vertices
+
+        Vertices in `excluded` are treated as if they were removed from the
+        graph.
         """
         if not start:
-            start = next(iter(self.vertices))
+            start = next(iter(self.vertices - excluded))
         visited = set()
         queue = deque([start])
 
@@ -84,5 +96,97 @@ class Graph(object):
             vertex = queue.popleft()
             if vertex not in visited:
                 visited.add(vertex)
-                queue.extend(set(self._adj.get(vertex, [])) - visited)
+                queue.extend(
+                    self._adj.get(vertex, set()) - visited - excluded)
         return visited
+
+    def get_strongly_connected_components(self, excluded=frozenset()):
+        """
+        Get strongly connected components of the graph.
+
+        Return a list of sets of vertices in reverse topological order of the
+        condensed graph, i.e. components come after all components reachable
+        from them.
+
+        Vertices in `excluded` are treated as if they were removed from the
+        graph. Non-recursive variant of Tarjan's algorithm; runs in
+        O(V + E).
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+
+        for root in self.vertices:
+            if root in index or root in excluded:
+                continue
+
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._adj[root]))]
+
+            while work:
+                vertex, heads = work[-1]
+                for head in heads:
+                    if head in excluded:
+                        continue
+                    if head not in index:
+                        index[head] = lowlink[head] = len(index)
+                        stack.append(head)
+                        on_stack.add(head)
+                        work.append((head, iter(self._adj[head])))
+                        break
+                    elif head in on_stack:
+                        lowlink[vertex] = min(lowlink[vertex], index[head])
+                else:
+                    work.pop()
+                    if work:
+                        tail = work[-1][0]
+                        lowlink[tail] = min(lowlink[tail], lowlink[vertex])
+                    if lowlink[vertex] == index[vertex]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.add(member)
+                            if member == vertex:
+                                break
+                        components.append(component)
+
+        return components
+
+    def get_reachable(self, excluded=frozenset(), components=None):
+        """
+        Get vertices reachable from each vertex of the graph.
+
+        Return a dict mapping each vertex to a frozenset of vertices
+        reachable from it, including the vertex itself. Vertices in the same
+        strongly connected component share the same set.
+
+        `components` may be passed if strongly connected components were
+        already computed with the same `excluded` vertices.
+        """
+        if components is None:
+            components = self.get_strongly_connected_components(excluded)
+        reachable = {}
+
+        # components reachable from a component come before it
+        for component in components:
+            heads = set()
+            for vertex in component:
+                heads.update(self._adj[vertex])
+            heads -= component
+            heads -= excluded
+
+            visited = set(component)
+            for head in heads:
+                if head not in visited:
+                    visited |= reachable[head]
+            visited = frozenset(visited)
+
+            for vertex in component:
+                reachable[vertex] = visited
+
+        return reachable
@@ -20,6 +20,7 @@
 #
 
 import binascii
+import collections
 import errno
 import logging
 import time
@@ -29,7 +30,9 @@ from copy import deepcopy
 import contextlib
 import os
 import pwd
+import threading
 import warnings
+import weakref
 
 # pylint: disable=import-error
 from six.moves.urllib.parse import urlparse
@@ -41,6 +44,7 @@ import ldap
 import ldap.sasl
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl, GetEffectiveRightsControl
+from ldap.controls.sss import SSSRequestControl
 import six
 
 # pylint: disable=ipa-forbidden-import
@@ -218,6 +222,52 @@ class SchemaCache(object):
 schema_cache = SchemaCache()
 
 
+_AttributeType = collections.namedtuple(
+    '_AttributeType', ['syntax', 'decoder', 'names'])
+
+# schema -> {LDAPClient subclass -> {attribute name or OID -> _AttributeType}}
+_schema_attribute_types = weakref.WeakKeyDictionary()
+# {LDAPClient subclass -> {attribute name or OID -> _AttributeType}}
+_no_schema_attribute_types = {}
+_attribute_types_lock = threading.Lock()
+
+
+def _decode_bytes(val):
+    return val
+
+
+def _decode_unicode(val):
+    return val.decode('utf-8')
+
+
+def _decode_datetime(val):
+    return datetime.datetime.strptime(
+        val.decode('utf-8'), LDAP_GENERALIZED_TIME_FORMAT)
+
+
+def _decode_dnsname(val):
+    return DNSName.from_text(val.decode('utf-8'))
+
+
+def _decode_dn(val):
+    return DN(val.decode('utf-8'))
+
+
+def _decode_principal(val):
+    return Principal(val.decode('utf-8'))
+
+
+_DECODERS = {
+    bytes: _decode_bytes,
+    unicode: _decode_unicode,
+    datetime.datetime: _decode_datetime,
+    DNSName: _decode_dnsname,
+    DN: _decode_dn,
+    Principal: _decode_principal,
+    crypto_x509.Certificate: x509.load_der_x509_certificate,
+}
+
+
 class LDAPEntry(MutableMapping):
     __slots__ = ('_conn', '_dn', '_names', '_nice', '_raw', '_sync',
                  '_not_list', '_orig_raw', '_raw_view',
@@ -329,6 +379,21 @@ class LDAPEntry(MutableMapping):
         if nice == nice_sync and raw == raw_sync:
             return
 
+        if (not nice and not nice_sync and not raw_sync and
+                len(set(raw)) == len(raw)):
+            # raw values were just set, typically from a search result;
+            # decode them all at once
+            try:
+                nice.extend(self._conn.decode(raw, name))
+            except ValueError as e:
+                raise ValueError("{error} in LDAP entry '{dn}'".format(
+                    error=e, dn=self._dn))
+            # values of all the decoded types are immutable
+            self._sync[name] = (list(nice), list(raw))
+            if len(nice) > 1:
+                self._not_list.discard(name)
+            return
+
         nice_adds = set(nice) - set(nice_sync)
         nice_dels = set(nice_sync) - set(nice)
         raw_adds = set(raw) - set(raw_sync)
@@ -386,18 +451,10 @@ class LDAPEntry(MutableMapping):
         if name in self._names:
             return self._names[name]
 
-        if self._conn.schema is not None:
-            if six.PY2:
-                encoded_name = name.encode('utf-8')
-            else:
-                encoded_name = name
-            attrtype = self._conn.schema.get_obj(
-                ldap.schema.AttributeType, encoded_name)
-            if attrtype is not None:
-                for altname in attrtype.names:
-                    if six.PY2:
-                        altname = altname.decode('utf-8')
-                    self._names[altname] = name
+        # pylint: disable=protected-access
+        for altname in self._conn._get_attribute_type_info(name).names:
+            self._names[altname] = name
+        # pylint: enable=protected-access
 
         self._names[name] = name
 
@@ -538,7 +595,9 @@ class LDAPEntry(MutableMapping):
         if other is None:
             other = self
         assert isinstance(other, LDAPEntry)
-        self._orig_raw = deepcopy(dict(other.raw))
+        # raw values are immutable bytes, copying the lists is enough
+        self._orig_raw = {
+            name: list(value) for name, value in other.raw.items()}
 
     def generate_modlist(self):
         modlist = []
@@ -781,6 +840,7 @@ class LDAPClient(object):
 
         self._has_schema = False
         self._schema = None
+        self._attribute_types = None
 
         self._conn = self._connect()
 
@@ -844,27 +904,78 @@ class LDAPClient(object):
         # bypass ldap2's locking
         object.__setattr__(self, '_has_schema', False)
         object.__setattr__(self, '_schema', None)
+        object.__setattr__(self, '_attribute_types', None)
 
-    def get_attribute_type(self, name_or_oid):
-        if not self._decode_attrs:
-            return bytes
+    def _get_attribute_types(self):
+        """
+        Return the table of attribute types for the current schema.
 
+        The table maps lower-cased attribute names and OIDs to
+        ``_AttributeType`` and is shared by all connections of the same
+        class using the same schema. It is filled on first use of each
+        attribute.
+        """
+        table = self._attribute_types
+        if table is not None:
+            return table
+
+        schema = self._get_schema()
+        with _attribute_types_lock:
+            if schema is None:
+                tables = _no_schema_attribute_types
+            else:
+                tables = _schema_attribute_types.setdefault(schema, {})
+            table = tables.setdefault(type(self), {})
+
+        # bypass ldap2's locking
+        object.__setattr__(self, '_attribute_types', table)
+        return table
+
+    def _get_attribute_type_info(self, name_or_oid):
+        """
+        Return ``_AttributeType`` with the syntax type, the decoder and
+        the names of attribute ``name_or_oid``.
+        """
         if six.PY2:
             if isinstance(name_or_oid, unicode):
                 name_or_oid = name_or_oid.encode('utf-8')
 
-        # Is this a special case attribute?
-        if name_or_oid in self._SYNTAX_OVERRIDE:
-            return self._SYNTAX_OVERRIDE[name_or_oid]
+        table = self._get_attribute_types()
+        key = name_or_oid.lower()
+        try:
+            return table[key]
+        except KeyError:
+            pass
 
+        obj = None
         schema = self._get_schema()
         if schema is not None:
-            # Try to lookup the syntax in the schema returned by the server
             obj = schema.get_obj(ldap.schema.AttributeType, name_or_oid)
-            if obj is not None and obj.syntax in self._SYNTAX_MAPPING:
-                return self._SYNTAX_MAPPING[obj.syntax]
 
-        return unicode
+        # Is this a special case attribute?
+        if name_or_oid in self._SYNTAX_OVERRIDE:
+            syntax = self._SYNTAX_OVERRIDE[name_or_oid]
+        # Try to lookup the syntax in the schema returned by the server
+        elif obj is not None and obj.syntax in self._SYNTAX_MAPPING:
+            syntax = self._SYNTAX_MAPPING[obj.syntax]
+        else:
+            syntax = unicode
+
+        names = ()
+        if obj is not None:
+            names = tuple(obj.names)
+            if six.PY2:
+                names = tuple(altname.decode('utf-8') for altname in names)
+
+        info = table[key] = _AttributeType(
+            syntax, _DECODERS.get(syntax, syntax), names)
+        return info
+
+    def get_attribute_type(self, name_or_oid):
+        if not self._decode_attrs:
+            return bytes
+
+        return self._get_attribute_type_info(name_or_oid).syntax
 
     def has_dn_syntax(self, name_or_oid):
         """
@@ -938,23 +1049,11 @@ class LDAPClient(object):
         Decode attribute value from LDAP representation (str/bytes).
         """
         if isinstance(val, bytes):
-            target_type = self.get_attribute_type(attr)
+            if not self._decode_attrs:
+                return val
+            target_type, decoder = self._get_attribute_type_info(attr)[:2]
             try:
-                if target_type is bytes:
-                    return val
-                elif target_type is unicode:
-                    return val.decode('utf-8')
-                elif target_type is datetime.datetime:
-                    return datetime.datetime.strptime(
-                        val.decode('utf-8'), LDAP_GENERALIZED_TIME_FORMAT)
-                elif target_type is DNSName:
-                    return DNSName.from_text(val.decode('utf-8'))
-                elif target_type in (DN, Principal):
-                    return target_type(val.decode('utf-8'))
-                elif target_type is crypto_x509.Certificate:
-                    return x509.load_der_x509_certificate(val)
-                else:
-                    return target_type(val)
+                return decoder(val)
             except Exception:
                 msg = 'unable to convert the attribute %r value %r to type %s' % (attr, val, target_type)
                 logger.error('%s', msg)
@@ -1392,13 +1491,17 @@ class LDAPClient(object):
     def find_entries(
             self, filter=None, attrs_list=None, base_dn=None,
             scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
-            paged_search=False, get_effective_rights=False):
+            paged_search=False, get_effective_rights=False, sort_attrs=None):
         """
         Return a list of entries and indication of whether the results were
         truncated ([(dn, entry_attrs)], truncated) matching specified search
         parameters followed by truncated flag. If the truncated flag is True,
         search hit a server limit and its results are incomplete.
 
+        With ``sort_attrs``, the server sorts the matching entries before
+        applying the size limit, so a truncated result contains the first
+        entries in that order.
+
         Keyword arguments:
         :param attrs_list: list of attributes to return, all if None
                            (default None)
@@ -1410,6 +1513,8 @@ class LDAPClient(object):
                            (default unlimited)
         :param paged_search: search using paged results control
         :param get_effective_rights: use GetEffectiveRights control
+        :param sort_attrs: list of attributes to sort by using server side
+                           sort control (default unsorted)
 
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
@@ -1441,6 +1546,9 @@ class LDAPClient(object):
         base_sctrls = []
         if get_effective_rights:
             base_sctrls.append(self.__get_effective_rights_control())
+        if sort_attrs:
+            base_sctrls.append(
+                SSSRequestControl(criticality=True, ordering_rules=sort_attrs))
 
         cookie = ''
         page_size = (size_limit if size_limit > 0 else 2000) - 1
@@ -1522,6 +1630,90 @@ class LDAPClient(object):
 
         return (res, truncated)
 
+    def iter_entries(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=ldap.SCOPE_SUBTREE, time_limit=None, page_size=1000):
+        """
+        Iterate over entries matching specified search parameters.
+
+        Unlike find_entries, the result set is never held in memory. The
+        search uses the paged results control and the entries are yielded
+        one by one as they arrive from the server.
+
+        Keyword arguments:
+        :param attrs_list: list of attributes to return, all if None
+                           (default None)
+        :param base_dn: dn of the entry at which to start the search
+                        (default '')
+        :param scope: search scope, see LDAP docs (default ldap2.SCOPE_SUBTREE)
+        :param time_limit: time limit in seconds of a single page
+                           (default unlimited)
+        :param page_size: number of entries requested at once
+
+        :raises: errors.NotFound if base_dn doesn't exist
+        :raises: errors.LimitsExceeded if a server limit was hit
+        """
+        if base_dn is None:
+            base_dn = DN()
+        assert isinstance(base_dn, DN)
+        if not filter:
+            filter = '(objectClass=*)'
+
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if not isinstance(time_limit, float):
+            time_limit = float(time_limit)
+
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        if six.PY2:
+            filter = self.encode(filter)
+            attrs_list = self.encode(attrs_list)
+
+        cookie = ''
+        msgid = None
+        try:
+            while True:
+                sctrls = [SimplePagedResultsControl(0, page_size, cookie)]
+                with self.error_handler():
+                    msgid = self.conn.search_ext(
+                        str(base_dn), scope, filter, attrs_list,
+                        serverctrls=sctrls, timeout=time_limit)
+                while True:
+                    with self.error_handler():
+                        objtype, res_list, _res_id, res_ctrls = (
+                            self.conn.result3(msgid, 0))
+                    if objtype == ldap.RES_SEARCH_RESULT:
+                        msgid = None
+                        break
+                    for entry in self._convert_result(res_list):
+                        yield entry
+
+                # Get cookie for the next page
+                for ctrl in res_ctrls:
+                    if isinstance(ctrl, SimplePagedResultsControl):
+                        cookie = ctrl.cookie
+                        break
+                else:
+                    cookie = ''
+                if not cookie:
+                    break
+        finally:
+            # The consumer stopped early, release the search on the server
+            try:
+                if msgid is not None:
+                    self.conn.abandon(msgid)
+                elif cookie:
+                    sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+                    self.conn.search_ext_s(
+                        str(base_dn), scope, filter, attrs_list,
+                        serverctrls=sctrls, timeout=time_limit)
+            except ldap.LDAPError as e:
+                logger.warning("Error cancelling paged search: %s", e)
+
     def __get_effective_rights_control(self):
         """Construct a GetEffectiveRights control for current user."""
         bind_dn = self.conn.whoami_s()[4:]
@@ -19,6 +19,7 @@
 
 from __future__ import absolute_import
 
+import ctypes
 import os
 import six
 
@@ -36,14 +37,176 @@ from ipaplatform.paths import paths
 KEYRING = '@s'
 KEYTYPE = 'user'
 
+# special keyring IDs, linux/keyctl.h
+KEY_SPEC_SESSION_KEYRING = -3
+
+LIBKEYUTILS_FILENAME = 'libkeyutils.so.1'
+
+
+class KeyctlCommand(object):
+    """
+    Access the kernel keyring by executing keyctl
+    """
+    def search(self, key):
+        result = run([paths.KEYCTL, 'search', KEYRING, KEYTYPE, key],
+                     raiseonerr=False, capture_output=True)
+        if result.returncode:
+            raise ValueError('key %s not found' % key)
+        return int(result.raw_output)
+
+    def get_persistent(self, key):
+        result = run([paths.KEYCTL, 'get_persistent', KEYRING, key],
+                     raiseonerr=False, capture_output=True)
+        if result.returncode:
+            raise ValueError('persistent key %s not found' % key)
+        return int(result.raw_output)
+
+    def read(self, serial):
+        result = run([paths.KEYCTL, 'pipe', str(serial)], raiseonerr=False,
+                     capture_output=True)
+        if result.returncode:
+            raise ValueError('keyctl pipe failed: %s' % result.error_log)
+        return result.raw_output
+
+    def update(self, serial, value):
+        result = run([paths.KEYCTL, 'pupdate', str(serial)], stdin=value,
+                     raiseonerr=False)
+        if result.returncode:
+            raise ValueError('keyctl pupdate failed: %s' % result.error_log)
+
+    def add(self, key, value):
+        result = run([paths.KEYCTL, 'padd', KEYTYPE, key, KEYRING],
+                     stdin=value, raiseonerr=False)
+        if result.returncode:
+            raise ValueError('keyctl padd failed: %s' % result.error_log)
+
+    def unlink(self, serial):
+        result = run([paths.KEYCTL, 'unlink', str(serial), KEYRING],
+                     raiseonerr=False)
+        if result.returncode:
+            raise ValueError('keyctl unlink failed: %s' % result.error_log)
+
+    def list_keys(self):
+        result = run([paths.KEYCTL, 'list', KEYRING], raiseonerr=False,
+                     capture_output=True)
+        return result.output
+
+
+class LibKeyutils(KeyctlCommand):
+    """
+    Access the kernel keyring in-process using libkeyutils
+
+    Keys are listed by executing keyctl.
+    """
+    key_serial_t = ctypes.c_int32
+
+    def __init__(self, filename=LIBKEYUTILS_FILENAME):
+        lib = ctypes.CDLL(filename, use_errno=True)
+        key_serial_t = self.key_serial_t
+
+        self._add_key = lib.add_key
+        self._add_key.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p,
+            ctypes.c_size_t, key_serial_t]
+        self._add_key.restype = key_serial_t
+
+        self._keyctl_search = lib.keyctl_search
+        self._keyctl_search.argtypes = [
+            key_serial_t, ctypes.c_char_p, ctypes.c_char_p, key_serial_t]
+        self._keyctl_search.restype = ctypes.c_long
+
+        self._keyctl_read = lib.keyctl_read
+        self._keyctl_read.argtypes = [
+            key_serial_t, ctypes.c_char_p, ctypes.c_size_t]
+        self._keyctl_read.restype = ctypes.c_long
+
+        self._keyctl_update = lib.keyctl_update
+        self._keyctl_update.argtypes = [
+            key_serial_t, ctypes.c_void_p, ctypes.c_size_t]
+        self._keyctl_update.restype = ctypes.c_long
+
+        self._keyctl_unlink = lib.keyctl_unlink
+        self._keyctl_unlink.argtypes = [key_serial_t, key_serial_t]
+        self._keyctl_unlink.restype = ctypes.c_long
+
+        self._keyctl_get_persistent = lib.keyctl_get_persistent
+        self._keyctl_get_persistent.argtypes = [ctypes.c_uint, key_serial_t]
+        self._keyctl_get_persistent.restype = ctypes.c_long
+
+    @staticmethod
+    def _error(operation):
+        return ValueError('keyctl %s failed: %s' % (
+            operation, os.strerror(ctypes.get_errno())))
+
+    @staticmethod
+    def _encode(key):
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        return key
+
+    def search(self, key):
+        serial = self._keyctl_search(
+            KEY_SPEC_SESSION_KEYRING, KEYTYPE.encode('ascii'),
+            self._encode(key), 0)
+        if serial < 0:
+            raise ValueError('key %s not found' % key)
+        return serial
+
+    def get_persistent(self, key):
+        try:
+            uid = int(key)
+        except ValueError:
+            raise ValueError('persistent key %s not found' % key)
+        serial = self._keyctl_get_persistent(uid, KEY_SPEC_SESSION_KEYRING)
+        if serial < 0:
+            raise ValueError('persistent key %s not found' % key)
+        return serial
+
+    def read(self, serial):
+        size = 0
+        while True:
+            buf = ctypes.create_string_buffer(size) if size else None
+            result = self._keyctl_read(serial, buf, size)
+            if result < 0:
+                raise self._error('pipe')
+            if result <= size:
+                return buf.raw[:result] if buf is not None else b''
+            # the payload is larger than the buffer, it may have been
+            # updated since its size was read
+            size = result
+
+    def update(self, serial, value):
+        if self._keyctl_update(serial, value, len(value)) < 0:
+            raise self._error('pupdate')
+
+    def add(self, key, value):
+        serial = self._add_key(
+            KEYTYPE.encode('ascii'), self._encode(key), value, len(value),
+            KEY_SPEC_SESSION_KEYRING)
+        if serial < 0:
+            raise self._error('padd')
+
+    def unlink(self, serial):
+        if self._keyctl_unlink(serial, KEY_SPEC_SESSION_KEYRING) < 0:
+            raise self._error('unlink')
+
+
+def _get_keyctl(filename=LIBKEYUTILS_FILENAME):
+    try:
+        return LibKeyutils(filename)
+    except (OSError, AttributeError):
+        # libkeyutils is not available or too old
+        return KeyctlCommand()
+
+
+_keyctl = _get_keyctl()
+
 
 def dump_keys():
     """
     Dump all keys
     """
-    result = run([paths.KEYCTL, 'list', KEYRING], raiseonerr=False,
-                 capture_output=True)
-    return result.output
+    return _keyctl.list_keys()
 
 
 def get_real_key(key):
@@ -52,11 +215,7 @@ def get_real_key(key):
     so find the one we're looking for.
     """
     assert isinstance(key, six.string_types)
-    result = run([paths.KEYCTL, 'search', KEYRING, KEYTYPE, key],
-                 raiseonerr=False, capture_output=True)
-    if result.returncode:
-        raise ValueError('key %s not found' % key)
-    return result.raw_output.rstrip()
+    return str(_keyctl.search(key)).encode('ascii')
 
 
 def get_persistent_key(key):
@@ -67,11 +226,7 @@ def get_persistent_key(key):
     Assert when key is not a string-type.
     """
     assert isinstance(key, six.string_types)
-    result = run([paths.KEYCTL, 'get_persistent', KEYRING, key],
-                 raiseonerr=False, capture_output=True)
-    if result.returncode:
-        raise ValueError('persistent key %s not found' % key)
-    return result.raw_output.rstrip()
+    return str(_keyctl.get_persistent(key)).encode('ascii')
 
 
 def is_persistent_keyring_supported():
@@ -93,7 +248,7 @@ def has_key(key):
     """
     assert isinstance(key, six.string_types)
     try:
-        get_real_key(key)
+        _keyctl.search(key)
         return True
     except ValueError:
         return False
@@ -106,13 +261,7 @@ def read_key(key):
     Use pipe instead of print here to ensure we always get the raw data.
     """
     assert isinstance(key, six.string_types)
-    real_key = get_real_key(key)
-    result = run([paths.KEYCTL, 'pipe', real_key], raiseonerr=False,
-                 capture_output=True)
-    if result.returncode:
-        raise ValueError('keyctl pipe failed: %s' % result.error_log)
-
-    return result.raw_output
+    return _keyctl.read(_keyctl.search(key))
 
 
 def update_key(key, value):
@@ -121,14 +270,12 @@ def update_key(key, value):
     """
     assert isinstance(key, six.string_types)
     assert isinstance(value, bytes)
-    if has_key(key):
-        real_key = get_real_key(key)
-        result = run([paths.KEYCTL, 'pupdate', real_key], stdin=value,
-                     raiseonerr=False)
-        if result.returncode:
-            raise ValueError('keyctl pupdate failed: %s' % result.error_log)
-    else:
+    try:
+        serial = _keyctl.search(key)
+    except ValueError:
         add_key(key, value)
+    else:
+        _keyctl.update(serial, value)
 
 
 def add_key(key, value):
@@ -139,10 +286,7 @@ def add_key(key, value):
     assert isinstance(value, bytes)
     if has_key(key):
         raise ValueError('key %s already exists' % key)
-    result = run([paths.KEYCTL, 'padd', KEYTYPE, key, KEYRING],
-                 stdin=value, raiseonerr=False)
-    if result.returncode:
-        raise ValueError('keyctl padd failed: %s' % result.error_log)
+    _keyctl.add(key, value)
 
 
 def del_key(key):
@@ -150,8 +294,4 @@ def del_key(key):
     Remove a key from the keyring
     """
     assert isinstance(key, six.string_types)
-    real_key = get_real_key(key)
-    result = run([paths.KEYCTL, 'unlink', real_key, KEYRING],
-                 raiseonerr=False)
-    if result.returncode:
-        raise ValueError('keyctl unlink failed: %s' % result.error_log)
+    _keyctl.unlink(_keyctl.search(key))
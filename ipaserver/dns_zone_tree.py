@@ -0,0 +1,211 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+In-memory tree of the DNS zones stored in LDAP
+"""
+
+import collections
+import logging
+import threading
+
+from ipalib import errors
+from ipalib.request import context
+from ipapython.dn import DN
+
+logger = logging.getLogger(__name__)
+
+ZONE_FILTER = u'(|(objectclass=idnszone)(objectclass=idnsforwardzone))'
+
+ZONE_TREE_CACHE_SIZE = 64
+
+DNSZone = collections.namedtuple(
+    'DNSZone', ['name', 'dn', 'forward', 'active'])
+
+# principal -> ((numSubordinates, entryUSN), DNSZoneTree)
+_dns_zone_trees = collections.OrderedDict()
+_dns_zone_trees_lock = threading.Lock()
+
+
+class DNSZoneTree(object):
+    """
+    Label tree of master and forward zones
+
+    Each node is a dict mapping lower-case labels of child names to their
+    nodes, the zone at the node, if any, is a `DNSZone` stored under None.
+    """
+    def __init__(self, truncated=False):
+        self.root = {}
+        self.truncated = truncated
+
+    @staticmethod
+    def _labels(name):
+        return [label.lower()
+                for label in reversed(name.make_absolute().labels[:-1])]
+
+    def _get_node(self, name):
+        node = self.root
+        for label in self._labels(name):
+            node = node.get(label)
+            if node is None:
+                break
+        return node
+
+    def add_zone(self, name, dn, forward=False, active=True):
+        node = self.root
+        for label in self._labels(name):
+            node = node.setdefault(label, {})
+        node[None] = DNSZone(name.make_absolute(), dn, forward, active)
+
+    def get_zone(self, name):
+        """
+        Get `DNSZone` of zone ``name`` or None if it does not exist
+        """
+        node = self._get_node(name)
+        if node is None:
+            return None
+        return node.get(None)
+
+    def get_auth_zone(self, name):
+        """
+        Get the longest active master zone containing ``name`` or None
+        """
+        node = self.root
+        auth_zone = None
+        labels = self._labels(name)
+        for i in range(len(labels) + 1):
+            zone = node.get(None)
+            if zone is not None and zone.active and not zone.forward:
+                auth_zone = zone.name
+            if i == len(labels):
+                break
+            node = node.get(labels[i])
+            if node is None:
+                break
+        return auth_zone
+
+    def find_subtree_forward_zones(self, name, child_zones_only=False):
+        """
+        Get sorted list of active forward zone ``name`` and its active
+        child forward zones
+
+        :param child_zones_only: get only child zones
+        """
+        top = self._get_node(name)
+        if top is None:
+            return []
+        result = []
+        nodes = [top]
+        while nodes:
+            node = nodes.pop()
+            for label, child in node.items():
+                if label is not None:
+                    nodes.append(child)
+            zone = node.get(None)
+            if (zone is not None and zone.forward and zone.active and
+                    not (child_zones_only and node is top)):
+                result.append(zone.name)
+        return sorted(result)
+
+
+def _load_dns_zone_tree(ldap, base_dn):
+    """
+    Load zones from LDAP
+
+    :return: (tree, stamp); stamp is None if the tree cannot be validated
+    """
+    try:
+        container = ldap.get_entry(base_dn, ['numsubordinates'])
+        entries, truncated = ldap.find_entries(
+            filter=ZONE_FILTER,
+            attrs_list=['idnsname', 'objectclass', 'idnszoneactive',
+                        'entryusn'],
+            base_dn=base_dn,
+            scope=ldap.SCOPE_ONELEVEL
+        )
+    except errors.NotFound:
+        return DNSZoneTree(), None
+
+    tree = DNSZoneTree(truncated)
+    usns = []
+    for entry in entries:
+        objectclasses = [o.lower() for o in entry.get('objectclass', [])]
+        active = entry.single_value.get('idnszoneactive', u'FALSE')
+        tree.add_zone(entry.single_value['idnsname'], entry.dn,
+                      forward='idnsforwardzone' in objectclasses,
+                      active=str(active).upper() == 'TRUE')
+        usns.append(entry.single_value.get('entryusn'))
+
+    numsubordinates = container.single_value.get('numsubordinates')
+    if truncated or numsubordinates is None or None in usns:
+        return tree, None
+    return tree, (numsubordinates, max([int(usn) for usn in usns] or [0]))
+
+
+def _dns_zone_tree_changed(ldap, base_dn, stamp):
+    numsubordinates, usn = stamp
+    try:
+        container = ldap.get_entry(base_dn, ['numsubordinates'])
+    except errors.NotFound:
+        return True
+    if container.single_value.get('numsubordinates') != numsubordinates:
+        return True
+    try:
+        ldap.find_entries(
+            filter=u'(&%s(entryusn>=%d))' % (ZONE_FILTER, usn + 1),
+            attrs_list=['entryusn'],
+            base_dn=base_dn,
+            scope=ldap.SCOPE_ONELEVEL,
+            size_limit=1
+        )
+    except errors.NotFound:
+        return False
+    return True
+
+
+def get_dns_zone_tree(api_instance):
+    """
+    Get `DNSZoneTree` of the zones visible to the current principal
+
+    The tree is cached in the process and reused as long as no zone entry
+    has a higher entryUSN and the number of entries in the DNS container
+    did not change, which is checked once per request. Commands changing
+    zones have to call `invalidate_dns_zone_tree()`.
+    """
+    try:
+        return context.dns_zone_tree
+    except AttributeError:
+        pass
+
+    ldap = api_instance.Backend.ldap2
+    base_dn = DN(api_instance.env.container_dns, api_instance.env.basedn)
+    principal = getattr(context, 'principal', None)
+
+    with _dns_zone_trees_lock:
+        cached = _dns_zone_trees.pop(principal, None)
+
+    if cached is not None and not _dns_zone_tree_changed(ldap, base_dn,
+                                                         cached[0]):
+        stamp, tree = cached
+    else:
+        tree, stamp = _load_dns_zone_tree(ldap, base_dn)
+        logger.debug('Loaded DNS zone tree for %s', principal)
+
+    if stamp is not None:
+        with _dns_zone_trees_lock:
+            _dns_zone_trees[principal] = (stamp, tree)
+            while len(_dns_zone_trees) > ZONE_TREE_CACHE_SIZE:
+                _dns_zone_trees.popitem(last=False)
+
+    context.dns_zone_tree = tree
+    return tree
+
+
+def invalidate_dns_zone_tree():
+    """
+    Remove the DNS zone tree cached for the current request
+    """
+    try:
+        del context.dns_zone_tree
+    except AttributeError:
+        pass
@@ -34,7 +34,8 @@ from ipalib import api
 from ipapython import admintool
 from ipaplatform.paths import paths
 from ipaserver.install import installutils, schemaupdate
-from ipaserver.install.ldapupdate import LDAPUpdate, UPDATES_DIR, BadSyntax
+from ipaserver.install.ldapupdate import (
+    LDAPUpdate, UPDATES_DIR, BadSyntax, write_summary)
 from ipaserver.install.upgradeinstance import IPAUpgrade
 
 if six.PY3:
@@ -57,6 +58,9 @@ class LDAPUpdater(admintool.AdminTool):
         parser.add_option("-S", '--schema-file', action="append",
             dest="schema_files",
             help="custom schema ldif file to use (implies -s)")
+        parser.add_option("--summary", dest="summary_file",
+            metavar="FILE",
+            help="write summary of the update with timings in JSON to FILE")
 
     @classmethod
     def get_command_class(cls, options, args):
@@ -123,6 +127,9 @@ class LDAPUpdater_Upgrade(LDAPUpdater):
                 logger.info('Update complete')
             else:
                 logger.info('Update complete, no data were modified')
+        finally:
+            if options.summary_file and upgrade.update_summary is not None:
+                write_summary(options.summary_file, upgrade.update_summary)
 
         api.Backend.ldap2.disconnect()
 
@@ -149,7 +156,11 @@ class LDAPUpdater_NonUpgrade(LDAPUpdater):
         if not self.files:
             self.files = ld.get_all_files(UPDATES_DIR)
 
-        modified = ld.update(self.files) or modified
+        try:
+            modified = ld.update(self.files) or modified
+        finally:
+            if options.summary_file:
+                write_summary(options.summary_file, ld.summary)
 
         if modified:
             logger.info('Update complete')
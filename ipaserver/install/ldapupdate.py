@@ -24,8 +24,12 @@
 from __future__ import absolute_import
 
 import base64
+import hashlib
+import json
 import logging
+import string
 import sys
+import tempfile
 import uuid
 import time
 import os
@@ -50,6 +54,12 @@ logger = logging.getLogger(__name__)
 
 UPDATES_DIR=paths.UPDATES_DIR
 UPDATE_SEARCH_TIME_LIMIT = 30  # seconds
+ENTRY_ATTRS = ["*", "aci", "attributeTypes", "objectClasses"]
+STATE_VERSION = 1
+
+# parsed update files, keyed by fingerprint
+_parsed_updates = {}
+_PARSED_UPDATES_LIMIT = 256
 
 
 def connect(ldapi=False, realm=None, fqdn=None, dm_password=None):
@@ -133,11 +143,51 @@ def safe_output(attr, values):
     return values
 
 
+def write_summary(filename, summary):
+    """Write summary of an update as JSON"""
+    with open(filename, 'w') as f:
+        json.dump(summary, f, indent=1, sort_keys=True)
+
+
+def update_fingerprint(text, sub_dict):
+    """
+    Compute fingerprint of update file content.
+
+    The fingerprint covers the content and values of all template keywords
+    it references, i.e. it changes whenever the parsed updates would change.
+    """
+    h = hashlib.sha256(text.encode('utf-8'))
+    names = set()
+    for m in string.Template.pattern.finditer(text):
+        name = m.group('named') or m.group('braced')
+        if name:
+            names.add(name)
+    for name in sorted(names):
+        h.update(
+            u'\0{}={}'.format(name, sub_dict.get(name, u'')).encode('utf-8'))
+    return h.hexdigest()
+
+
+def entry_digest(entry):
+    """
+    Compute digest of entry state, None for an entry which does not exist
+    """
+    if entry is None:
+        return None
+    h = hashlib.sha256()
+    for attr in sorted(entry.raw, key=lambda a: a.lower()):
+        h.update(attr.lower().encode('utf-8'))
+        for value in sorted(entry.raw[attr]):
+            h.update(b'\0' + value)
+        h.update(b'\n')
+    return h.hexdigest()
+
+
 class LDAPUpdate(object):
     action_keywords = ["default", "add", "remove", "only", "onlyifexist", "deleteentry", "replace", "addifnew", "addifexist"]
 
     def __init__(self, dm_password=None, sub_dict={},
-                 online=True, ldapi=False):
+                 online=True, ldapi=False, state_file=paths.LDAPUPDATE_STATE):
         '''
         :parameters:
             dm_password
@@ -148,6 +198,10 @@ class LDAPUpdate(object):
                 Do an online LDAP update or use an experimental LDIF updater
             ldapi
                 Bind using ldapi. This assumes autobind is enabled.
+            state_file
+                File recording applied update files. Update files which
+                were applied with the same fingerprint and whose entries
+                were not modified since are skipped. None disables it.
 
         Data Structure Example:
         -----------------------
@@ -256,6 +310,11 @@ class LDAPUpdate(object):
         self.dm_password = dm_password
         self.conn = None
         self.modified = False
+        self.state_file = state_file
+        self.summary = None
+        self._prefetched = {}
+        self._entry_timings = []
+        self._incomplete = False
         self.online = online
         self.ldapi = ldapi
         self.pw_name = pwd.getpwuid(os.geteuid()).pw_name
@@ -515,6 +574,26 @@ class LDAPUpdate(object):
 
         return all_updates
 
+    def _parse_file(self, filename, data):
+        """
+        Parse update file, the result is cached by fingerprint of the file.
+
+        Returns a tuple (fingerprint, cached, updates)
+        """
+        fingerprint = update_fingerprint(''.join(data), self.sub_dict)
+        try:
+            updates = _parsed_updates[fingerprint]
+        except KeyError:
+            cached = False
+            updates = tuple(self.parse_update_file(filename, data, []))
+            if len(_parsed_updates) >= _PARSED_UPDATES_LIMIT:
+                _parsed_updates.clear()
+            _parsed_updates[fingerprint] = updates
+        else:
+            cached = True
+            logger.debug("Using cached parsed updates of '%s'", filename)
+        return fingerprint, cached, list(updates)
+
     def create_index_task(self, attribute):
         """Create a task to update an index for an attribute"""
 
@@ -616,11 +695,79 @@ class LDAPUpdate(object):
            The return type is ipaldap.LDAPEntry
         """
         assert isinstance(dn, DN)
+        try:
+            entry = self._prefetched.pop(dn)
+        except KeyError:
+            pass
+        else:
+            if entry is None:
+                raise errors.NotFound(reason="%s not found" % dn)
+            return [entry]
+
         searchfilter="objectclass=*"
-        sattrs = ["*", "aci", "attributeTypes", "objectClasses"]
         scope = ldap.SCOPE_BASE
 
-        return self.conn.get_entries(dn, scope, searchfilter, sattrs)
+        return self.conn.get_entries(dn, scope, searchfilter, ENTRY_ATTRS)
+
+    def _prefetch_entries(self, dns):
+        """Retrieve entries for DNs in as few searches as possible.
+
+           Entries are stored for later use by _get_entry(), None is stored
+           for entries which do not exist. Entries which could not be
+           retrieved are left out and get retrieved individually.
+
+           Entries with the same parent are retrieved by a single one-level
+           search. Returns the number of searches done.
+        """
+        by_parent = {}
+        for dn in dns:
+            by_parent.setdefault(dn[1:], set()).add(dn)
+
+        searches = 0
+        for parent, children in by_parent.items():
+            if len(children) == 1 or not parent:
+                for dn in children:
+                    searches += 1
+                    try:
+                        entry = self.conn.get_entries(
+                            dn, ldap.SCOPE_BASE, "objectclass=*",
+                            ENTRY_ATTRS)[0]
+                    except errors.NotFound:
+                        entry = None
+                    except errors.PublicError as e:
+                        logger.debug("Failed to prefetch %s: %s", dn, e)
+                        continue
+                    self._prefetched[dn] = entry
+                continue
+
+            rdn_filters = []
+            for dn in children:
+                rdn_filters.append(self.conn.combine_filters(
+                    [self.conn.make_filter_from_attr(ava.attr, ava.value)
+                     for ava in dn[0]],
+                    self.conn.MATCH_ALL))
+            searchfilter = self.conn.combine_filters(
+                [self.conn.combine_filters(rdn_filters, self.conn.MATCH_ANY),
+                 # subentries are returned only if asked for explicitly
+                 "(|(objectclass=*)(objectclass=ldapsubentry))"],
+                self.conn.MATCH_ALL)
+
+            searches += 1
+            try:
+                entries = self.conn.get_entries(
+                    parent, ldap.SCOPE_ONELEVEL, searchfilter, ENTRY_ATTRS)
+            except errors.NotFound:
+                entries = []
+            except errors.PublicError as e:
+                logger.debug("Failed to prefetch children of %s: %s",
+                             parent, e)
+                continue
+
+            found = {entry.dn: entry for entry in entries}
+            for dn in children:
+                self._prefetched[dn] = found.get(dn)
+
+        return searches
 
     def _apply_update_disposition(self, updates, entry):
         """
@@ -763,11 +910,30 @@ class LDAPUpdate(object):
             for l in value:
                 logger.debug("\t%s", safe_output(a, l))
 
+    def _writes_other_entries(self, entry):
+        """
+        Check whether a write of ``entry`` may make 389-DS plugins change
+        other entries, i.e. it is plugin configuration or a managed entry
+        """
+        if entry.dn.endswith(DN(('cn', 'config'))):
+            return True
+        if entry.dn.endswith(DN(('cn', 'Managed Entries'), ('cn', 'etc'),
+                                self.sub_dict['SUFFIX'])):
+            return True
+        objectclasses = {oc.lower() for oc in entry.raw.get('objectclass', [])}
+        return bool(objectclasses & {b'mepmanagedentry', b'meporiginentry'})
+
     def _update_record(self, update):
+        """
+        Apply update to an entry.
+
+        Returns 'added', 'updated', 'unchanged' or 'failed'
+        """
         found = False
 
         new_entry = self._create_default_entry(update.get('dn'),
                                                update.get('default'))
+        prefetched = new_entry.dn in self._prefetched
 
         try:
             e = self._get_entry(new_entry.dn)
@@ -792,7 +958,7 @@ class LDAPUpdate(object):
         entry = self._apply_update_disposition(update.get('updates'), entry)
         if entry is None:
             # It might be None if it is just deleting an entry
-            return
+            return 'unchanged'
 
         self.print_entity(entry, "Final value after applying updates")
 
@@ -806,16 +972,26 @@ class LDAPUpdate(object):
                     # It means the entry doesn't exist, so skip it.
                     try:
                         self.conn.add_entry(entry)
+                    except errors.DuplicateEntry:
+                        if not prefetched:
+                            raise
+                        # the entry was created after it was prefetched,
+                        # e.g. by a 389-DS plugin, update the live entry
+                        logger.debug("%s was created since it was "
+                                     "prefetched, updating it", entry.dn)
+                        return self._update_record(update)
                     except errors.NotFound:
                         # parent entry of the added entry does not exist
                         # this may not be an error (e.g. entries in NIS container)
                         logger.error("Parent DN of %s may not exist, cannot "
                                      "create the entry", entry.dn)
-                        return
+                        self._incomplete = True
+                        return 'failed'
                 added = True
                 self.modified = True
             except Exception as e:
                 logger.error("Add failure %s", e)
+                self._incomplete = True
         else:
             # Update LDAP
             try:
@@ -836,22 +1012,39 @@ class LDAPUpdate(object):
             except errors.DatabaseError as e:
                 logger.error("Update failed: %s", e)
                 updated = False
+                self._incomplete = True
             except errors.DuplicateEntry as e:
                 logger.debug("Update already exists, skip it: %s", e)
                 updated = False
             except errors.ACIError as e:
                 logger.error("Update failed: %s", e)
                 updated = False
+                self._incomplete = True
 
             if updated:
                 self.modified = True
 
+        if (added or updated) and self._prefetched and \
+                self._writes_other_entries(entry):
+            # entries prefetched for the rest of the file may be stale
+            self._prefetched.clear()
+
         if entry.dn.endswith(DN(('cn', 'index'), ('cn', 'userRoot'),
                                 ('cn', 'ldbm database'), ('cn', 'plugins'),
                                 ('cn', 'config'))) and (added or updated):
             taskid = self.create_index_task(entry.single_value['cn'])
             self.monitor_index_task(taskid)
-        return
+
+        if not found and not len(entry):
+            return 'unchanged'
+        elif added:
+            return 'added'
+        elif updated:
+            return 'updated'
+        elif found:
+            return 'unchanged'
+        else:
+            return 'failed'
 
     def _delete_record(self, updates):
         """
@@ -859,6 +1052,7 @@ class LDAPUpdate(object):
         """
 
         dn = updates['dn']
+        self._prefetched.pop(dn, None)
         try:
             logger.debug("Deleting entry %s", dn)
             self.conn.delete_entry(dn)
@@ -868,6 +1062,7 @@ class LDAPUpdate(object):
             self.modified = True
         except errors.DatabaseError as e:
             logger.error("Delete failed: %s", e)
+            self._incomplete = True
 
     def get_all_files(self, root, recursive=False):
         """Get all update files"""
@@ -883,6 +1078,8 @@ class LDAPUpdate(object):
 
     def _run_update_plugin(self, plugin_name):
         logger.debug("Executing upgrade plugin: %s", plugin_name)
+        # plugins may modify entries directly
+        self._prefetched.clear()
         restart_ds, updates = self.api.Updater[plugin_name]()
         if updates:
             self._run_updates(updates)
@@ -904,20 +1101,149 @@ class LDAPUpdate(object):
 
     def _run_updates(self, all_updates):
         for update in all_updates:
+            start = time.time()
             if 'deleteentry' in update:
                 self._delete_record(update)
+                timing = dict(dn=str(update['dn']), result='deleted')
             elif 'plugin' in update:
                 self._run_update_plugin(update['plugin'])
+                timing = dict(plugin=update['plugin'], result='executed')
             else:
-                self._update_record(update)
+                result = self._update_record(update)
+                timing = dict(dn=str(update['dn']), result=result)
+            timing['duration'] = round(time.time() - start, 6)
+            self._entry_timings.append(timing)
+
+    def _load_state(self):
+        """Load state of applied update files"""
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug("Cannot read update state file %s: %s",
+                         self.state_file, e)
+            return {}
+        if state.get('version') != STATE_VERSION:
+            return {}
+        return state.get('files', {})
+
+    def _save_state(self, files):
+        """Record state of applied update files, merging it with state
+        recorded by other updater runs"""
+        if not self.state_file:
+            return
+        state = self._load_state()
+        state.update(files)
+        dirname = os.path.dirname(self.state_file)
+        f = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                    mode='w', dir=dirname, delete=False) as f:
+                json.dump(dict(version=STATE_VERSION, files=state), f,
+                          indent=1, sort_keys=True)
+            os.rename(f.name, self.state_file)
+        except (IOError, OSError) as e:
+            logger.debug("Cannot write update state file %s: %s",
+                         self.state_file, e)
+            if f is not None and os.path.exists(f.name):
+                os.unlink(f.name)
+
+    def _is_applied(self, recorded, fingerprint, dns):
+        """Check that update file with fingerprint was applied and its
+        entries prefetched for dns did not change since"""
+        if not recorded or recorded.get('fingerprint') != fingerprint:
+            return False
+        entries = recorded.get('entries', {})
+        if len(entries) != len(dns):
+            return False
+        for dn in dns:
+            if dn not in self._prefetched:
+                return False
+            if entries.get(str(dn), False) != entry_digest(
+                    self._prefetched[dn]):
+                return False
+        return True
+
+    def _update_file(self, filename, state, applied):
+        """Apply single update file, returns summary of the file"""
+        start = time.time()
+        try:
+            logger.debug("Parsing update file '%s'", filename)
+            data = self.read_file(filename)
+        except Exception as e:
+            logger.error("error reading update file '%s'", filename)
+            raise RuntimeError(e)
+
+        fingerprint, cached, all_updates = self._parse_file(filename, data)
+        parsed = time.time()
+
+        # entry state is enough to tell whether an update file needs to be
+        # applied unless it runs plugins or deletes entries
+        recordable = filename != '-' and not any(
+            'plugin' in u or 'deleteentry' in u for u in all_updates)
+        dns = list({u['dn'] for u in all_updates if 'plugin' not in u})
+
+        self._prefetched.clear()
+        self._entry_timings = []
+        self._incomplete = False
+        key = os.path.abspath(filename)
+        summary = dict(
+            file=filename,
+            fingerprint=fingerprint,
+            parse_cached=cached,
+            searches=self._prefetch_entries(dns),
+            skipped=False,
+        )
+
+        try:
+            if recordable and self._is_applied(
+                    state.get(key), fingerprint, dns):
+                logger.debug("Update file '%s' was already applied, "
+                             "skipping", filename)
+                summary['skipped'] = True
+            else:
+                self._run_updates(all_updates)
+                if recordable and self.state_file and not self._incomplete:
+                    self._prefetched.clear()
+                    summary['searches'] += self._prefetch_entries(dns)
+                    if all(dn in self._prefetched for dn in dns):
+                        applied[key] = dict(
+                            fingerprint=fingerprint,
+                            entries={str(dn): entry_digest(
+                                self._prefetched[dn]) for dn in dns},
+                        )
+        finally:
+            self._prefetched.clear()
+
+        dur = time.time() - start
+        summary.update(
+            parse=round(parsed - start, 6),
+            duration=round(dur, 6),
+            entries=self._entry_timings,
+        )
+        self._entry_timings = []
+        logger.debug(
+            "LDAP update duration: %s %.03f sec", filename, dur,
+            extra={'timing': ('ldapupdate', filename, None, dur)}
+        )
+        return summary
 
     def update(self, files, ordered=True):
         """Execute the update. files is a list of the update files to use.
         :param ordered: Update files are executed in alphabetical order
 
         returns True if anything was changed, otherwise False
+
+        Summary of the update with timings of each file and entry is
+        available in the summary attribute afterwards.
         """
         self.modified = False
+        start = time.time()
+        self.summary = dict(files=[])
+        state = self._load_state()
+        applied = {}
         try:
             self.create_connection()
 
@@ -926,24 +1252,20 @@ class LDAPUpdate(object):
                 upgrade_files = sorted(files)
 
             for f in upgrade_files:
-                start = time.time()
-                try:
-                    logger.debug("Parsing update file '%s'", f)
-                    data = self.read_file(f)
-                except Exception as e:
-                    logger.error("error reading update file '%s'", f)
-                    raise RuntimeError(e)
-
-                all_updates = []
-                self.parse_update_file(f, data, all_updates)
-                self._run_updates(all_updates)
-                dur = time.time() - start
-                logger.debug(
-                    "LDAP update duration: %s %.03f sec", f, dur,
-                    extra={'timing': ('ldapupdate', f, None, dur)}
-                )
+                self.summary['files'].append(
+                    self._update_file(f, state, applied))
         finally:
             self.close_connection()
+            if applied:
+                self._save_state(applied)
+            self.summary.update(
+                modified=self.modified,
+                duration=round(time.time() - start, 6),
+                skipped=sum(1 for f in self.summary['files']
+                            if f['skipped']),
+            )
+            logger.debug("LDAP update summary: %s",
+                         json.dumps(self.summary, sort_keys=True))
 
         return self.modified
 
@@ -437,9 +437,8 @@ class update_managed_permissions(Updater):
             else:
                 if 'ipapermissiontype' not in legacy_entry:
                     if is_new:
-                        _acientry, acistr = (
-                            permission_plugin._get_aci_entry_and_string(
-                                legacy_entry, notfound_ok=True))
+                        acistr = permission_plugin._get_aci_string(
+                            legacy_entry, notfound_ok=True)
                         try:
                             included, excluded = self.get_upgrade_attr_lists(
                                 acistr, legacy_acistrs)
@@ -93,6 +93,7 @@ class IPAUpgrade(service.Service):
         self.savefilename = '%s/%s.ipa.%s' % (paths.ETC_DIRSRV_SLAPD_INSTANCE_TEMPLATE % serverid, DSE, ext)
         self.files = files
         self.modified = False
+        self.update_summary = None
         self.serverid = serverid
         self.schema_files = schema_files
 
@@ -271,7 +272,10 @@ class IPAUpgrade(service.Service):
             ld = ldapupdate.LDAPUpdate(dm_password='', ldapi=True)
             if len(self.files) == 0:
                 self.files = ld.get_all_files(ldapupdate.UPDATES_DIR)
-            self.modified = (ld.update(self.files) or self.modified)
+            try:
+                self.modified = (ld.update(self.files) or self.modified)
+            finally:
+                self.update_summary = ld.summary
         except ldapupdate.BadSyntax as e:
             logger.error('Bad syntax in upgrade %s', e)
             raise
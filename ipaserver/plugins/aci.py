@@ -20,16 +20,18 @@
 
 from copy import deepcopy
 import logging
+import threading
 
 import six
 
 from ipalib import api, crud, errors
 from ipalib import Object
 from ipalib import Flag, Str, StrEnum, DNParam
-from ipalib.aci import ACI
+from ipalib.aci import ACI, ACIIndex
 from ipalib import output
 from ipalib import _, ngettext
 from ipalib.plugable import Registry
+from ipalib.request import context
 from .baseldap import gen_pkey_only_option, pkey_to_value
 from ipapython.dn import DN
 
@@ -400,14 +402,58 @@ def _convert_strings_to_acis(acistrs):
             logger.warning("Failed to parse: %s", a)
     return acis
 
-def _find_aci_by_name(acis, aciprefix, aciname):
-    name = _make_aci_name(aciprefix, aciname).lower()
-    for a in acis:
-        if a.name.lower() == name:
-            return a
+def _find_aci_by_name(index, aciprefix, aciname):
+    for acistr in index.get(_make_aci_name(aciprefix, aciname)):
+        return ACI(acistr)
     raise errors.NotFound(reason=_('ACI with name "%s" not found') % aciname)
 
 
+# DN -> (entryUSN and modifyTimestamp, ACIIndex, principals allowed to use it)
+_aci_indexes = {}
+_aci_indexes_lock = threading.Lock()
+
+
+def get_aci_index(ldap, dn):
+    """
+    Get an `ACIIndex` of the ACIs of the entry ``dn``.
+
+    The index is kept in the process and rebuilt only when entryUSN or
+    modifyTimestamp of the entry changes, otherwise the aci attribute is
+    not read. A cached index is only used for principals which were able
+    to read the same ACIs.
+
+    :raises NotFound: if the entry does not exist
+    """
+    principal = getattr(context, 'principal', None)
+    attrs_list = ['entryusn', 'modifytimestamp']
+
+    with _aci_indexes_lock:
+        cached = _aci_indexes.get(dn)
+    if cached is not None:
+        entry = ldap.get_entry(dn, attrs_list)
+        stamp = (entry.get('entryusn'), entry.get('modifytimestamp'))
+        cached_stamp, index, principals = cached
+        if stamp == cached_stamp and principal in principals:
+            return index
+
+    entry = ldap.get_entry(dn, ['aci'] + attrs_list)
+    stamp = (entry.get('entryusn'), entry.get('modifytimestamp'))
+    acistrs = entry.get('aci', [])
+    if (cached is not None and stamp == cached[0] and
+            tuple(acistrs) == cached[1].acistrs):
+        with _aci_indexes_lock:
+            cached[2].add(principal)
+        return cached[1]
+
+    index = ACIIndex(acistrs)
+    for acistr in index.unparseable:
+        logger.warning("Failed to parse: %s", acistr)
+    if stamp[0]:
+        with _aci_indexes_lock:
+            _aci_indexes[dn] = (stamp, index, {principal})
+    return index
+
+
 def validate_permissions(ugettext, perm):
     perm = perm.strip().lower()
     if perm not in _valid_permissions_values:
@@ -590,8 +636,7 @@ class aci_del(crud.Delete):
         entry = ldap.get_entry(self.api.env.basedn, ['aci'])
 
         acistrs = entry.get('aci', [])
-        acis = _convert_strings_to_acis(acistrs)
-        aci = _find_aci_by_name(acis, aciprefix, aciname)
+        aci = _find_aci_by_name(ACIIndex(acistrs), aciprefix, aciname)
         for a in acistrs:
             candidate = ACI(a)
             if aci.isequal(candidate):
@@ -623,10 +668,8 @@ class aci_mod(crud.Update):
         aciprefix = kw['aciprefix']
         ldap = self.api.Backend.ldap2
 
-        entry = ldap.get_entry(self.api.env.basedn, ['aci'])
-
-        acis = _convert_strings_to_acis(entry.get('aci', []))
-        aci = _find_aci_by_name(acis, aciprefix, aciname)
+        index = get_aci_index(ldap, self.api.env.basedn)
+        aci = _find_aci_by_name(index, aciprefix, aciname)
 
         # The strategy here is to convert the ACI we're updating back into
         # a series of keywords. Then we replace any keywords that have been
@@ -699,46 +742,26 @@ Search for ACIs.
     def execute(self, term=None, **kw):
         ldap = self.api.Backend.ldap2
 
-        entry = ldap.get_entry(self.api.env.basedn, ['aci'])
-
-        acis = _convert_strings_to_acis(entry.get('aci', []))
-        results = []
+        dn = self.api.env.basedn
+        index = get_aci_index(ldap, dn)
+        criteria = []
 
         if term:
             term = term.lower()
-            for a in acis:
-                if a.name.lower().find(term) != -1 and a not in results:
-                    results.append(a)
-            acis = list(results)
-        else:
-            results = list(acis)
+            criteria.append(('name', lambda name: term in name.lower()))
 
         if kw.get('aciname'):
-            for a in acis:
-                prefix, name = _parse_aci_name(a.name)
-                if name != kw['aciname']:
-                    results.remove(a)
-            acis = list(results)
+            criteria.append(
+                ('name',
+                 lambda name: _parse_aci_name(name)[1] == kw['aciname']))
 
         if kw.get('aciprefix'):
-            for a in acis:
-                prefix, name = _parse_aci_name(a.name)
-                if prefix != kw['aciprefix']:
-                    results.remove(a)
-            acis = list(results)
+            criteria.append(
+                ('name',
+                 lambda name: _parse_aci_name(name)[0] == kw['aciprefix']))
 
         if kw.get('attrs'):
-            for a in acis:
-                if not 'targetattr' in a.target:
-                    results.remove(a)
-                    continue
-                alist1 = sorted(
-                    [t.lower() for t in a.target['targetattr']['expression']]
-                )
-                alist2 = sorted([t.lower() for t in kw['attrs']])
-                if len(set(alist1) & set(alist2)) != len(alist2):
-                    results.remove(a)
-            acis = list(results)
+            criteria.extend(('targetattr', attr) for attr in kw['attrs'])
 
         if kw.get('permission'):
             try:
@@ -748,116 +771,60 @@ Search for ACIs.
             except errors.NotFound:
                 pass
             else:
-                for a in acis:
-                    uri = 'ldap:///%s' % entry.dn
-                    if a.bindrule['expression'] != uri:
-                        results.remove(a)
-                acis = list(results)
+                criteria.append(('bindrule', 'ldap:///%s' % dn))
 
         if kw.get('permissions'):
-            for a in acis:
-                alist1 = sorted(a.permissions)
-                alist2 = sorted(kw['permissions'])
-                if len(set(alist1) & set(alist2)) != len(alist2):
-                    results.remove(a)
-            acis = list(results)
+            criteria.extend(
+                ('permission', permission)
+                for permission in kw['permissions'])
 
         if kw.get('memberof'):
             try:
-                dn = _group_from_memberof(kw['memberof'])
+                memberof_dn = _group_from_memberof(kw['memberof'])
             except errors.NotFound:
                 pass
             else:
-                memberof_filter = '(memberOf=%s)' % dn
-                for a in acis:
-                    if 'targetfilter' in a.target:
-                        targetfilter = a.target['targetfilter']['expression']
-                        if targetfilter != memberof_filter:
-                            results.remove(a)
-                    else:
-                        results.remove(a)
+                criteria.append(
+                    ('targetfilter', '(memberOf=%s)' % memberof_dn))
 
         if kw.get('type'):
-            for a in acis:
-                if 'target' in a.target:
-                    target = a.target['target']['expression']
-                else:
-                    results.remove(a)
-                    continue
-                found = False
-                for k, value in _type_map.items():
-                    if value == target and kw['type'] == k:
-                        found = True
-                        break
-                if not found:
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+            criteria.append(('target', _type_map[kw['type']]))
 
         if kw.get('selfaci', False) is True:
-            for a in acis:
-                if a.bindrule['expression'] != u'ldap:///self':
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+            criteria.append(('bindrule', u'ldap:///self'))
 
         if kw.get('group'):
-            for a in acis:
-                groupdn = a.bindrule['expression']
-                groupdn = DN(groupdn.replace('ldap:///',''))
+            def is_group(expression):
                 try:
-                    cn = groupdn[0]['cn']
-                except (IndexError, KeyError):
-                    cn = None
-                if cn is None or cn != kw['group']:
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+                    groupdn = DN(expression.replace('ldap:///',''))
+                    return groupdn[0]['cn'] == kw['group']
+                except (ValueError, IndexError, KeyError):
+                    return False
+            criteria.append(('bindrule', is_group))
 
         if kw.get('targetgroup'):
-            for a in acis:
-                found = False
-                if 'target' in a.target:
-                    target = a.target['target']['expression']
+            group_container_dn = DN(api.env.container_group, api.env.basedn)
+
+            def is_targetgroup(target):
+                try:
                     targetdn = DN(target.replace('ldap:///',''))
-                    group_container_dn = DN(api.env.container_group, api.env.basedn)
-                    if targetdn.endswith(group_container_dn):
-                        try:
-                            cn = targetdn[0]['cn']
-                        except (IndexError, KeyError):
-                            cn = None
-                        if cn == kw['targetgroup']:
-                            found = True
-                if not found:
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+                    return (targetdn.endswith(group_container_dn) and
+                            targetdn[0]['cn'] == kw['targetgroup'])
+                except (ValueError, IndexError, KeyError):
+                    return False
+            criteria.append(('target', is_targetgroup))
 
         if kw.get('filter'):
             if not kw['filter'].startswith('('):
                 kw['filter'] = unicode('('+kw['filter']+')')
-            for a in acis:
-                if 'targetfilter' not in a.target or\
-                    not a.target['targetfilter']['expression'] or\
-                    a.target['targetfilter']['expression'] != kw['filter']:
-                    results.remove(a)
+            criteria.append(('targetfilter', kw['filter']))
 
         if kw.get('subtree'):
-            for a in acis:
-                if 'target' in a.target:
-                    target = a.target['target']['expression']
-                else:
-                    results.remove(a)
-                    continue
-                if kw['subtree'].lower() != target.lower():
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+            subtree = kw['subtree'].lower()
+            criteria.append(
+                ('target', lambda target: target.lower() == subtree))
+
+        results = [ACI(acistr) for acistr in index.find(*criteria)]
 
         acis = []
         for result in results:
@@ -899,11 +866,9 @@ class aci_show(crud.Retrieve):
         ldap = self.api.Backend.ldap2
 
         dn = kw.get('location', self.api.env.basedn)
-        entry = ldap.get_entry(dn, ['aci'])
+        index = get_aci_index(ldap, dn)
 
-        acis = _convert_strings_to_acis(entry.get('aci', []))
-
-        aci = _find_aci_by_name(acis, kw['aciprefix'], aciname)
+        aci = _find_aci_by_name(index, kw['aciprefix'], aciname)
         if kw.get('raw', False):
             result = dict(aci=unicode(aci))
         else:
@@ -931,15 +896,15 @@ class aci_rename(crud.Update):
     def execute(self, aciname, **kw):
         ldap = self.api.Backend.ldap2
 
-        entry = ldap.get_entry(self.api.env.basedn, ['aci'])
+        index = get_aci_index(ldap, self.api.env.basedn)
+        aci = _find_aci_by_name(index, kw['aciprefix'], aciname)
 
-        acis = _convert_strings_to_acis(entry.get('aci', []))
-        aci = _find_aci_by_name(acis, kw['aciprefix'], aciname)
+        def is_renamed(name):
+            prefix, _name = _parse_aci_name(name)
+            return _make_aci_name(prefix, kw['newname']) == name
 
-        for a in acis:
-            prefix, _name = _parse_aci_name(a.name)
-            if _make_aci_name(prefix, kw['newname']) == a.name:
-                raise errors.DuplicateEntry()
+        if index.find(('name', is_renamed)):
+            raise errors.DuplicateEntry()
 
         # The strategy here is to convert the ACI we're updating back into
         # a series of keywords. Then we replace any keywords that have been
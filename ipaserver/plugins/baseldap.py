@@ -24,7 +24,9 @@ import re
 import time
 from copy import deepcopy
 import base64
+import json
 
+from ldap.filter import escape_filter_chars
 import six
 
 from ipalib import api, crud, errors
@@ -35,8 +37,10 @@ from ipalib import output
 from ipalib.text import _
 from ipalib.util import json_serialize, validate_hostname
 from ipalib.capabilities import client_has_capability
-from ipalib.messages import add_message, SearchResultTruncated
+from ipalib.messages import (
+    add_message, SearchResultPaged, SearchResultTruncated)
 from ipapython.dn import DN, RDN
+from ipapython.ipaldap import TRUNCATED_SIZE_LIMIT
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -523,6 +527,41 @@ def add_missing_object_class(ldap, objectclass, dn, entry_attrs=None, update=Tru
     return entry_attrs
 
 
+class ContainerIndex(object):
+    """
+    Index of container DNs, used to find the container of an entry.
+
+    Each container is added with a value. ``find`` returns the value of the
+    first added container which is a suffix of the given DN, checking only
+    as many suffixes of the DN as there are distinct container lengths.
+    """
+    def __init__(self):
+        # container DN -> (order, value)
+        self._containers = {}
+        # distinct lengths of the containers
+        self._lengths = set()
+
+    def add(self, container_dn, value):
+        assert isinstance(container_dn, DN)
+        if container_dn not in self._containers:
+            self._containers[container_dn] = (len(self._containers), value)
+            self._lengths.add(len(container_dn))
+
+    def find(self, dn, default=None):
+        assert isinstance(dn, DN)
+        dn_len = len(dn)
+        found = None
+        for length in self._lengths:
+            if length > dn_len:
+                continue
+            item = self._containers.get(dn[dn_len - length:])
+            if item is not None and (found is None or item[0] < found[0]):
+                found = item
+        if found is None:
+            return default
+        return found[1]
+
+
 class LDAPObject(Object):
     """
     Object representing a LDAP entry.
@@ -568,6 +607,8 @@ class LDAPObject(Object):
     label = _('Entry')
     label_singular = _('Entry')
     managed_permissions = {}
+    # attribute -> ContainerIndex of attribute_members, built on first use
+    _attribute_members_index = None
 
     container_not_found_msg = _('container entry (%(container)s) not found')
     parent_not_found_msg = _('%(parent)s: %(oname)s not found')
@@ -640,11 +681,32 @@ class LDAPObject(Object):
         oc = [x.lower() for x in classes]
         return objectclass.lower() in oc
 
+    def get_attribute_members_index(self):
+        """
+        Return a dict mapping each attribute of ``attribute_members`` to a
+        ContainerIndex of the containers of its member objects.
+
+        The values of the index are ``(ldap_obj, new_attr_name)`` tuples.
+        """
+        index = self._attribute_members_index
+        if index is None:
+            index = {}
+            for attr, ldap_obj_names in self.attribute_members.items():
+                containers = index[attr] = ContainerIndex()
+                for ldap_obj_name in ldap_obj_names:
+                    ldap_obj = self.api.Object[ldap_obj_name]
+                    containers.add(
+                        DN(ldap_obj.container_dn, api.env.basedn),
+                        (ldap_obj, '%s_%s' % (attr, ldap_obj.name)))
+            # bypass plugin locking
+            object.__setattr__(self, '_attribute_members_index', index)
+        return index
+
     def convert_attribute_members(self, entry_attrs, *keys, **options):
         if options.get('raw', False):
             return
 
-        container_dns = {}
+        index = self.get_attribute_members_index()
         new_attrs = {}
 
         for attr in self.attribute_members:
@@ -654,26 +716,21 @@ class LDAPObject(Object):
                 continue
             del entry_attrs[attr]
 
+            containers = index[attr]
             for member in value:
                 memberdn = DN(member.decode('utf-8'))
-                for ldap_obj_name in self.attribute_members[attr]:
-                    ldap_obj = self.api.Object[ldap_obj_name]
-                    try:
-                        container_dn = container_dns[ldap_obj_name]
-                    except KeyError:
-                        container_dn = DN(ldap_obj.container_dn, api.env.basedn)
-                        container_dns[ldap_obj_name] = container_dn
-
-                    if memberdn.endswith(container_dn):
-                        new_value = ldap_obj.get_primary_key_from_dn(memberdn)
-                        new_attr_name = '%s_%s' % (attr, ldap_obj.name)
-                        try:
-                            new_attr = new_attrs[new_attr_name]
-                        except KeyError:
-                            new_attr = entry_attrs.setdefault(new_attr_name, [])
-                            new_attrs[new_attr_name] = new_attr
-                        new_attr.append(new_value)
-                        break
+                found = containers.find(memberdn)
+                if found is None:
+                    continue
+
+                ldap_obj, new_attr_name = found
+                new_value = ldap_obj.get_primary_key_from_dn(memberdn)
+                try:
+                    new_attr = new_attrs[new_attr_name]
+                except KeyError:
+                    new_attr = entry_attrs.setdefault(new_attr_name, [])
+                    new_attrs[new_attr_name] = new_attr
+                new_attr.append(new_value)
 
     def get_indirect_members(self, entry_attrs, attrs_list):
         if 'memberindirect' in attrs_list:
@@ -734,6 +791,152 @@ class LDAPObject(Object):
         if indirect:
             entry.raw['memberofindirect'] = list(indirect)
 
+    def get_indirect_members_batch(self, entries, attrs_list):
+        """
+        Same as get_indirect_members, but for a list of entries at once.
+
+        The number of LDAP searches does not depend on the number of
+        entries, except for rare memberships which cannot be told direct or
+        indirect from the membership graph alone.
+        """
+        if not entries:
+            return
+        if 'memberindirect' in attrs_list:
+            self.get_memberindirect_batch(entries)
+        if 'memberofindirect' in attrs_list:
+            self.get_memberofindirect_batch(entries)
+
+    def get_memberindirect_batch(self, group_entries):
+        """
+        Get indirect members of multiple groups
+
+        Nested groups are assigned to the groups by their memberof
+        attribute. When it is not readable, the groups are searched one
+        by one as in get_memberindirect.
+        """
+        ldap = self.backend
+        indirect = {entry.dn: set() for entry in group_entries}
+        group_dns = list(indirect)
+
+        # one search returns nested groups of a whole chunk of groups
+        chunk_size = ldap.member_chunk_size
+        for i in range(0, len(group_dns), chunk_size):
+            mo_filter = ldap.make_filter_from_attr(
+                'memberof', group_dns[i:i + chunk_size], rules=ldap.MATCH_ANY)
+            filter = ldap.combine_filters(
+                ('(member=*)', mo_filter), ldap.MATCH_ALL)
+            try:
+                result = ldap.get_entries(
+                    self.api.env.basedn,
+                    filter=filter,
+                    attrs_list=['member', 'memberof'],
+                    size_limit=-1,  # paged search will get everything anyway
+                    paged_search=True)
+            except errors.NotFound:
+                continue
+
+            chunk = set(group_dns[i:i + chunk_size])
+            for entry in result:
+                parents = chunk.intersection(entry.get('memberof', []))
+                if not parents:
+                    # memberof is not readable, search group by group
+                    break
+                members = entry.raw.get('member', [])
+                for group_dn in parents:
+                    indirect[group_dn].update(members)
+            else:
+                continue
+
+            for group_dn in chunk:
+                group_entry = ldap.make_entry(group_dn)
+                self.get_memberindirect(group_entry)
+                indirect[group_dn] = set(
+                    group_entry.raw.get('memberindirect', []))
+
+        for group_entry in group_entries:
+            members = indirect[group_entry.dn]
+            members.difference_update(group_entry.raw.get('member', []))
+            if members:
+                group_entry.raw['memberindirect'] = list(members)
+
+    def get_memberofindirect_batch(self, entries):
+        """
+        Get indirect memberships of multiple entries
+
+        A group an entry is a member of is a direct membership if it has
+        one of the entries as a member, but none of the groups of the
+        entries. Only when it has both, the group is checked for the entry.
+
+        Like get_memberofindirect, this only searches by the member
+        attributes of the groups, so the result is the same for callers
+        which cannot read memberof of the groups.
+        """
+        memberof = {}
+        for entry in entries:
+            memberof[entry.dn] = [
+                (DN(value.decode('utf-8')), value)
+                for value in entry.raw.get('memberof', [])
+            ]
+
+        group_dns = set()
+        for values in memberof.values():
+            group_dns.update(group_dn for group_dn, _value in values)
+        # groups with an entry resp. with a group of the entries as a
+        # direct member
+        entry_parents = self._find_member_parents(list(memberof))
+        group_parents = self._find_member_parents(list(group_dns))
+
+        for entry in entries:
+            direct = []
+            indirect = []
+            for group_dn, value in memberof[entry.dn]:
+                if group_dn not in entry_parents:
+                    # not visible to the caller, same as not found
+                    indirect.append(value)
+                elif group_dn not in group_parents:
+                    direct.append(value)
+                elif self._is_direct_member(entry.dn, group_dn):
+                    direct.append(value)
+                else:
+                    indirect.append(value)
+
+            entry.raw['memberof'] = direct
+            if indirect:
+                entry.raw['memberofindirect'] = indirect
+
+    def _find_member_parents(self, dns):
+        """
+        Return DNs of entries which have any of dns as a direct member
+        """
+        ldap = self.backend
+        parents = set()
+        chunk_size = ldap.member_chunk_size
+        for i in range(0, len(dns), chunk_size):
+            chunk = dns[i:i + chunk_size]
+            filter = ldap.make_filter(
+                {'member': chunk, 'memberuser': chunk, 'memberhost': chunk})
+            try:
+                result = ldap.get_entries(
+                    self.api.env.basedn,
+                    filter=filter,
+                    attrs_list=[''],
+                    size_limit=-1,  # paged search will get everything anyway
+                    paged_search=True)
+            except errors.NotFound:
+                continue
+            parents.update(entry.dn for entry in result)
+        return parents
+
+    def _is_direct_member(self, dn, group_dn):
+        filter = self.backend.make_filter(
+            {'member': dn, 'memberuser': dn, 'memberhost': dn})
+        try:
+            self.backend.get_entries(
+                group_dn, self.backend.SCOPE_BASE, filter, [''])
+        except errors.NotFound:
+            return False
+        return True
+
     def get_password_attributes(self, ldap, dn, entry_attrs):
         """
         Search on the entry to determine if it has a password or
@@ -1654,6 +1857,33 @@ class LDAPModMember(LDAPQuery):
                         failed[attr][ldap_obj_name].append((name, unicode(e)))
         return (dns, failed)
 
+    def _collect_member_dns(self, objs):
+        """
+        Flatten member DNs of all object types of a member attribute.
+
+        Returns the list of member DNs and a dict mapping each of them to
+        the name of its object.
+        """
+        m_dns = []
+        m_obj_names = {}
+        for ldap_obj_name, obj_dns in objs.items():
+            for m_dn in obj_dns:
+                assert isinstance(m_dn, DN)
+                if not m_dn:
+                    continue
+                m_dns.append(m_dn)
+                m_obj_names[m_dn] = ldap_obj_name
+        return m_dns, m_obj_names
+
+    def _add_member_failures(self, failed, m_obj_names, errs):
+        for m_dn, e in errs:
+            ldap_obj_name = m_obj_names[m_dn]
+            ldap_obj = self.api.Object[ldap_obj_name]
+            failed[ldap_obj_name].append((
+                ldap_obj.get_primary_key_from_dn(m_dn),
+                unicode(e),)
+            )
+
 
 class LDAPAddMember(LDAPModMember):
     """
@@ -1691,21 +1921,13 @@ class LDAPAddMember(LDAPModMember):
 
         completed = 0
         for (attr, objs) in member_dns.items():
-            for ldap_obj_name in objs:
-                for m_dn in member_dns[attr][ldap_obj_name]:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.add_entry_to_group(m_dn, dn, attr, allow_same=self.allow_same)
-                    except errors.PublicError as e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+            m_dns, m_obj_names = self._collect_member_dns(objs)
+            if not m_dns:
+                continue
+            errs = ldap.add_entries_to_group(
+                m_dns, dn, attr, allow_same=self.allow_same)
+            self._add_member_failures(failed[attr], m_obj_names, errs)
+            completed += len(m_dns) - len(errs)
 
         if options.get('all', False):
             attrs_list = ['*'] + self.obj.default_attributes
@@ -1789,21 +2011,12 @@ class LDAPRemoveMember(LDAPModMember):
 
         completed = 0
         for (attr, objs) in member_dns.items():
-            for ldap_obj_name, m_dns in objs.items():
-                for m_dn in m_dns:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.remove_entry_from_group(m_dn, dn, attr)
-                    except errors.PublicError as e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+            m_dns, m_obj_names = self._collect_member_dns(objs)
+            if not m_dns:
+                continue
+            errs = ldap.remove_entries_from_group(m_dns, dn, attr)
+            self._add_member_failures(failed[attr], m_obj_names, errs)
+            completed += len(m_dns) - len(errs)
 
         if options.get('all', False):
             attrs_list = ['*'] + self.obj.default_attributes
@@ -1937,6 +2150,22 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
         if self.obj.primary_key and \
                 'no_output' not in self.obj.primary_key.flags:
             yield gen_pkey_only_option(self.obj.primary_key.cli_name)
+        if self.obj.primary_key:
+            yield Int('page_size?',
+                label=_('Page Size'),
+                doc=_('Maximum number of entries returned at once, entries '
+                      'are sorted by primary key (overrides size limit)'),
+                flags=['no_display'],
+                minvalue=1,
+                autofill=False,
+            )
+            yield Str('cursor?',
+                label=_('Cursor'),
+                doc=_('Continue a paged search after the entries returned '
+                      'by the previous page'),
+                flags=['no_display'],
+                autofill=False,
+            )
         for attr in self.member_attributes:
             for option in self.get_member_options(attr):
                 yield option
@@ -2006,6 +2235,34 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                         )
         return filter
 
+    def get_cursor_filter(self, ldap, cursor):
+        """
+        Returns a filter matching entries whose primary key sorts after
+        the last entry of the previous page.
+        """
+        try:
+            name, value = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            name = value = None
+        if name != self.obj.name or not isinstance(value, six.string_types):
+            raise errors.ValidationError(
+                name='cursor', error=_('invalid cursor'))
+
+        pkey = self.obj.primary_key.name
+        return ldap.combine_filters(
+            ('({}>={})'.format(pkey, escape_filter_chars(value)),
+             ldap.make_filter_from_attr(pkey, value, ldap.MATCH_NONE)),
+            rules=ldap.MATCH_ALL)
+
+    def make_cursor(self, entry):
+        """
+        Returns an opaque token to continue a paged search after ``entry``.
+        """
+        value = entry.raw[self.obj.primary_key.name][0].decode('utf-8')
+        cursor = json.dumps([self.obj.name, value]).encode('utf-8')
+        return base64.urlsafe_b64encode(cursor).decode('ascii')
+
     has_output_params = global_output_params
 
     def execute(self, *args, **options):
@@ -2055,11 +2312,33 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 self, ldap, filter, attrs_list, base_dn, scope, *args, **options)
             assert isinstance(base_dn, DN)
 
+        # Paged search sorts entries by primary key on the server and
+        # continues after the primary key stored in the cursor, so that
+        # no state has to be kept between the requests
+        page_size = options.get('page_size')
+        cursor = options.get('cursor')
+        size_limit = options.get('sizelimit', None)
+        sort_attrs = None
+        if page_size is not None:
+            pkey = self.obj.primary_key.name
+            if cursor is not None:
+                filter = ldap.combine_filters(
+                    (filter, self.get_cursor_filter(ldap, cursor)),
+                    rules=ldap.MATCH_ALL)
+            if pkey not in attrs_list:
+                attrs_list.append(pkey)
+            size_limit = page_size
+            sort_attrs = [pkey]
+        elif cursor is not None:
+            raise errors.ValidationError(
+                name='cursor', error=_('page size is required'))
+
         try:
             (entries, truncated) = self._exc_wrapper(args, options, ldap.find_entries)(
                 filter, attrs_list, base_dn, scope,
                 time_limit=options.get('timelimit', None),
-                size_limit=options.get('sizelimit', None)
+                size_limit=size_limit,
+                sort_attrs=sort_attrs
             )
         except errors.EmptyResult:
             (entries, truncated) = ([], False)
@@ -2067,6 +2346,22 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             return self.api.Object[self.obj.parent_object].handle_not_found(
                 *keys)
 
+        next_cursor = None
+        if sort_attrs:
+            # the server sorts entries by their lowest primary key value,
+            # the cursor can't continue after entries with more values
+            for entry in entries:
+                if len(entry.raw.get(pkey, ())) > 1:
+                    raise errors.ValidationError(
+                        name='page_size',
+                        error=_('paged search is not supported, entry '
+                                '%(dn)s has more than one %(attr)s value')
+                        % dict(dn=entry.dn, attr=pkey))
+        if sort_attrs and truncated is TRUNCATED_SIZE_LIMIT and entries:
+            # the size limit ended the page, not the search
+            next_cursor = self.make_cursor(entries[-1])
+            truncated = False
+
         for callback in self.get_callbacks('post'):
             truncated = callback(
                 self, ldap, entries, truncated, *args, **options
@@ -2080,8 +2375,8 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 entries.sort(key=sort_key)
 
         if not options.get('raw', False):
+            self.obj.get_indirect_members_batch(entries, attrs_list)
             for entry in entries:
-                self.obj.get_indirect_members(entry, attrs_list)
                 self.obj.convert_attribute_members(entry, *args, **options)
 
         for (i, e) in enumerate(entries):
@@ -2099,6 +2394,9 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
         except errors.LimitsExceeded as exc:
             add_message(options['version'], result, SearchResultTruncated(
                 reason=exc))
+        if next_cursor is not None:
+            add_message(options['version'], result, SearchResultPaged(
+                cursor=next_cursor))
 
         return result
 
@@ -19,18 +19,23 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import os
+import threading
+import time
 
 import six
+from six.moves import queue
 
-from ipalib import api, errors
+from ipalib import crud, errors
 from ipalib import Command
 from ipalib.frontend import Local
-from ipalib.parameters import Str, Dict
+from ipalib.parameters import Flag, Str, Dict
 from ipalib.output import Output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib.plugable import Registry
 from ipapython.version import API_VERSION
+from ipaserver.plugins.baseldap import LDAPRetrieve
 
 __doc__ = _("""
 Plugin to make multiple ipa calls via one remote procedure call
@@ -57,6 +62,20 @@ The format of the response is nested the same way.  At the top you will see
 
 And then a nested response for each IPA command method sent in the request
 
+With the "concurrent" option, a batch made only of read-only (show and
+find) methods is executed by up to batch_max_workers concurrent workers,
+each using its own LDAP connection bound as the caller. The results are
+returned in the order of the methods in either case:
+
+{"method":"batch","params":[[
+        {"method":"user_show","params":[["admin"],{}]},
+        {"method":"group_show","params":[["admins"],{}]}
+        ],{"concurrent":true}],"id":1}
+
+The "timings" member of the response gives the total time of the batch,
+whether it was executed concurrently, and the time of each method in
+seconds.
+
 """)
 
 if six.PY3:
@@ -88,74 +107,202 @@ class batch(Command):
         ),
     )
 
+    takes_options = (
+        Flag('concurrent?',
+            doc=_('Execute the methods concurrently if all of them are '
+                  'read-only'),
+        ),
+    )
+
     has_output = (
         Output('count', int, doc=''),
-        Output('results', (list, tuple), doc='')
+        Output('results', (list, tuple), doc=''),
+        Output('timings', dict, doc=_('Execution times in seconds')),
     )
 
-    def execute(self, methods=None, **options):
-        results = []
-        for arg in (methods or []):
-            params = dict()
-            name = None
-            try:
-                if 'method' not in arg:
-                    raise errors.RequirementError(name='method')
-                if 'params' not in arg:
-                    raise errors.RequirementError(name='params')
-                name = arg['method']
-                if (name not in self.api.Command or
-                        isinstance(self.api.Command[name], Local)):
-                    raise errors.CommandError(name=name)
-
-                # If params are not formated as a tuple(list, dict)
-                # the following lines will raise an exception
-                # that triggers an internal server error
-                # Raise a ConversionError instead to report the issue
-                # to the client
-                try:
-                    a, kw = arg['params']
-                    newkw = dict((str(k), v) for k, v in kw.items())
-                    params = api.Command[name].args_options_2_params(
-                        *a, **newkw)
-                except (AttributeError, ValueError, TypeError):
-                    raise errors.ConversionError(
-                        name='params',
-                        error=_(u'must contain a tuple (list, dict)'))
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+    def _parse_method(self, arg, version):
+        """
+        Return the name, args and options of a method of the batch.
+        """
+        if 'method' not in arg:
+            raise errors.RequirementError(name='method')
+        if 'params' not in arg:
+            raise errors.RequirementError(name='params')
+        name = arg['method']
+        if (name not in self.api.Command or
+                isinstance(self.api.Command[name], Local)):
+            raise errors.CommandError(name=name)
+
+        # If params are not formated as a tuple(list, dict)
+        # the following lines will raise an exception
+        # that triggers an internal server error
+        # Raise a ConversionError instead to report the issue
+        # to the client
+        try:
+            a, kw = arg['params']
+            newkw = dict((str(k), v) for k, v in kw.items())
+            self.api.Command[name].args_options_2_params(*a, **newkw)
+        except (AttributeError, ValueError, TypeError):
+            raise errors.ConversionError(
+                name='params',
+                error=_(u'must contain a tuple (list, dict)'))
+        newkw.setdefault('version', version)
+        return name, a, newkw
+
+    def _repr_call(self, name, args, options):
+        """
+        Return the string representation of arguments of a method for
+        logging.
+        """
+        try:
+            params = self.api.Command[name].args_options_2_params(
+                *args, **options)
+        except Exception:
+            return ''
+        return ', '.join(self.api.Command[name]._repr_iter(**params))
+
+    def _is_read_only(self, arg):
+        try:
+            command = self.api.Command[arg['method']]
+        except (KeyError, TypeError):
+            # reported as error of the method
+            return True
+        return isinstance(command, (LDAPRetrieve, crud.Retrieve, crud.Search))
+
+    def _execute_method(self, arg, version):
+        """
+        Execute a single method of the batch; return its result with
+        error information.
+        """
+        principal = getattr(context, 'principal', 'UNKNOWN')
+        name = None
+        a = ()
+        newkw = {}
+        try:
+            name, a, newkw = self._parse_method(arg, version)
+            result = self.api.Command[name](*a, **newkw)
+            if logger.isEnabledFor(logging.INFO):
                 logger.info(
                     '%s: batch: %s(%s): SUCCESS',
-                    getattr(context, 'principal', 'UNKNOWN'),
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    principal, name, self._repr_call(name, a, newkw)
                 )
-                result['error']=None
-            except Exception as e:
-                if isinstance(e, errors.RequirementError) or \
-                    isinstance(e, errors.CommandError):
-                    logger.info(
-                        '%s: batch: %s',
-                        context.principal,  # pylint: disable=no-member
-                        e.__class__.__name__
-                    )
-                else:
-                    logger.info(
-                        '%s: batch: %s(%s): %s',
-                        context.principal, name,  # pylint: disable=no-member
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            result['error']=None
+        except Exception as e:
+            if isinstance(e, errors.RequirementError) or \
+                isinstance(e, errors.CommandError):
+                logger.info(
+                    '%s: batch: %s',
+                    principal,
+                    e.__class__.__name__
+                )
+            elif logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    '%s: batch: %s(%s): %s',
+                    principal, name, self._repr_call(name, a, newkw),
+                    e.__class__.__name__
                 )
-            results.append(result)
-        return dict(count=len(results) , results=results)
+            result = self._error_result(e)
+        return result
+
+    def _timed_execute_method(self, arg, version):
+        start = time.time()
+        result = self._execute_method(arg, version)
+        return result, time.time() - start
+
+    def _execute_concurrently(self, methods, version, results, durations):
+        """
+        Execute methods in worker threads, storing the results and
+        durations at the index of each method.
+
+        Each worker binds its own LDAP connection with the credentials of
+        the caller.
+        """
+        ccache = getattr(context, 'ccache_name', None)
+        if ccache is None:
+            ccache = os.environ.get('KRB5CCNAME')
+        caller_context = {
+            name: getattr(context, name)
+            for name in ('principal', 'ccache_name', 'languages',
+                         'client_ip')
+            if hasattr(context, name)
+        }
+
+        pending = queue.Queue()
+        for i, arg in enumerate(methods):
+            pending.put((i, arg))
+
+        def worker():
+            for name, value in caller_context.items():
+                setattr(context, name, value)
+            try:
+                self.api.Backend.ldap2.connect(
+                    ccache=ccache, size_limit=None, time_limit=None)
+            except Exception as e:
+                connect_error = e
+            else:
+                connect_error = None
+
+            try:
+                while True:
+                    try:
+                        i, arg = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    if connect_error is not None:
+                        # report the failure for every remaining method
+                        # taken by this worker
+                        results[i] = self._error_result(connect_error)
+                        durations[i] = 0.0
+                        continue
+                    results[i], durations[i] = self._timed_execute_method(
+                        arg, version)
+            finally:
+                destroy_context()
+
+        workers = min(self.api.env.batch_max_workers, len(methods))
+        threads = [threading.Thread(target=worker) for _i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def _error_result(e):
+        if isinstance(e, errors.PublicError):
+            reported_error = e
+        else:
+            reported_error = errors.InternalError()
+        return dict(
+            error=reported_error.strerror,
+            error_code=reported_error.errno,
+            error_name=unicode(type(reported_error).__name__),
+            error_kw=reported_error.kw,
+        )
+
+    def execute(self, methods=None, **options):
+        start = time.time()
+        methods = methods or []
+        results = [None] * len(methods)
+        durations = [None] * len(methods)
+
+        concurrent = (
+            options.get('concurrent', False) and
+            len(methods) > 1 and
+            self.api.env.batch_max_workers > 1 and
+            all(self._is_read_only(arg) for arg in methods)
+        )
+
+        if concurrent:
+            self._execute_concurrently(
+                methods, options['version'], results, durations)
+        else:
+            for i, arg in enumerate(methods):
+                results[i], durations[i] = self._timed_execute_method(
+                    arg, options['version'])
+
+        timings = dict(
+            total=time.time() - start,
+            concurrent=concurrent,
+            methods=durations,
+        )
+        return dict(count=len(results), results=results, timings=timings)
@@ -276,6 +276,26 @@ def ca_enabled_check(_api):
         raise errors.NotFound(reason=_('CA is not configured'))
 
 
+def get_ca_obj(_api, cacn):
+    """
+    Return all attributes of CA ``cacn`` as returned by ``ca_show``.
+
+    The result is cached for the rest of the request, so that commands
+    dealing with many certificates of the same CA retrieve the CA only
+    once.
+    """
+    try:
+        ca_objs = context.ca_objs
+    except AttributeError:
+        ca_objs = context.ca_objs = {}
+
+    try:
+        return ca_objs[cacn]
+    except KeyError:
+        ca_obj = ca_objs[cacn] = _api.Command.ca_show(cacn, all=True)['result']
+        return ca_obj
+
+
 def caacl_check(principal, ca, profile_id):
     if not acl_evaluate(principal, ca, profile_id):
         raise errors.ACIError(info=_(
@@ -1657,22 +1677,20 @@ class cert_find(Search, CertMethod):
             complete = complete or sub_complete
 
         if not pkey_only:
-            ca_objs = {}
-            if ca_enabled:
-                ra = self.api.Backend.ra
+            certs = {}
+            if all and ca_enabled:
+                # retrieve all certificates at once
+                certs = self.api.Backend.ra.get_certificates(
+                    str(key[1]) for key, obj in six.iteritems(result)
+                    if 'cacn' in obj
+                )
 
             for key, obj in six.iteritems(result):
                 if all and 'cacn' in obj:
                     _issuer, serial_number = key
-                    cacn = obj['cacn']
-
-                    try:
-                        ca_obj = ca_objs[cacn]
-                    except KeyError:
-                        ca_obj = ca_objs[cacn] = (
-                            self.api.Command.ca_show(cacn, all=True)['result'])
+                    ca_obj = get_ca_obj(self.api, obj['cacn'])
 
-                    obj.update(ra.get_certificate(str(serial_number)))
+                    obj.update(certs[str(serial_number)])
                     if not raw:
                         obj['certificate'] = (
                             obj['certificate'].replace('\r\n', ''))
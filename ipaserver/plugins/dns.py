@@ -20,6 +20,7 @@
 
 from __future__ import absolute_import
 
+import collections
 import logging
 
 import netaddr
@@ -32,6 +33,7 @@ import dns.name
 import dns.exception
 import dns.rdatatype
 import dns.resolver
+import dns.ttl
 import six
 
 from ipalib.dns import (extra_name_format,
@@ -86,6 +88,10 @@ from ipaserver.dns_data_management import (
     IPASystemRecords,
     IPADomainIsNotManagedByIPAError,
 )
+from ipaserver.dns_zone_tree import (
+    get_dns_zone_tree,
+    invalidate_dns_zone_tree,
+)
 
 if six.PY3:
     unicode = str
@@ -190,6 +196,14 @@ EXAMPLES:
    ipa dnsrecord-add example.com _ldap._tcp --srv-rec="0 3 389 fast.example.com"
    ipa dnsrecord-add example.com _ldap._tcp --srv-rec="0 1 389 slow.example.com"
    ipa dnsrecord-add example.com _ldap._tcp --srv-rec="1 1 389 backup.example.com"
+""") + _("""
+ Import all records from a zone file in the standard (BIND) format. Records
+ which cannot be imported are reported and the rest is imported:
+   ipa dnsrecord-import example.com /var/named/example.com.db
+""") + _("""
+ Export all records of a zone to a zone file, or as one JSON object per line:
+   ipa dnsrecord-export example.com --out=example.com.db
+   ipa dnsrecord-export example.com --format=jsonl
 """) + _("""
  The interactive mode can be used for easy modification:
   ipa dnsrecord-mod example.com _ldap._tcp
@@ -1761,42 +1775,8 @@ def _get_auth_zone_ldap(api, name):
     zone: authoritative zone, or None if authoritative zone is not in LDAP
     """
     assert isinstance(name, DNSName)
-    ldap = api.Backend.ldap2
-
-    # Create all possible parent zone names
-    search_name = name.make_absolute()
-    zone_names = []
-    for i, name in enumerate(search_name):
-        zone_name_abs = DNSName(search_name[i:]).ToASCII()
-        zone_names.append(zone_name_abs)
-        # compatibility with IPA < 4.0, zone name can be relative
-        zone_names.append(zone_name_abs[:-1])
-
-    # Create filters
-    objectclass_filter = ldap.make_filter({'objectclass':'idnszone'})
-    zonenames_filter = ldap.make_filter({'idnsname': zone_names})
-    zoneactive_filter = ldap.make_filter({'idnsZoneActive': 'true'})
-    complete_filter = ldap.combine_filters(
-        [objectclass_filter, zonenames_filter, zoneactive_filter],
-        rules=ldap.MATCH_ALL
-    )
-
-    try:
-        entries, truncated = ldap.find_entries(
-            filter=complete_filter,
-            attrs_list=['idnsname'],
-            base_dn=DN(api.env.container_dns, api.env.basedn),
-            scope=ldap.SCOPE_ONELEVEL
-        )
-    except errors.NotFound:
-        return None, False
-
-    # always use absolute zones
-    matched_auth_zones = [entry.single_value['idnsname'].make_absolute()
-                          for entry in entries]
-
-    # return longest match
-    return max(matched_auth_zones, key=len), truncated
+    tree = get_dns_zone_tree(api)
+    return tree.get_auth_zone(name), tree.truncated
 
 
 def _get_longest_match_ns_delegation_ldap(api, zone, name):
@@ -1878,55 +1858,14 @@ def _get_longest_match_ns_delegation_ldap(api, zone, name):
 def _find_subtree_forward_zones_ldap(api, name, child_zones_only=False):
     """
     Search for forwardzone <name> and all child forwardzones
-    Filter: (|(*.<name>.)(<name>.))
     :param name:
     :param child_zones_only: search only for child zones
     :return: (list of zonenames,  truncated), list is empty if no zone found
     """
     assert isinstance(name, DNSName)
-    ldap = api.Backend.ldap2
-
-    # prepare for filter "*.<name>."
-    search_name = u".%s" % name.make_absolute().ToASCII()
-
-    # we need to search zone with and without last dot, due compatibility
-    # with IPA < 4.0
-    search_names = [search_name, search_name[:-1]]
-
-    # Create filters
-    objectclass_filter = ldap.make_filter({'objectclass':'idnsforwardzone'})
-    zonenames_filter = ldap.make_filter({'idnsname': search_names}, exact=False,
-                                        trailing_wildcard=False)
-    if not child_zones_only:
-        # find also zone with exact name
-        exact_name = name.make_absolute().ToASCII()
-        # we need to search zone with and without last dot, due compatibility
-        # with IPA < 4.0
-        exact_names = [exact_name, exact_name[-1]]
-        exact_name_filter = ldap.make_filter({'idnsname': exact_names})
-        zonenames_filter = ldap.combine_filters([zonenames_filter,
-                                                 exact_name_filter])
-
-    zoneactive_filter = ldap.make_filter({'idnsZoneActive': 'true'})
-    complete_filter = ldap.combine_filters(
-        [objectclass_filter, zonenames_filter, zoneactive_filter],
-        rules=ldap.MATCH_ALL
-    )
-
-    try:
-        entries, truncated = ldap.find_entries(
-            filter=complete_filter,
-            attrs_list=['idnsname'],
-            base_dn=DN(api.env.container_dns, api.env.basedn),
-            scope=ldap.SCOPE_ONELEVEL
-        )
-    except errors.NotFound:
-        return [], False
-
-    result = [entry.single_value['idnsname'].make_absolute()
-              for entry in entries]
-
-    return result, truncated
+    tree = get_dns_zone_tree(api)
+    return (tree.find_subtree_forward_zones(name, child_zones_only),
+            tree.truncated)
 
 
 def _get_zone_which_makes_fw_zone_ineffective(api, fwzonename):
@@ -2069,6 +2008,10 @@ class DNSZoneBase(LDAPObject):
         if zone == DNSName.root:
             return super(DNSZoneBase, self).get_dn(zone_a, **options)
 
+        zone_info = get_dns_zone_tree(self.api).get_zone(zone)
+        if zone_info is not None:
+            return zone_info.dn
+
         # try first relative name, a new zone has to be added as absolute
         # otherwise ObjectViolation is raised
         zone_a = zone_a[:-1]
@@ -2169,6 +2112,12 @@ class DNSZoneBase_add(LDAPCreate):
 
         return dn
 
+    def execute(self, *keys, **options):
+        try:
+            return super(DNSZoneBase_add, self).execute(*keys, **options)
+        finally:
+            invalidate_dns_zone_tree()
+
 
 class DNSZoneBase_del(LDAPDelete):
 
@@ -2186,6 +2135,12 @@ class DNSZoneBase_del(LDAPDelete):
 
         return True
 
+    def execute(self, *keys, **options):
+        try:
+            return super(DNSZoneBase_del, self).execute(*keys, **options)
+        finally:
+            invalidate_dns_zone_tree()
+
 
 class DNSZoneBase_mod(LDAPUpdate):
     def post_callback(self, ldap, dn, entry_attrs, *keys, **options):
@@ -2193,6 +2148,12 @@ class DNSZoneBase_mod(LDAPUpdate):
         self.obj._make_zonename_absolute(entry_attrs, **options)
         return dn
 
+    def execute(self, *keys, **options):
+        try:
+            return super(DNSZoneBase_mod, self).execute(*keys, **options)
+        finally:
+            invalidate_dns_zone_tree()
+
 
 class DNSZoneBase_find(LDAPSearch):
     __doc__ = _('Search for DNS zones (SOA records).')
@@ -2268,6 +2229,7 @@ class DNSZoneBase_disable(LDAPQuery):
             ldap.update_entry(entry)
         except errors.EmptyModlist:
             pass
+        invalidate_dns_zone_tree()
 
         return dict(result=True, value=pkey_to_value(keys[-1], options))
 
@@ -2293,6 +2255,7 @@ class DNSZoneBase_enable(LDAPQuery):
             ldap.update_entry(entry)
         except errors.EmptyModlist:
             pass
+        invalidate_dns_zone_tree()
 
         return dict(result=True, value=pkey_to_value(keys[-1], options))
 
@@ -3154,19 +3117,23 @@ class dnsrecord(LDAPObject):
         """
         parent_object = self.api.Object[self.parent_object]
         dn = parent_object.get_dn(zone, **options)
-        ldap = self.api.Backend.ldap2
-        try:
-            entry = ldap.get_entry(dn, ['objectclass'])
-        except errors.NotFound:
-            raise parent_object.handle_not_found(zone)
+        zone_info = get_dns_zone_tree(self.api).get_zone(zone)
+        if zone_info is not None:
+            is_master = not zone_info.forward
         else:
-            # only master zones can contain records
-            if 'idnszone' not in [x.lower()
-                                  for x in entry.get('objectclass', [])]:
-                raise errors.ValidationError(
-                    name='dnszoneidnsname',
-                    error=_(u'only master zones can contain records')
-                )
+            ldap = self.api.Backend.ldap2
+            try:
+                entry = ldap.get_entry(dn, ['objectclass'])
+            except errors.NotFound:
+                raise parent_object.handle_not_found(zone)
+            is_master = 'idnszone' in [x.lower()
+                                       for x in entry.get('objectclass', [])]
+        # only master zones can contain records
+        if not is_master:
+            raise errors.ValidationError(
+                name='dnszoneidnsname',
+                error=_(u'only master zones can contain records')
+            )
         return dn
 
 
@@ -4023,14 +3990,350 @@ class dnsrecord_find(LDAPSearch):
         if entries:
             zone_obj = self.api.Object[self.obj.parent_object]
             zone_dn = zone_obj.get_dn(args[0])
-            if entries[0].dn == zone_dn:
-                entries[0][zone_obj.primary_key.name] = [_dns_zone_record]
             for entry in entries:
+                # entries of paged searches are sorted by name, the zone
+                # apex is not necessarily the first one
+                if entry.dn == zone_dn:
+                    entry[zone_obj.primary_key.name] = [_dns_zone_record]
                 self.obj.postprocess_record(entry, **options)
 
         return truncated
 
 
+# maximum number of record names looked up in LDAP by one search
+DNSRECORD_IMPORT_SEARCH_SIZE = 100
+
+
+def _split_import_record(record):
+    """
+    Split DNS record in zone file format "NAME [TTL] [CLASS] TYPE DATA"
+
+    :return: (name, ttl, rrtype, data), ttl is None if it is not specified
+    """
+    format_error = errors.ValidationError(
+        name='records',
+        error=_('format must be specified as '
+                '"NAME [TTL] [CLASS] TYPE DATA"'))
+    try:
+        name, rest = record.split(None, 1)
+    except ValueError:
+        raise format_error
+
+    ttl = None
+    rrclass = None
+    while True:
+        try:
+            token, rest = rest.split(None, 1)
+        except ValueError:
+            raise format_error
+        if ttl is None and token[0].isdigit():
+            try:
+                ttl = dns.ttl.from_text(token)
+            except dns.ttl.BadTTL:
+                raise errors.ValidationError(
+                    name='records', error=_('invalid TTL "%s"') % token)
+        elif rrclass is None and token.upper() in _record_classes:
+            rrclass = token.upper()
+            if rrclass != u'IN':
+                raise errors.ValidationError(
+                    name='records',
+                    error=_('only records of class IN are supported'))
+        else:
+            return name, ttl, token.upper(), rest.strip()
+
+
+@register()
+class dnsrecord_import(Method):
+    __doc__ = _('Import DNS resource records in zone file format.')
+
+    takes_args = (
+        Str('records+',
+            label=_('Records'),
+            doc=_('DNS records in zone file format '
+                  '"NAME [TTL] [CLASS] TYPE DATA"'),
+        ),
+    )
+
+    takes_options = (
+        Flag('create_reverse',
+            label=_('Create reverse'),
+            doc=_('Create reverse records for imported A and AAAA records'),
+        ),
+        Flag('force',
+            label=_('Force'),
+            doc=_('Import NS records even if their hostname is not in DNS'),
+        ),
+    )
+
+    has_output = (
+        output.Output('completed',
+            type=int,
+            doc=_('Number of records imported'),
+        ),
+        output.Output('failed',
+            type=dict,
+            doc=_('Records which could not be imported'),
+        ),
+    )
+
+    has_output_params = (
+        Str('dnsrecord',
+            label=_('DNS resource record'),
+        ),
+    )
+
+    def get_args(self):
+        for key in self.obj.get_ancestor_primary_keys():
+            yield key
+        for arg in super(dnsrecord_import, self).get_args():
+            yield arg
+
+    def _parse_record(self, zone, zone_dn, record, ns_checked, **options):
+        """
+        Convert and validate a single record
+
+        :return: (name, ttl, attr, values), name is relative to the zone
+        """
+        name, ttl, rrtype, data = _split_import_record(record)
+
+        attr = record_name_format % rrtype.lower()
+        if (attr not in self.obj.params or
+                not isinstance(self.obj.params[attr], DNSRecord)):
+            raise errors.ValidationError(
+                name='records',
+                error=_('unsupported DNS record type "%s"') % rrtype)
+        param = self.obj.params[attr]
+        values = param(data)
+        param.validate(values)
+
+        if ttl is not None:
+            self.obj.params['dnsttl'].validate(ttl)
+
+        name = self.obj.primary_key(name)
+        self.obj.primary_key.validate(name)
+        keys = (zone, name)
+
+        # NS records are checked below with results shared by all records
+        entry_attrs = {'idnsname': [name], attr: list(values)}
+        self.obj.run_precallback_validators(zone_dn, entry_attrs, *keys,
+                                            force=True)
+
+        if attr == 'nsrecord' and not options.get('force'):
+            for value in values:
+                if value not in ns_checked:
+                    try:
+                        check_ns_rec_resolvable(zone, DNSName(value))
+                    except errors.PublicError as e:
+                        ns_checked[value] = e
+                    else:
+                        ns_checked[value] = None
+                if ns_checked[value] is not None:
+                    raise ns_checked[value]
+
+        if self.obj.is_pkey_zone_record(*keys):
+            name = _dns_zone_record
+        else:
+            name = entry_attrs['idnsname'][0]
+        return name, ttl, attr, values
+
+    def _get_reverse_name(self, tree, value):
+        """
+        Get reverse zone managed by IPA and record name for IP address
+        """
+        ip = netaddr.IPAddress(str(value))
+        revdns = DNSName(unicode(ip.reverse_dns))
+        revzone = tree.get_auth_zone(revdns)
+        if revzone is None or not revzone.is_reverse():
+            raise errors.NotFound(
+                reason=_('DNS reverse zone for IP address %(addr)s is not '
+                         'managed by this server') % dict(addr=value))
+        return revzone, revdns.relativize(revzone)
+
+    def _get_entries(self, ldap, zone_dn, names):
+        """
+        Get existing entries of record ``names`` in zone ``zone_dn``
+
+        :return: dict mapping names to entries
+        """
+        attrs_list = ['idnsname', 'dnsttl'] + _record_attributes
+        names = list(names)
+        entries = {}
+        if _dns_zone_record in names:
+            names.remove(_dns_zone_record)
+            entries[_dns_zone_record] = ldap.get_entry(zone_dn, attrs_list)
+
+        for i in range(0, len(names), DNSRECORD_IMPORT_SEARCH_SIZE):
+            chunk = names[i:i + DNSRECORD_IMPORT_SEARCH_SIZE]
+            filter = ldap.combine_filters(
+                [
+                    ldap.make_filter_from_attr('objectclass', 'idnsrecord'),
+                    ldap.make_filter_from_attr(
+                        'idnsname', [name.ToASCII() for name in chunk]),
+                ],
+                rules=ldap.MATCH_ALL)
+            try:
+                result = ldap.get_entries(zone_dn, ldap.SCOPE_ONELEVEL,
+                                          filter, attrs_list)
+            except errors.NotFound:
+                continue
+            for entry in result:
+                entries[entry.single_value['idnsname']] = entry
+        return entries
+
+    def _import_node(self, ldap, keys, dn, node, old_entry):
+        """
+        Merge records of ``node`` into ``old_entry`` and store them with a
+        single add or modify operation
+        """
+        if node['ip'] is not None and old_entry is not None:
+            ptrrecords = old_entry.get('ptrrecord', [])
+            if ptrrecords and not set(node['attrs']['ptrrecord']).issubset(
+                    ptrrecords):
+                raise errors.DuplicateEntry(
+                    message=_(u'Reverse record for IP address %(ip)s already '
+                              u'exists in reverse zone %(zone)s.')
+                    % dict(ip=node['ip'], zone=keys[0]))
+
+        entry_attrs = {}
+        for attr, values in node['attrs'].items():
+            if old_entry is not None:
+                old_values = list(old_entry.get(attr, []))
+            else:
+                old_values = []
+            entry_attrs[attr] = old_values + [
+                value for value in values if value not in old_values]
+
+        rrattrs = self.obj.updated_rrattrs(old_entry, entry_attrs)
+        self.obj.check_record_type_dependencies(keys, rrattrs)
+        self.obj.check_record_type_collisions(keys, rrattrs)
+
+        if node['ttl'] is not None:
+            entry_attrs['dnsttl'] = [node['ttl']]
+
+        if old_entry is None:
+            entry = ldap.make_entry(
+                dn, entry_attrs,
+                objectclass=self.obj.object_class,
+                idnsname=[keys[-1]])
+            try:
+                ldap.add_entry(entry)
+            except errors.DuplicateEntry:
+                # the record was added concurrently, merge with it
+                old_entry = ldap.get_entry(
+                    dn, ['idnsname', 'dnsttl'] + _record_attributes)
+                return self._import_node(ldap, keys, dn, node, old_entry)
+            return entry
+
+        old_entry.update(entry_attrs)
+        try:
+            ldap.update_entry(old_entry)
+        except errors.EmptyModlist:
+            # all records are already present
+            pass
+        return old_entry
+
+    def _import_nodes(self, ldap, zone, zone_dn, nodes, failed, mods):
+        """
+        Store records grouped by name in ``nodes`` to zone ``zone``
+
+        Records of nodes which cannot be stored are added to ``failed``.
+
+        :return: list of names of stored nodes
+        """
+        old_entries = self._get_entries(ldap, zone_dn, nodes)
+        imported = []
+        for name, node in nodes.items():
+            keys = (zone, name)
+            if name == _dns_zone_record:
+                dn = zone_dn
+            else:
+                dn = DN((self.obj.primary_key.name, name.ToASCII()), zone_dn)
+            try:
+                entry = self._import_node(ldap, keys, dn, node,
+                                          old_entries.get(name))
+            except errors.PublicError as e:
+                failed.extend(
+                    (record, unicode(e)) for record, _a, _v in node['records'])
+                continue
+            mods[keys] = entry
+            imported.append(name)
+        return imported
+
+    def execute(self, dnszoneidnsname, records, **options):
+        ldap = self.api.Backend.ldap2
+        if not dns_container_exists(ldap):
+            raise errors.NotFound(reason=_('DNS is not configured'))
+        zone = dnszoneidnsname
+        zone_dn = self.obj.check_zone(zone, **options)
+
+        failed = []
+        ns_checked = {}
+        # name -> records of the name, merged into one entry
+        nodes = collections.OrderedDict()
+        for record in records:
+            try:
+                name, ttl, attr, values = self._parse_record(
+                    zone, zone_dn, record, ns_checked, **options)
+            except errors.PublicError as e:
+                failed.append((record, unicode(e)))
+                continue
+            node = nodes.setdefault(name, dict(
+                records=[], attrs=collections.OrderedDict(), ttl=None,
+                ip=None))
+            node['records'].append((record, attr, values))
+            node_values = node['attrs'].setdefault(attr, [])
+            node_values.extend(v for v in values if v not in node_values)
+            # the entry has a single TTL, use the lowest one of its records
+            if ttl is not None and (node['ttl'] is None or ttl < node['ttl']):
+                node['ttl'] = ttl
+
+        mods = {}
+        imported = self._import_nodes(ldap, zone, zone_dn, nodes, failed,
+                                      mods)
+
+        if options.get('create_reverse'):
+            tree = get_dns_zone_tree(self.api)
+            # reverse zone -> name -> PTR record of the name
+            reverse_nodes = collections.OrderedDict()
+            for name in imported:
+                ptr = name.derelativize(zone).ToASCII()
+                for record, attr, values in nodes[name]['records']:
+                    if attr not in ('arecord', 'aaaarecord'):
+                        continue
+                    for value in values:
+                        try:
+                            revzone, revname = self._get_reverse_name(
+                                tree, value)
+                        except errors.PublicError as e:
+                            failed.append((record, unicode(
+                                _('Cannot create reverse record for '
+                                  '"%(value)s": %(exc)s')
+                                % dict(value=value, exc=unicode(e)))))
+                            continue
+                        node = reverse_nodes.setdefault(
+                            revzone, collections.OrderedDict()).setdefault(
+                            revname, dict(records=[], attrs={'ptrrecord': []},
+                                          ttl=None, ip=value))
+                        node['records'].append((record, 'ptrrecord', (ptr,)))
+                        if ptr not in node['attrs']['ptrrecord']:
+                            node['attrs']['ptrrecord'].append(ptr)
+
+            for revzone, revnodes in reverse_nodes.items():
+                self._import_nodes(ldap, revzone, tree.get_zone(revzone).dn,
+                                   revnodes, failed, mods)
+
+        if self.api.env['wait_for_dns']:
+            self.obj.wait_for_modified_entries(mods)
+
+        completed = sum(len(nodes[name]['records']) for name in imported)
+        logger.debug('Imported %d of %d DNS records to zone %s', completed,
+                     len(records), zone)
+        return dict(
+            completed=completed,
+            failed={'dnsrecord': failed},
+        )
+
+
 @register()
 class dns_resolve(Command):
     __doc__ = _('Resolve a host name in DNS. (Deprecated)')
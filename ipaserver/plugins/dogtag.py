@@ -246,10 +246,12 @@ import json
 import logging
 
 from lxml import etree
+import threading
 import time
 import contextlib
 
 import six
+from six.moves import queue
 
 from ipalib import Backend, api
 from ipapython.dn import DN
@@ -261,6 +263,7 @@ if api.env.in_server:
     from pki.client import PKIConnection
     import pki.crypto as cryptoutil
     from pki.kra import KRAClient
+    from requests.adapters import HTTPAdapter
 
 if six.PY3:
     unicode = str
@@ -1295,7 +1298,8 @@ class RestClient(Backend):
             cafile=self.ca_cert,
             client_certfile=self.client_certfile,
             client_keyfile=self.client_keyfile,
-            method='GET'
+            method='GET',
+            pool=dogtag.get_connection_pool()
         )
         cookies = ipapython.cookie.Cookie.parse(resp_headers.get('set-cookie', ''))
         if status != 200 or len(cookies) == 0:
@@ -1311,7 +1315,8 @@ class RestClient(Backend):
             cafile=self.ca_cert,
             client_certfile=self.client_certfile,
             client_keyfile=self.client_keyfile,
-            method='GET'
+            method='GET',
+            pool=dogtag.get_connection_pool()
         )
         object.__setattr__(self, 'cookie', None)
 
@@ -1355,7 +1360,8 @@ class RestClient(Backend):
             cafile=self.ca_cert,
             client_certfile=self.client_certfile,
             client_keyfile=self.client_keyfile,
-            method=method, headers=headers, body=body
+            method=method, headers=headers, body=body,
+            pool=dogtag.get_connection_pool()
         )
         if status < 200 or status >= 300:
             explanation = self._parse_dogtag_error(resp_body) or ''
@@ -1374,6 +1380,9 @@ class ra(rabase.rabase, RestClient):
     """
     DEFAULT_PROFILE = dogtag.DEFAULT_PROFILE
 
+    # maximum number of concurrent requests of get_certificates()
+    max_concurrent_requests = 8
+
     def raise_certificate_operation_error(self, func_name, err_msg=None, detail=None):
         """
         :param func_name: function name where error occurred
@@ -1420,6 +1429,7 @@ class ra(rabase.rabase, RestClient):
             cafile=self.ca_cert,
             client_certfile=self.client_certfile,
             client_keyfile=self.client_keyfile,
+            pool=dogtag.get_connection_pool(),
             **kw)
 
     def get_parse_result_xml(self, xml_text, parse_func):
@@ -1603,6 +1613,61 @@ class ra(rabase.rabase, RestClient):
 
         return cmd_result
 
+    def get_certificates(self, serial_numbers):
+        """
+        Retrieve multiple existing certificates.
+
+        :param serial_numbers: Certificate serial numbers, see
+                               ``get_certificate``.
+
+        Up to ``max_concurrent_requests`` certificates are retrieved at
+        the same time, so the total time depends on the number of
+        certificates divided by the concurrency rather than on the sum of
+        all round trips.
+
+        Returns a dict mapping each serial number to the result of
+        ``get_certificate``. The first error encountered is raised.
+        """
+        serial_numbers = list(serial_numbers)
+        logger.debug('%s.get_certificates(): %d certificates',
+                     type(self).__name__, len(serial_numbers))
+
+        # ca_host may need the LDAP connection of the request, which is not
+        # available in the worker threads; make sure it is cached first
+        self.ca_host  # pylint: disable=pointless-statement
+
+        results = {}
+        failures = []
+        pending = queue.Queue()
+        for serial_number in serial_numbers:
+            pending.put(serial_number)
+
+        def worker():
+            while not failures:
+                try:
+                    serial_number = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[serial_number] = (
+                        self.get_certificate(serial_number))
+                except Exception as e:
+                    failures.append(e)
+
+        workers = min(self.max_concurrent_requests, len(serial_numbers))
+        if workers <= 1:
+            worker()
+        else:
+            threads = [threading.Thread(target=worker)
+                       for _i in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if failures:
+            raise failures[0]
+        return results
 
     def request_certificate(
             self, csr, profile_id, ca_id, request_type='pkcs10'):
@@ -1921,7 +1986,8 @@ class ra(rabase.rabase, RestClient):
             headers={'Accept-Encoding': 'gzip, deflate',
                      'User-Agent': 'IPA',
                      'Content-Type': 'application/xml'},
-            body=payload
+            body=payload,
+            pool=dogtag.get_connection_pool()
         )
 
         if status != 200:
@@ -1985,6 +2051,10 @@ class kra(Backend):
 
         super(kra, self).__init__(api)
 
+        self._connections_lock = threading.Lock()
+        # (host, port) -> [connection, last_used, users]
+        self._connections = {}
+
     @property
     def kra_host(self):
         """
@@ -2025,9 +2095,25 @@ class kra(Backend):
 
         # TODO: obtain KRA host & port from IPA service list or point to KRA load balancer
         # https://fedorahosted.org/freeipa/ticket/4557
+        pool = dogtag.get_connection_pool()
+        if pool is None:
+            connection = self._create_connection(self.kra_host)
+            release = None
+        else:
+            connection, release = self._acquire_connection(
+                self.kra_host, pool)
+
+        try:
+            yield KRAClient(connection, crypto)
+        finally:
+            if release is not None:
+                release()
+            tempdb.close()
+
+    def _create_connection(self, host, pool=None):
         connection = PKIConnection(
             'https',
-            self.kra_host,
+            host,
             str(self.kra_port),
             'kra')
 
@@ -2037,10 +2123,47 @@ class kra(Backend):
         # connection.set_authentication_cert(paths.RA_AGENT_PEM,
         #                                    paths.RA_AGENT_KEY)
 
-        try:
-            yield KRAClient(connection, crypto)
-        finally:
-            tempdb.close()
+        if pool is not None:
+            # keep-alive connections, at most pool.max_per_host at a time
+            connection.session.mount('https://', HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=pool.max_per_host,
+                pool_block=True))
+
+        return connection
+
+    def _acquire_connection(self, host, pool):
+        """
+        Return a connection to the KRA on ``host`` shared by all requests
+        of this process, and a function to call when done with it.
+
+        The connection keeps its HTTPS connections alive; it is replaced
+        after it was not used for ``pool.idle_timeout`` seconds.
+        """
+        key = (host, self.kra_port)
+        expired = []
+        with self._connections_lock:
+            now = time.time()
+            for other_key, item in list(self._connections.items()):
+                if not item[2] and now - item[1] > pool.idle_timeout:
+                    expired.append(item[0])
+                    del self._connections[other_key]
+            item = self._connections.get(key)
+            if item is None:
+                item = [self._create_connection(host, pool), now, 0]
+                self._connections[key] = item
+            item[1] = now
+            item[2] += 1
+
+        for connection in expired:
+            connection.session.close()
+
+        def release():
+            with self._connections_lock:
+                item[1] = time.time()
+                item[2] -= 1
+
+        return item[0], release
 
 
 @register()
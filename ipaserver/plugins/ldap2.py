@@ -29,8 +29,11 @@ Backend plugin for LDAP.
 
 from __future__ import absolute_import
 
+import contextlib
 import logging
 import os
+import threading
+import time
 
 import ldap as _ldap
 
@@ -51,12 +54,141 @@ register = Registry()
 _missing = object()
 
 
+class LDAPConnectionPool(object):
+    """
+    Per-process pool of bound LDAP connections.
+
+    Connections are keyed by ``(ldap_uri, principal, ccache)`` so a bound
+    connection is only ever handed out again to the identity it was bound
+    as. Idle connections are evicted after ``idle_timeout`` seconds and the
+    least recently used ones are dropped when the pool grows beyond
+    ``max_size``. A connection which was idle for more than
+    ``check_interval`` seconds is probed with a Who Am I? extended
+    operation before reuse; a dead connection is discarded so that the
+    caller binds a fresh one.
+    """
+
+    def __init__(self, max_size=0, idle_timeout=60, check_interval=5):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # list of (key, conn, last_used) tuples, least recently used first
+        self._idle = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reconnects = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _evict_expired(self, now):
+        """
+        Remove expired idle connections; must be called with lock held.
+        Returns the list of removed connections.
+        """
+        expired = [item for item in self._idle
+                   if now - item[2] > self.idle_timeout]
+        if expired:
+            self._idle = [item for item in self._idle
+                          if now - item[2] <= self.idle_timeout]
+            self.evictions += len(expired)
+        return [item[1] for item in expired]
+
+    @staticmethod
+    def _close(conns):
+        for conn in conns:
+            try:
+                conn.unbind_s()
+            except _ldap.LDAPError:
+                pass
+
+    def _is_alive(self, conn):
+        try:
+            conn.whoami_s()
+        except _ldap.SERVER_DOWN:
+            self.reconnects += 1
+            return False
+        except _ldap.LDAPError as e:
+            logger.debug('Discarding pooled LDAP connection: %s', e)
+            return False
+        return True
+
+    def acquire(self, key):
+        """
+        Return an idle connection bound for ``key`` or None.
+        """
+        now = time.time()
+        with self._lock:
+            expired = self._evict_expired(now)
+            found = None
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == key:
+                    found = self._idle.pop(i)
+                    break
+        self._close(expired)
+
+        if found is not None:
+            conn, last_used = found[1], found[2]
+            if (now - last_used <= self.check_interval or
+                    self._is_alive(conn)):
+                with self._lock:
+                    self.hits += 1
+                return conn
+            self._close([conn])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def release(self, key, conn):
+        """
+        Return a connection bound for ``key`` to the pool.
+        """
+        now = time.time()
+        with self._lock:
+            expired = self._evict_expired(now)
+            self._idle.append((key, conn, now))
+            while len(self._idle) > self.max_size:
+                expired.append(self._idle.pop(0)[1])
+                self.evictions += 1
+        self._close(expired)
+
+    def clear(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            conns = [item[1] for item in self._idle]
+            self._idle = []
+        self._close(conns)
+
+    def stats(self):
+        """
+        Return pool counters for monitoring.
+        """
+        with self._lock:
+            return dict(
+                size=len(self._idle),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                reconnects=self.reconnects,
+            )
+
+
 @register()
 class ldap2(CrudBackend, LDAPClient):
     """
     LDAP Backend Take 2.
     """
 
+    # maximum number of values in a single member modify or search filter
+    member_chunk_size = 1000
+
     def __init__(self, api):
         force_schema_updates = api.env.context in ('installer', 'updates')
 
@@ -67,6 +199,12 @@ class ldap2(CrudBackend, LDAPClient):
         self._time_limit = float(LDAPClient.time_limit)
         self._size_limit = int(LDAPClient.size_limit)
 
+        self._pool = LDAPConnectionPool(
+            max_size=api.env.ldap_pool_size,
+            idle_timeout=api.env.ldap_pool_idle_timeout,
+            check_interval=api.env.ldap_pool_check_interval)
+        self._pool_key_attr = '%s_pool_key' % self.id
+
     @property
     def ldap_uri(self):
         return self.api.env.ldap_uri
@@ -114,6 +252,30 @@ class ldap2(CrudBackend, LDAPClient):
         if self.isconnected():
             self.disconnect()
 
+    @contextlib.contextmanager
+    def error_handler(self, arg_desc=None):
+        try:
+            with super(ldap2, self).error_handler(arg_desc):
+                yield
+        except errors.NetworkError:
+            # never return a connection to a dead server to the pool
+            if hasattr(context, self._pool_key_attr):
+                setattr(context, self._pool_key_attr, None)
+            raise
+
+    @property
+    def connection_pool(self):
+        """
+        The per-process pool of bound LDAP connections.
+        """
+        return self._pool
+
+    def get_pool_stats(self):
+        """
+        Return hit/miss counters of the per-process connection pool.
+        """
+        return self._pool.stats()
+
     def __str__(self):
         return self.ldap_uri
 
@@ -195,20 +357,44 @@ class ldap2(CrudBackend, LDAPClient):
 
             principal = krb_utils.get_principal(ccache_name=ccache)
 
-            client.gssapi_bind(server_controls=serverctrls,
-                               client_controls=clientctrls)
+            pool_key = None
+            pooled_conn = None
+            if (self._pool.enabled and serverctrls is None and
+                    clientctrls is None):
+                pool_key = (self.ldap_uri, principal, ccache)
+                pooled_conn = self._pool.acquire(pool_key)
+
+            if pooled_conn is not None:
+                logger.debug('Reusing pooled LDAP connection for %s',
+                             principal)
+                conn = pooled_conn
+            else:
+                client.gssapi_bind(server_controls=serverctrls,
+                                   client_controls=clientctrls)
             setattr(context, 'principal', principal)
+            if pool_key is not None:
+                setattr(context, self._pool_key_attr, pool_key)
 
         return conn
 
     def destroy_connection(self):
         """Disconnect from LDAP server."""
-        try:
-            if self.conn is not None:
-                self.unbind()
-        except errors.PublicError:
-            # ignore when trying to unbind multiple times
-            pass
+        pool_key = getattr(context, self._pool_key_attr, None)
+        if hasattr(context, self._pool_key_attr):
+            delattr(context, self._pool_key_attr)
+
+        if pool_key is not None and self.conn is not None:
+            # keep the bound connection for the next request of the same
+            # principal instead of unbinding it
+            self._flush_schema()
+            self._pool.release(pool_key, self.conn)
+        else:
+            try:
+                if self.conn is not None:
+                    self.unbind()
+            except errors.PublicError:
+                # ignore when trying to unbind multiple times
+                pass
 
         object.__delattr__(self, 'time_limit')
         object.__delattr__(self, 'size_limit')
@@ -445,6 +631,168 @@ class ldap2(CrudBackend, LDAPClient):
         except errors.MidairCollision:
             raise errors.NotGroupMember()
 
+    def get_entries_by_dn(self, dns, attrs_list=None):
+        """
+        Get multiple entries by DN.
+
+        Entries are looked up with one-level searches below their parent
+        entries, OR-ing up to member_chunk_size RDN values into one filter,
+        instead of reading every entry individually.
+
+        Returns a dict mapping DNs of the entries which exist to the
+        entries. Entries which do not exist or are not readable are
+        omitted.
+        """
+        result = {}
+        by_parent = {}
+        for dn in dns:
+            assert isinstance(dn, DN)
+            if len(dn) > 1 and len(dn[0]) == 1:
+                key = (dn[1:], dn[0].attr.lower())
+                by_parent.setdefault(key, []).append(dn[0].value)
+                continue
+            try:
+                entry = self.get_entry(dn, attrs_list)
+            except errors.NotFound:
+                continue
+            result[entry.dn] = entry
+
+        chunk_size = self.member_chunk_size
+        for (parent_dn, attr), values in by_parent.items():
+            for i in range(0, len(values), chunk_size):
+                search_filter = self.make_filter_from_attr(
+                    attr, values[i:i + chunk_size], rules=self.MATCH_ANY)
+                try:
+                    entries = self.get_entries(
+                        parent_dn, self.SCOPE_ONELEVEL, search_filter,
+                        attrs_list,
+                        size_limit=-1,  # paged search will get everything
+                        paged_search=True)
+                except errors.NotFound:
+                    continue
+                for entry in entries:
+                    result[entry.dn] = entry
+
+        return result
+
+    def _modify_group_members(self, mod_op, group_dn, member_attr, members,
+                              value_error, member_error):
+        """
+        Add or delete member values of group_dn in chunks.
+
+        members is a list of (key, dn) tuples. When a chunk cannot be
+        applied as a whole, its values are retried one by one so that the
+        failure can be attributed to individual members. A value_error
+        raised for a single value is reported as member_error.
+
+        Returns a dict mapping keys of failed members to the exception.
+        """
+        failed = {}
+        chunk_size = self.member_chunk_size
+        for i in range(0, len(members), chunk_size):
+            chunk = members[i:i + chunk_size]
+            if len(chunk) > 1:
+                modlist = [(mod_op, member_attr,
+                            self.encode([dn for _key, dn in chunk]))]
+                try:
+                    with self.error_handler():
+                        self.conn.modify_s(str(group_dn), modlist)
+                    continue
+                except errors.PublicError as e:
+                    logger.debug(
+                        "Bulk member modify of %s failed (%s), retrying "
+                        "one member at a time", group_dn, e)
+
+            for key, dn in chunk:
+                modlist = [(mod_op, member_attr, [self.encode(dn)])]
+                try:
+                    with self.error_handler():
+                        self.conn.modify_s(str(group_dn), modlist)
+                except value_error:
+                    failed[key] = member_error()
+                except errors.PublicError as e:
+                    failed[key] = e
+
+        return failed
+
+    def add_entries_to_group(self, dns, group_dn, member_attr='member',
+                             allow_same=False):
+        """
+        Add entries designated by dns to group group_dn in the member
+        attribute member_attr.
+
+        Unlike add_entry_to_group, the existence of the entries is checked
+        with a few combined searches and the members are added with as few
+        modify operations as possible.
+
+        Returns a list of (dn, exception) tuples for the entries which could
+        not be added, in the order of dns.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "add_entries_to_group: %d dns group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        existing = self.get_entries_by_dn(dns, [''])
+
+        failed = {}
+        members = []
+        seen = set()
+        for i, dn in enumerate(dns):
+            assert isinstance(dn, DN)
+            try:
+                dn = existing[dn].dn
+            except KeyError:
+                failed[i] = errors.NotFound(reason='no such entry')
+                continue
+            # check if we're not trying to add group into itself
+            if dn == group_dn and not allow_same:
+                failed[i] = errors.SameGroupError()
+            elif dn in seen:
+                failed[i] = errors.AlreadyGroupMember()
+            else:
+                seen.add(dn)
+                members.append((i, dn))
+
+        failed.update(self._modify_group_members(
+            _ldap.MOD_ADD, group_dn, member_attr, members,
+            errors.DuplicateEntry, errors.AlreadyGroupMember))
+
+        return [(dns[i], failed[i]) for i in sorted(failed)]
+
+    def remove_entries_from_group(self, dns, group_dn, member_attr='member'):
+        """
+        Remove entries designated by dns from group group_dn.
+
+        The members are removed with as few modify operations as possible.
+
+        Returns a list of (dn, exception) tuples for the entries which could
+        not be removed, in the order of dns.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "remove_entries_from_group: %d dns group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        failed = {}
+        members = []
+        seen = set()
+        for i, dn in enumerate(dns):
+            assert isinstance(dn, DN)
+            if dn in seen:
+                failed[i] = errors.NotGroupMember()
+            else:
+                seen.add(dn)
+                members.append((i, dn))
+
+        failed.update(self._modify_group_members(
+            _ldap.MOD_DELETE, group_dn, member_attr, members,
+            errors.MidairCollision, errors.NotGroupMember))
+
+        return [(dns[i], failed[i]) for i in sorted(failed)]
+
     def set_entry_active(self, dn, active):
         """Mark entry active/inactive."""
 
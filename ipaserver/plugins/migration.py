@@ -19,15 +19,19 @@
 
 from __future__ import absolute_import
 
+import hashlib
+import json
 import logging
+import os
 import re
+import time
 from ldap import MOD_ADD
 from ldap import SCOPE_BASE, SCOPE_ONELEVEL, SCOPE_SUBTREE
 
 import six
 
 from ipalib import api, errors, output
-from ipalib import Command, Password, Str, Flag, StrEnum, DNParam, Bool
+from ipalib import Command, Password, Str, Flag, StrEnum, DNParam, Bool, Int
 from ipalib.cli import to_cli
 from ipalib.plugable import Registry
 from ipaserver.plugins.user import NO_UPG_MAGIC
@@ -88,6 +92,12 @@ mode for every 100 users. As a result there will be a window in which
 users will be added to IPA but will not be members of the default
 user group.
 
+Users and groups are retrieved from the remote LDAP server in batches
+of 1000 objects (see --batch-size). After every batch the progress is
+recorded, so that a migration which was interrupted, for example by a
+timeout, can be continued with the same options and --resume instead
+of starting over.
+
 EXAMPLES:
 
  The simplest migration, accepting all defaults:
@@ -119,15 +129,18 @@ EXAMPLES:
        --user-ignore-attribute=radiusgroupname \\
        ldap://ds.example.com:389
 
+ Continue an interrupted migration:
+    ipa migrate-ds --resume ldap://ds.example.com:389
+
 LOGGING
 
 Migration will log warnings and errors to the Apache error log. This
 file should be evaluated post-migration to correct or investigate any
 issues that were discovered.
 
-For every 100 users migrated an info-level message will be displayed to
-give the current progress and duration to make it possible to track
-the progress of migration.
+For every batch of users and groups migrated an info-level message will
+be displayed to give the current progress, throughput and duration to make
+it possible to track the progress of migration.
 
 If the log level is debug, either by setting debug = True in
 /etc/ipa/default.conf or /etc/ipa/server.conf, then an entry will be printed
@@ -652,6 +665,21 @@ class migrate_ds(Command):
                 default=_default_scope,
                 autofill=True,
                 ),
+        Int('batch_size?',
+            cli_name='batch_size',
+            label=_('Batch size'),
+            doc=_('Number of objects retrieved from DS and migrated before '
+                  'a checkpoint is recorded (default: 1000)'),
+            minvalue=1,
+            default=1000,
+            autofill=True,
+            ),
+        Flag('resume?',
+             label=_('Resume'),
+             doc=_('Continue an interrupted migration with the same '
+                   'parameters from its last checkpoint'),
+             default=False,
+             ),
     )
 
     has_output = (
@@ -671,6 +699,10 @@ class migrate_ds(Command):
             type=bool,
             doc=_('False if migration fails because the compatibility plug-in is enabled.'),
         ),
+        output.Output('stats',
+            type=dict,
+            doc=_('Number of objects processed and throughput; categorized by type.'),
+        ),
     )
 
     exclude_doc = _('%s to exclude from migration')
@@ -730,17 +762,74 @@ migration process might be incomplete\n''')
             search_bases[ldap_obj_name] = search_base
         return search_bases
 
-    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options):
+    def _get_checkpoint_file(self, ldapuri, ds_base_dn, options):
+        """
+        Return the path of the checkpoint file of a migration.
+
+        The name is derived from all parameters which affect the set and
+        order of migrated objects, so that only a migration with the same
+        parameters is resumed from the checkpoint.
+        """
+        params = [ldapuri, unicode(ds_base_dn), unicode(options['binddn']),
+                  options['scope']]
+        for ldap_obj_name in self.migrate_order:
+            oc_option = self.migrate_objects[ldap_obj_name]['oc_option']
+            params.append(unicode(
+                options.get('%scontainer' % to_cli(ldap_obj_name))))
+            params.extend(options[to_cli(oc_option)])
+        digest = hashlib.sha256(
+            u'\n'.join(params).encode('utf-8')).hexdigest()
+        return os.path.join(paths.IPA_MIGRATION_CHECKPOINTS, digest)
+
+    def _read_checkpoint(self, filename):
+        try:
+            with open(filename, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('No usable migration checkpoint %s: %s',
+                         filename, e)
+            return {}
+
+    def _write_checkpoint(self, filename, checkpoint):
+        tmpname = '%s.tmp' % filename
+        try:
+            with open(tmpname, 'w') as f:
+                json.dump(checkpoint, f)
+            os.rename(tmpname, filename)
+        except (IOError, OSError) as e:
+            logger.warning('Failed to record migration checkpoint %s: %s',
+                           filename, e)
+
+    def _remove_checkpoint(self, filename):
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options,
+                checkpoint_file=None):
         """
         Migrate objects from DS to LDAP.
+
+        Objects are streamed from DS with a paged search and migrated in
+        batches of options['batch_size'] objects. After every batch the
+        number of processed objects and the DN of the last one are recorded
+        in checkpoint_file; with options['resume'] the objects processed by
+        a previous run are skipped.
         """
         assert isinstance(ds_base_dn, DN)
         migrated = {} # {'OBJ': ['PKEY1', 'PKEY2', ...], ...}
         failed = {} # {'OBJ': {'PKEY1': 'Failed 'cos blabla', ...}, ...}
+        stats = {} # {'OBJ': {'processed': 1, 'skipped': 0, ...}, ...}
         search_bases = self._get_search_bases(options, ds_base_dn, self.migrate_order)
         migration_start = datetime.datetime.now()
 
         scope = _supported_scopes[options.get('scope')]
+        batch_size = options.get('batch_size') or 1000
+
+        checkpoint = {}
+        if checkpoint_file is not None and options.get('resume'):
+            checkpoint = self._read_checkpoint(checkpoint_file)
 
         for ldap_obj_name in self.migrate_order:
             ldap_obj = self.api.Object[ldap_obj_name]
@@ -754,31 +843,16 @@ migration process might be incomplete\n''')
 
             migrated[ldap_obj_name] = []
             failed[ldap_obj_name] = {}
-
-            try:
-                entries, truncated = ds_ldap.find_entries(
-                    search_filter, ['*'], search_bases[ldap_obj_name],
-                    scope,
-                    time_limit=0, size_limit=-1
-                )
-            except errors.NotFound:
-                if not options.get('continue',False):
-                    raise errors.NotFound(
-                        reason=_('%(container)s LDAP search did not return any result '
-                                 '(search base: %(search_base)s, '
-                                 'objectclass: %(objectclass)s)')
-                                 % {'container': ldap_obj_name,
-                                    'search_base': search_bases[ldap_obj_name],
-                                    'objectclass': ', '.join(oc_list)}
-                    )
-                else:
-                    truncated = False
-                    entries = []
-            if truncated:
-                logger.error(
-                    '%s: %s',
-                    ldap_obj.name, self.truncated_err_msg
-                )
+            obj_checkpoint = checkpoint.setdefault(
+                ldap_obj_name, dict(count=0, last_dn=None, done=False))
+            obj_stats = stats[ldap_obj_name] = dict(
+                processed=0, skipped=0, seconds=0.0, rate=0.0)
+
+            if obj_checkpoint['done']:
+                logger.info('%ss already migrated according to checkpoint',
+                            ldap_obj_name)
+                obj_stats['skipped'] = obj_checkpoint['count']
+                continue
 
             blacklists = {}
             for blacklist in ('oc_blacklist', 'attr_blacklist'):
@@ -802,88 +876,187 @@ migration process might be incomplete\n''')
 
             valid_gids = set()
             invalid_gids = set()
-            migrate_cnt = 0
             context['migrate_cnt'] = 0
-            for entry_attrs in entries:
-                context['migrate_cnt'] = migrate_cnt
-                s = datetime.datetime.now()
-
-                ava = entry_attrs.dn[0][0]
-                if ava.attr == ldap_obj.primary_key.name:
-                    # In case if pkey attribute is in the migrated object DN
-                    # and the original LDAP is multivalued, make sure that
-                    # we pick the correct value (the unique one stored in DN)
-                    pkey = ava.value.lower()
-                else:
-                    pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
+            count = 0
+            type_start = time.time()
+            try:
+                ds_ldap.get_entry(search_bases[ldap_obj_name], [''])
+            except errors.NotFound:
+                # search base does not exist
+                entries = ()
+            else:
+                entries = self._iter_ds_entries(
+                    ds_ldap, search_filter, search_bases[ldap_obj_name],
+                    scope, batch_size, obj_checkpoint, obj_stats)
+            try:
+                for count, entry_attrs in entries:
+                    ds_dn = entry_attrs.dn
+                    self._migrate_entry(
+                        ldap, config, ldap_obj, entry_attrs, exclude, context,
+                        migrated, failed, options, search_bases,
+                        valid_gids, invalid_gids, blacklists)
+                    obj_stats['processed'] += 1
+
+                    if count % batch_size == 0:
+                        self._update_stats(obj_stats, type_start)
+                        obj_checkpoint['count'] = count
+                        obj_checkpoint['last_dn'] = unicode(ds_dn)
+                        if checkpoint_file is not None:
+                            self._write_checkpoint(checkpoint_file, checkpoint)
+                        logger.info(
+                            "%d %ss processed, %.1f entries/s. %s elapsed.",
+                            count, ldap_obj_name, obj_stats['rate'],
+                            datetime.datetime.now() - migration_start)
+            except errors.LimitsExceeded:
+                logger.error(
+                    '%s: %s',
+                    ldap_obj.name, self.truncated_err_msg
+                )
+            count = max(count, obj_stats['skipped'])
+
+            if count == 0 and not options.get('continue', False):
+                raise errors.NotFound(
+                    reason=_('%(container)s LDAP search did not return any result '
+                             '(search base: %(search_base)s, '
+                             'objectclass: %(objectclass)s)')
+                             % {'container': ldap_obj_name,
+                                'search_base': search_bases[ldap_obj_name],
+                                'objectclass': ', '.join(oc_list)}
+                )
 
-                if pkey in exclude:
-                    continue
+            self._update_stats(obj_stats, type_start)
+            obj_checkpoint['count'] = count
+            obj_checkpoint['done'] = True
+            if checkpoint_file is not None:
+                self._write_checkpoint(checkpoint_file, checkpoint)
+            logger.info('%d %ss migrated in %.1f s (%.1f entries/s)',
+                        obj_stats['processed'], ldap_obj_name,
+                        obj_stats['seconds'], obj_stats['rate'])
 
-                entry_attrs.dn = ldap_obj.get_dn(pkey)
-                entry_attrs['objectclass'] = list(
-                    set(
-                        config.get(
-                            ldap_obj.object_class_config, ldap_obj.object_class
-                        ) + [o.lower() for o in entry_attrs['objectclass']]
-                    )
-                )
-                entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+        if 'def_group_dn' in context:
+            _update_default_group(ldap, context, True)
 
-                callback = self.migrate_objects[ldap_obj_name]['pre_callback']
-                if callable(callback):
-                    try:
-                        entry_attrs.dn = callback(
-                            ldap, pkey, entry_attrs.dn, entry_attrs,
-                            failed[ldap_obj_name], config, context,
-                            schema=options['schema'],
-                            search_bases=search_bases,
-                            valid_gids=valid_gids,
-                            invalid_gids=invalid_gids,
-                            **blacklists
-                        )
-                        if not entry_attrs.dn:
-                            continue
-                    except errors.NotFound as e:
-                        failed[ldap_obj_name][pkey] = unicode(e.reason)
-                        continue
+        return (migrated, failed, stats)
 
-                try:
-                    ldap.add_entry(entry_attrs)
-                except errors.ExecutionError as e:
-                    callback = self.migrate_objects[ldap_obj_name]['exc_callback']
-                    if callable(callback):
-                        try:
-                            callback(
-                                ldap, entry_attrs.dn, entry_attrs, e, options)
-                        except errors.ExecutionError as e:
-                            failed[ldap_obj_name][pkey] = unicode(e)
-                            continue
-                    else:
-                        failed[ldap_obj_name][pkey] = unicode(e)
-                        continue
+    def _update_stats(self, obj_stats, type_start):
+        obj_stats['seconds'] = round(time.time() - type_start, 3)
+        if obj_stats['seconds'] > 0:
+            obj_stats['rate'] = round(
+                obj_stats['processed'] / obj_stats['seconds'], 1)
+
+    def _iter_ds_entries(self, ds_ldap, search_filter, search_base, scope,
+                         batch_size, obj_checkpoint, obj_stats):
+        """
+        Yield (position, entry) for objects in DS which were not processed
+        by the interrupted migration recorded in obj_checkpoint.
+        """
+        resume_cnt = obj_checkpoint['count']
+        resumed = resume_cnt == 0
+        entries = ds_ldap.iter_entries(
+            search_filter, ['*'], search_base, scope,
+            time_limit=0, page_size=batch_size
+        )
+        for position, entry_attrs in enumerate(entries, 1):
+            if position < resume_cnt:
+                continue
+            elif position > resume_cnt:
+                yield position, entry_attrs
+            elif unicode(entry_attrs.dn) == obj_checkpoint['last_dn']:
+                obj_stats['skipped'] = resume_cnt
+                resumed = True
+            else:
+                break
+        if resumed:
+            return
+
+        # DS returned the objects in a different order or fewer of them,
+        # start over; objects which were already migrated will be reported
+        # as failed
+        logger.warning('Objects in %s do not match the interrupted '
+                       'migration, restarting', search_base)
+        entries.close()
+        entries = ds_ldap.iter_entries(
+            search_filter, ['*'], search_base, scope,
+            time_limit=0, page_size=batch_size
+        )
+        for position, entry_attrs in enumerate(entries, 1):
+            yield position, entry_attrs
+
+    def _migrate_entry(self, ldap, config, ldap_obj, entry_attrs, exclude,
+                       context, migrated, failed, options, search_bases,
+                       valid_gids, invalid_gids, blacklists):
+        """
+        Migrate a single object retrieved from DS.
+        """
+        ldap_obj_name = ldap_obj.name
+        context['migrate_cnt'] = len(migrated[ldap_obj_name])
+        s = datetime.datetime.now()
+
+        ava = entry_attrs.dn[0][0]
+        if ava.attr == ldap_obj.primary_key.name:
+            # In case if pkey attribute is in the migrated object DN
+            # and the original LDAP is multivalued, make sure that
+            # we pick the correct value (the unique one stored in DN)
+            pkey = ava.value.lower()
+        else:
+            pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
 
-                migrated[ldap_obj_name].append(pkey)
+        if pkey in exclude:
+            return
 
-                callback = self.migrate_objects[ldap_obj_name]['post_callback']
-                if callable(callback):
+        entry_attrs.dn = ldap_obj.get_dn(pkey)
+        entry_attrs['objectclass'] = list(
+            set(
+                config.get(
+                    ldap_obj.object_class_config, ldap_obj.object_class
+                ) + [o.lower() for o in entry_attrs['objectclass']]
+            )
+        )
+        entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+        callback = self.migrate_objects[ldap_obj_name]['pre_callback']
+        if callable(callback):
+            try:
+                entry_attrs.dn = callback(
+                    ldap, pkey, entry_attrs.dn, entry_attrs,
+                    failed[ldap_obj_name], config, context,
+                    schema=options['schema'],
+                    search_bases=search_bases,
+                    valid_gids=valid_gids,
+                    invalid_gids=invalid_gids,
+                    **blacklists
+                )
+                if not entry_attrs.dn:
+                    return
+            except errors.NotFound as e:
+                failed[ldap_obj_name][pkey] = unicode(e.reason)
+                return
+
+        try:
+            ldap.add_entry(entry_attrs)
+        except errors.ExecutionError as e:
+            callback = self.migrate_objects[ldap_obj_name]['exc_callback']
+            if callable(callback):
+                try:
                     callback(
-                        ldap, pkey, entry_attrs.dn, entry_attrs,
-                        failed[ldap_obj_name], config, context)
-                e = datetime.datetime.now()
-                d = e - s
-                total_dur = e - migration_start
-                migrate_cnt += 1
-                if migrate_cnt > 0 and migrate_cnt % 100 == 0:
-                    logger.info("%d %ss migrated. %s elapsed.",
-                                migrate_cnt, ldap_obj_name, total_dur)
-                logger.debug("%d %ss migrated, duration: %s (total %s)",
-                             migrate_cnt, ldap_obj_name, d, total_dur)
+                        ldap, entry_attrs.dn, entry_attrs, e, options)
+                except errors.ExecutionError as e:
+                    failed[ldap_obj_name][pkey] = unicode(e)
+                    return
+            else:
+                failed[ldap_obj_name][pkey] = unicode(e)
+                return
 
-        if 'def_group_dn' in context:
-            _update_default_group(ldap, context, True)
+        migrated[ldap_obj_name].append(pkey)
 
-        return (migrated, failed)
+        callback = self.migrate_objects[ldap_obj_name]['post_callback']
+        if callable(callback):
+            callback(
+                ldap, pkey, entry_attrs.dn, entry_attrs,
+                failed[ldap_obj_name], config, context)
+        e = datetime.datetime.now()
+        logger.debug("%d %ss migrated, duration: %s",
+                     len(migrated[ldap_obj_name]), ldap_obj_name, e - s)
 
     def execute(self, ldapuri, bindpw, **options):
         ldap = self.api.Backend.ldap2
@@ -896,7 +1069,8 @@ migration process might be incomplete\n''')
 
         # check if migration mode is enabled
         if config.get('ipamigrationenabled', ('FALSE', ))[0] == 'FALSE':
-            return dict(result={}, failed={}, enabled=False, compat=True)
+            return dict(result={}, failed={}, enabled=False, compat=True,
+                        stats={})
 
         # connect to DS
         cacert = None
@@ -918,7 +1092,8 @@ migration process might be incomplete\n''')
         if not options.get('compat'):
             try:
                 ldap.get_entry(DN(('cn', 'compat'), (api.env.basedn)))
-                return dict(result={}, failed={}, enabled=True, compat=False)
+                return dict(result={}, failed={}, enabled=True, compat=False,
+                            stats={})
             except errors.NotFound:
                 pass
 
@@ -939,8 +1114,12 @@ migration process might be incomplete\n''')
                     raise Exception(str(e))
 
         # migrate!
-        (migrated, failed) = self.migrate(
-            ldap, config, ds_ldap, ds_base_dn, options
+        checkpoint_file = self._get_checkpoint_file(
+            ldapuri, ds_base_dn, options)
+        (migrated, failed, stats) = self.migrate(
+            ldap, config, ds_ldap, ds_base_dn, options, checkpoint_file
         )
+        self._remove_checkpoint(checkpoint_file)
 
-        return dict(result=migrated, failed=failed, enabled=True, compat=True)
+        return dict(result=migrated, failed=failed, enabled=True, compat=True,
+                    stats=stats)
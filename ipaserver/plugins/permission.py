@@ -24,13 +24,14 @@ import traceback
 import six
 
 from . import baseldap
+from .aci import get_aci_index
 from .privilege import validate_permission_to_privilege
 from ipalib import errors
 from ipalib.parameters import Str, StrEnum, DNParam, Flag
 from ipalib import api, _, ngettext
 from ipalib.plugable import Registry
 from ipalib.capabilities import client_has_capability
-from ipalib.aci import ACI
+from ipalib.aci import ACI, ACIIndex
 from ipapython.dn import DN
 from ipalib.request import context
 
@@ -493,7 +494,7 @@ class permission(baseldap.LDAPObject):
         if options.get('raw'):
             # Retreive the ACI from LDAP to ensure we get the real thing
             try:
-                _acientry, acistring = self._get_aci_entry_and_string(entry)
+                acistring = self._get_aci_string(entry)
             except errors.NotFound:
                 if list(entry.get('ipapermissiontype')) == ['SYSTEM']:
                     # SYSTEM permissions don't have normal ACIs
@@ -671,14 +672,13 @@ class permission(baseldap.LDAPObject):
         return acientry, acistring
 
     def _get_aci_entry_and_string(self, permission_entry, name=None,
-                                  notfound_ok=False, cached_acientry=None):
+                                  notfound_ok=False):
         """Get the entry and ACI corresponding to the permission entry
 
         :param name: The name of the permission, or None for the cn
         :param notfound_ok:
             If true, (acientry, None) will be returned on missing ACI, rather
             than raising exception
-        :param cached_acientry: See upgrade_permission()
         """
         ldap = self.api.Backend.ldap2
         if name is None:
@@ -687,15 +687,10 @@ class permission(baseldap.LDAPObject):
                                                      self.api.env.basedn)
         wanted_aciname = 'permission:%s' % name
 
-        if (cached_acientry and
-                cached_acientry.dn == location and
-                'aci' in cached_acientry):
-            acientry = cached_acientry
-        else:
-            try:
-                acientry = ldap.get_entry(location, ['aci'])
-            except errors.NotFound:
-                acientry = ldap.make_entry(location)
+        try:
+            acientry = ldap.get_entry(location, ['aci'])
+        except errors.NotFound:
+            acientry = ldap.make_entry(location)
 
         acis = acientry.get('aci', ())
         for acistring in acis:
@@ -714,8 +709,43 @@ class permission(baseldap.LDAPObject):
             reason=_('The ACI for permission %(name)s was not found '
                      'in %(dn)s ') % {'name': name, 'dn': location})
 
+    def _get_aci_string(self, permission_entry, name=None,
+                        notfound_ok=False, aci_index=None):
+        """Get the ACI corresponding to the permission entry
+
+        The ACI is looked up in the ACI index of the location, so the ACIs
+        of the location are not read unless they changed.
+
+        :param name: The name of the permission, or None for the cn
+        :param notfound_ok:
+            If true, None will be returned on missing ACI, rather than
+            raising exception
+        :param aci_index: See upgrade_permission()
+        """
+        ldap = self.api.Backend.ldap2
+        if name is None:
+            name = permission_entry.single_value['cn']
+        location = permission_entry.single_value.get('ipapermlocation',
+                                                     self.api.env.basedn)
+        wanted_aciname = 'permission:%s' % name
+
+        if aci_index is None:
+            try:
+                aci_index = get_aci_index(ldap, location)
+            except errors.NotFound:
+                aci_index = ACIIndex(())
+
+        for acistring in aci_index.find(('name', wanted_aciname)):
+            return acistring
+
+        if notfound_ok:
+            return None
+        raise errors.NotFound(
+            reason=_('The ACI for permission %(name)s was not found '
+                     'in %(dn)s ') % {'name': name, 'dn': location})
+
     def upgrade_permission(self, entry, target_entry=None,
-                           output_only=False, cached_acientry=None):
+                           output_only=False, aci_index=None):
         """Upgrade the given permission entry to V2, in-place
 
         The entry is only upgraded if it is a plain old-style permission,
@@ -728,24 +758,22 @@ class permission(baseldap.LDAPObject):
         :param output_only:
             If true, the flags & objectclass are not updated to V2.
             Used for the -find and -show commands.
-        :param cached_acientry:
-            Optional pre-retreived entry that contains the existing ACI.
-            If it is None or its DN does not match the location DN,
-            cached_acientry is ignored and the entry is retreived from LDAP.
+        :param aci_index:
+            Optional pre-retreived ACIIndex of the base DN, which contains
+            the existing ACI.
         """
         if entry.get('ipapermissiontype'):
             # Only convert old-style, non-SYSTEM permissions -- i.e. no flags
             return
-        base, acistring = self._get_aci_entry_and_string(
-            entry, cached_acientry=cached_acientry)
+        # The DN of old permissions is always basedn
+        location = entry.single_value.get('ipapermlocation',
+                                          self.api.env.basedn)
+        assert location == self.api.env.basedn, location
+        acistring = self._get_aci_string(entry, aci_index=aci_index)
 
         if not target_entry:
             target_entry = entry
 
-        # The DN of old permissions is always basedn
-        # (pylint thinks `base` is just a dict, but it's an LDAPEntry)
-        assert base.dn == self.api.env.basedn, base  # pylint: disable=E1103
-
         aci = ACI(acistring)
 
         if 'target' in aci.target:
@@ -1329,8 +1357,8 @@ class permission_find(baseldap.LDAPSearch):
                     base_dn=DN(self.obj.container_dn, self.api.env.basedn),
                     filter=ldap.combine_filters(filters, rules=ldap.MATCH_ALL),
                     attrs_list=attrs_list, size_limit=max_entries)
-                # Retrieve the root entry (with all legacy ACIs) at once
-                root_entry = ldap.get_entry(DN(api.env.basedn), ['aci'])
+                # Retrieve the index of all legacy ACIs at once
+                aci_index = get_aci_index(ldap, DN(api.env.basedn))
             except errors.NotFound:
                 legacy_entries = ()
             logger.debug('potential legacy entries: %s', len(legacy_entries))
@@ -1339,7 +1367,7 @@ class permission_find(baseldap.LDAPSearch):
                 if entry.single_value['cn'] in nonlegacy_names:
                     continue
                 self.obj.upgrade_permission(entry, output_only=True,
-                                            cached_acientry=root_entry)
+                                            aci_index=aci_index)
                 # If all given options match, include the entry
                 # Do a case-insensitive match, on any value if multi-valued
                 for opt in attribute_options:
@@ -884,6 +884,8 @@ class server_del(LDAPDelete):
                 keys[-1], self.context.topology_connectivity,
                 self.api.env.host)
 
+        topology.invalidate_topology_graphs()
+
         return super(server_del, self).post_callback(
             ldap, dn, *keys, **options)
 
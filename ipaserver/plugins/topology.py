@@ -14,8 +14,8 @@ from ipalib import _, ngettext
 from ipalib import output
 from ipalib.constants import DOMAIN_LEVEL_1
 from ipaserver.topology import (
-    create_topology_graph, get_topology_connection_errors,
-    map_masters_to_suffixes)
+    get_topology_connection_errors, get_topology_graphs,
+    invalidate_topology_graphs, map_masters_to_suffixes)
 from ipapython.dn import DN
 
 if six.PY3:
@@ -288,6 +288,7 @@ class topologysegment_add(LDAPCreate):
         assert isinstance(dn, DN)
         validate_domain_level(self.api)
         self.obj.validate_nodes(ldap, dn, entry_attrs, keys[0])
+        invalidate_topology_graphs()
         return dn
 
 
@@ -300,6 +301,7 @@ class topologysegment_del(LDAPDelete):
     def pre_callback(self, ldap, dn, *keys, **options):
         assert isinstance(dn, DN)
         validate_domain_level(self.api)
+        invalidate_topology_graphs()
         return dn
 
 
@@ -313,6 +315,7 @@ class topologysegment_mod(LDAPUpdate):
         assert isinstance(dn, DN)
         validate_domain_level(self.api)
         self.obj.validate_nodes(ldap, dn, entry_attrs, keys[0])
+        invalidate_topology_graphs()
         return dn
 
 
@@ -444,6 +447,7 @@ class topologysuffix_del(LDAPDelete):
     def pre_callback(self, ldap, dn, *keys, **options):
         assert isinstance(dn, DN)
         validate_domain_level(self.api)
+        invalidate_topology_graphs()
         return dn
 
 
@@ -458,6 +462,7 @@ class topologysuffix_add(LDAPCreate):
     def pre_callback(self, ldap, dn, entry_attrs, attrs_list, *keys, **options):
         assert isinstance(dn, DN)
         validate_domain_level(self.api)
+        invalidate_topology_graphs()
         return dn
 
 
@@ -472,6 +477,7 @@ class topologysuffix_mod(LDAPUpdate):
     def pre_callback(self, ldap, dn, entry_attrs, attrs_list, *keys, **options):
         assert isinstance(dn, DN)
         validate_domain_level(self.api)
+        invalidate_topology_graphs()
         return dn
 
 
@@ -496,14 +502,11 @@ Checks done:
 
         validate_domain_level(self.api)
 
-        masters = self.api.Command.server_find(
-            '', sizelimit=0, no_members=False)['result']
-        masters = map_masters_to_suffixes(masters).get(keys[0], [])
-        segments = self.api.Command.topologysegment_find(
-            keys[0], sizelimit=0)['result']
-        graph = create_topology_graph(masters, segments)
-        master_cns = [m['cn'][0] for m in masters]
-        master_cns.sort()
+        try:
+            graph = get_topology_graphs(self.api)[keys[0]]
+        except KeyError:
+            raise self.obj.handle_not_found(*keys)
+        master_cns = sorted(graph.vertices)
 
         # check if each master can contact others
         connect_errors = get_topology_connection_errors(graph)
@@ -21,10 +21,14 @@
 from __future__ import absolute_import
 
 import logging
+import os
+import threading
 import time
 from time import gmtime, strftime
 import posixpath
 
+import ldap as _ldap
+
 import six
 
 from ipalib import api
@@ -1074,8 +1078,9 @@ class user_status(LDAPQuery):
     policy. A locked account is a temporary condition and may be unlocked by
     an administrator.
 
-    This connects to each IPA master and displays the lockout status on
-    each one.
+    This connects to all IPA masters at once and displays the lockout status
+    on each one. Masters which do not respond within the ldap_replica_timeout
+    configured on the server are reported as failed.
 
     To determine whether an account is locked on a given server you need
     to compare the number of failed logins and the time of the last failure.
@@ -1099,6 +1104,53 @@ class user_status(LDAPQuery):
                 arg = arg.clone(cli_name='login')
             yield arg
 
+    def _get_master_entry(self, host, dn, attr_list, pool_key, timeout,
+                          results, expired):
+        """
+        Retrieve dn from the LDAP server of another master.
+
+        Runs in a worker thread; stores a tuple (entry, failed, error) in
+        results[host], where failed is True when connecting failed.
+
+        A thread which misses the deadline of the command is not waited
+        for. The network and operation timeouts of its connection are set
+        to timeout, so it finishes at the latest about a timeout after
+        the deadline. Once expired is set, the connection is unbound
+        instead of being returned to the pool.
+        """
+        pool = self.obj.backend.connection_pool
+        try:
+            other_ldap = LDAPClient(ldap_uri=pool_key[0])
+            conn = pool.acquire(pool_key) if pool.enabled else None
+            if conn is not None:
+                other_ldap._conn = conn
+            else:
+                with other_ldap.error_handler():
+                    other_ldap.conn.set_option(
+                        _ldap.OPT_NETWORK_TIMEOUT, timeout)
+                    other_ldap.conn.set_option(_ldap.OPT_TIMEOUT, timeout)
+                other_ldap.gssapi_bind()
+        except Exception as e:
+            results[host] = (None, True, e)
+            return
+
+        try:
+            entry = other_ldap.get_entry(dn, attr_list)
+        except Exception as e:
+            results[host] = (None, False, e)
+            pool = None
+        else:
+            results[host] = (entry, False, None)
+
+        if pool is not None and pool.enabled and not expired.is_set():
+            pool.release(pool_key, other_ldap.conn)
+        else:
+            try:
+                other_ldap.unbind()
+            except errors.PublicError:
+                pass
+        other_ldap.close()
+
     def execute(self, *keys, **options):
         ldap = self.obj.backend
         dn = self.api.Object.user.get_either_dn(*keys, **options)
@@ -1116,64 +1168,103 @@ class user_status(LDAPQuery):
             # If this happens we have some pretty serious problems
             logger.error('No IPA masters found!')
 
+        # Query other masters concurrently, so that the whole command
+        # takes as long as the slowest master within the timeout budget
+        timeout = self.api.env.ldap_replica_timeout
+        principal = getattr(context, 'principal', None)
+        ccache = os.environ.get('KRB5CCNAME')
+        results = {}
+        expired = threading.Event()
+        threads = []
+        for master in masters:
+            host = master['cn'][0]
+            if host == api.env.host:
+                continue
+            pool_key = ('ldap://%s' % host, principal, ccache)
+            thread = threading.Thread(
+                target=self._get_master_entry,
+                name='user_status %s' % host,
+                args=(host, dn, attr_list, pool_key, timeout, results,
+                      expired))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        # the local master is queried through the connection of the
+        # request, which is not available in the worker threads
+        if any(master['cn'][0] == api.env.host for master in masters):
+            try:
+                results[api.env.host] = (
+                    ldap.get_entry(dn, attr_list), False, None)
+            except Exception as e:
+                results[api.env.host] = (None, False, e)
+
+        deadline = time.time() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+        # threads still running unbind their connection when done and
+        # their results are ignored
+        expired.set()
+        results = dict(results)
+
         entries = []
         count = 0
         for master in masters:
             host = master['cn'][0]
-            if host == api.env.host:
-                other_ldap = self.obj.backend
-            else:
-                try:
-                    other_ldap = LDAPClient(ldap_uri='ldap://%s' % host)
-                    other_ldap.gssapi_bind()
-                except Exception as e:
-                    logger.error("user_status: Connecting to %s failed with "
-                                 "%s", host, str(e))
-                    newresult = {'dn': dn}
-                    newresult['server'] = _("%(host)s failed: %(error)s") % dict(host=host, error=str(e))
-                    entries.append(newresult)
-                    count += 1
-                    continue
             try:
-                entry = other_ldap.get_entry(dn, attr_list)
+                entry, connect_failed, error = results[host]
+            except KeyError:
+                entry = None
+                connect_failed = True
+                error = errors.NetworkError(
+                    uri='ldap://%s' % host, error=_('timed out'))
+
+            if connect_failed:
+                logger.error("user_status: Connecting to %s failed with "
+                             "%s", host, str(error))
                 newresult = {'dn': dn}
-                for attr in ['krblastsuccessfulauth', 'krblastfailedauth']:
-                    newresult[attr] = entry.get(attr, [u'N/A'])
-                newresult['krbloginfailedcount'] = entry.get('krbloginfailedcount', u'0')
-                if not options.get('raw', False):
-                    for attr in ['krblastsuccessfulauth', 'krblastfailedauth']:
-                        try:
-                            if newresult[attr][0] == u'N/A':
-                                continue
-                            newtime = time.strptime(newresult[attr][0], '%Y%m%d%H%M%SZ')
-                            newresult[attr][0] = unicode(time.strftime('%Y-%m-%dT%H:%M:%SZ', newtime))
-                        except Exception as e:
-                            logger.debug("time conversion failed with %s",
-                                         str(e))
-                newresult['server'] = host
-                if options.get('raw', False):
-                    time_format = '%Y%m%d%H%M%SZ'
-                else:
-                    time_format = '%Y-%m-%dT%H:%M:%SZ'
-                newresult['now'] = unicode(strftime(time_format, gmtime()))
-                convert_nsaccountlock(entry)
-                if 'nsaccountlock' in entry:
-                    disabled = entry['nsaccountlock']
-                self.api.Object.user.get_preserved_attribute(entry, options)
+                newresult['server'] = _("%(host)s failed: %(error)s") % dict(host=host, error=str(error))
                 entries.append(newresult)
                 count += 1
-            except errors.NotFound:
+                continue
+
+            if isinstance(error, errors.NotFound):
                 raise self.api.Object.user.handle_not_found(*keys)
-            except Exception as e:
+            elif error is not None:
                 logger.error("user_status: Retrieving status for %s failed "
-                             "with %s", dn, str(e))
+                             "with %s", dn, str(error))
                 newresult = {'dn': dn}
                 newresult['server'] = _("%(host)s failed") % dict(host=host)
                 entries.append(newresult)
                 count += 1
+                continue
 
-            if host != api.env.host:
-                other_ldap.close()
+            newresult = {'dn': dn}
+            for attr in ['krblastsuccessfulauth', 'krblastfailedauth']:
+                newresult[attr] = entry.get(attr, [u'N/A'])
+            newresult['krbloginfailedcount'] = entry.get('krbloginfailedcount', u'0')
+            if not options.get('raw', False):
+                for attr in ['krblastsuccessfulauth', 'krblastfailedauth']:
+                    try:
+                        if newresult[attr][0] == u'N/A':
+                            continue
+                        newtime = time.strptime(newresult[attr][0], '%Y%m%d%H%M%SZ')
+                        newresult[attr][0] = unicode(time.strftime('%Y-%m-%dT%H:%M:%SZ', newtime))
+                    except Exception as e:
+                        logger.debug("time conversion failed with %s",
+                                     str(e))
+            newresult['server'] = host
+            if options.get('raw', False):
+                time_format = '%Y%m%d%H%M%SZ'
+            else:
+                time_format = '%Y-%m-%dT%H:%M:%SZ'
+            newresult['now'] = unicode(strftime(time_format, gmtime()))
+            convert_nsaccountlock(entry)
+            if 'nsaccountlock' in entry:
+                disabled = entry['nsaccountlock']
+            self.api.Object.user.get_preserved_attribute(entry, options)
+            entries.append(newresult)
+            count += 1
 
         return dict(result=entries,
                     count=count,
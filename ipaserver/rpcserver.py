@@ -53,7 +53,7 @@ from ipalib.errors import (PublicError, InternalError, JSONError,
     ExecutionError, PasswordExpired, KrbPrincipalExpired, UserLocked)
 from ipalib.request import context, destroy_context
 from ipalib.rpc import (xml_dumps, xml_loads,
-    json_encode_binary, json_decode_binary)
+    json_encode_binary, json_iterencode_binary, json_decode_binary)
 from ipapython.dn import DN
 from ipaserver.plugins.ldap2 import ldap2
 from ipalib.backend import Backend
@@ -239,6 +239,38 @@ def extract_query(environ):
     return query
 
 
+def prime_response(chunks):
+    """
+    Produce the first chunk of a streamed response before it is sent.
+
+    Errors serializing the beginning of the response are raised here, so
+    they are still reported with an error status. Errors raised later,
+    after the success status was sent, are logged and re-raised, which
+    makes the WSGI server abort the connection instead of sending a
+    truncated response.
+    """
+    chunks = iter(chunks)
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return [b'']
+
+    def iterate():
+        try:
+            yield first
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            logger.exception('Failed to serialize the response')
+            raise
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    return iterate()
+
+
 class wsgi_dispatch(Executioner, HTTP_Status):
     """
     WSGI routing middleware and entry point into IPA server.
@@ -428,6 +460,8 @@ class WSGIExecutioner(Executioner):
         try:
             status = HTTP_STATUS_SUCCESS
             response = self.wsgi_execute(environ)
+            if not isinstance(response, bytes):
+                response = prime_response(response)
             if self.headers:
                 headers = self.headers
             else:
@@ -444,7 +478,9 @@ class WSGIExecutioner(Executioner):
             headers.append(('IPASESSION', logout_cookie))
 
         start_response(status, headers)
-        return [response]
+        if isinstance(response, bytes):
+            return [response]
+        return response
 
     def unmarshal(self, data):
         raise NotImplementedError('%s.unmarshal()' % type(self).__name__)
@@ -492,10 +528,15 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
             principal=unicode(principal),
             version=unicode(VERSION),
         )
-        dump = json_encode_binary(
-            response, version, pretty_print=self.api.env.debug
+        if self.api.env.debug:
+            dump = json_encode_binary(response, version, pretty_print=True)
+            return dump.encode('utf-8')
+        # the response is serialized while it is sent to the client, large
+        # results are never converted or held in memory as a whole
+        return (
+            chunk.encode('utf-8')
+            for chunk in json_iterencode_binary(response, version)
         )
-        return dump.encode('utf-8')
 
     def unmarshal(self, data):
         try:
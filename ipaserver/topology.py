@@ -6,9 +6,9 @@
 set of functions and classes useful for management of domain level 1 topology
 """
 
-from copy import deepcopy
-
-from ipalib import _
+from ipalib import _, errors
+from ipalib.request import context
+from ipapython.dn import DN
 from ipapython.graph import Graph
 
 CURR_TOPOLOGY_DISCONNECTED = _("""
@@ -51,21 +51,31 @@ def create_topology_graph(masters, segments):
     return graph
 
 
-def get_topology_connection_errors(graph):
+def get_topology_connection_errors(graph, removed=frozenset()):
     """
-    Traverse graph from each master and find out which masters are not
-    reachable.
+    Find out which masters are not reachable from each master.
+
+    Reachability is computed from strongly connected components of the
+    graph in linear time, instead of traversing the graph from each master.
 
     :param graph: topology graph where vertices are masters
+    :param removed: masters to consider as removed from the graph
     :returns: list of errors, error is: (master, visited, not_visited)
     """
+    removed = frozenset(removed)
+    masters = graph.vertices - removed
+
+    components = graph.get_strongly_connected_components(removed)
+    if len(components) <= 1:
+        return []
+
+    reachable = graph.get_reachable(removed, components)
+
     connect_errors = []
-    master_cns = list(graph.vertices)
-    master_cns.sort()
-    for m in master_cns:
-        visited = graph.bfs(m)
-        not_visited = graph.vertices - visited
-        if not_visited:
+    for m in sorted(masters):
+        visited = reachable[m]
+        if len(visited) < len(masters):
+            not_visited = masters - visited
             connect_errors.append((m, list(visited), list(not_visited)))
     return connect_errors
 
@@ -92,28 +102,105 @@ def map_masters_to_suffixes(masters):
     return masters_to_suffix
 
 
+TOPOLOGY_FILTER = (
+    '(|(objectclass=iparepltopomanagedserver)'
+    '(objectclass=iparepltopoconf)'
+    '(objectclass=iparepltoposegment))'
+)
+
+TOPOLOGY_ATTRS = [
+    'cn',
+    'iparepltopomanagedsuffix',
+    'iparepltopoconfroot',
+    'iparepltoposegmentdirection',
+    'iparepltoposegmentleftnode',
+    'iparepltoposegmentrightnode',
+]
+
+
 def _create_topology_graphs(api_instance):
     """
     Construct a topology graph for each topology suffix
+
+    Masters, suffixes and segments are read directly from LDAP with a single
+    subtree search of cn=ipa,cn=etc.
+
     :param api_instance: instance of IPA API
     """
-    masters = api_instance.Command.server_find(
-        u'', sizelimit=0, no_members=False)['result']
-
-    suffix_to_masters = map_masters_to_suffixes(masters)
+    ldap = api_instance.Backend.ldap2
+    basedn = api_instance.env.basedn
+    masters_dn = DN(api_instance.env.container_masters, basedn)
+    topology_dn = DN(api_instance.env.container_topology, basedn)
+
+    try:
+        entries = ldap.get_entries(
+            DN(('cn', 'ipa'), ('cn', 'etc'), basedn),
+            ldap.SCOPE_SUBTREE, TOPOLOGY_FILTER, TOPOLOGY_ATTRS,
+            size_limit=0)
+    except errors.NotFound:
+        entries = []
+
+    suffixes = {}
+    masters = []
+    segments = {}
+    for entry in entries:
+        if entry.dn[1:] == masters_dn:
+            masters.append(entry)
+        elif entry.dn[1:] == topology_dn:
+            if 'iparepltopoconfroot' in entry:
+                suffix_dn = DN(entry.single_value['iparepltopoconfroot'])
+                suffixes[suffix_dn] = entry.single_value['cn']
+        elif entry.dn[2:] == topology_dn:
+            suffix_name = entry.dn[1]['cn']
+            segments.setdefault(suffix_name, []).append(entry)
+
+    suffix_to_masters = {name: [] for name in suffixes.values()}
+    for master in masters:
+        for suffix_dn in master.get('iparepltopomanagedsuffix', []):
+            try:
+                suffix_name = suffixes[DN(suffix_dn)]
+            except KeyError:
+                continue
+            suffix_to_masters[suffix_name].append(master)
 
     topology_graphs = {}
 
     for suffix_name in suffix_to_masters:
-        segments = api_instance.Command.topologysegment_find(
-            suffix_name, sizelimit=0).get('result')
-
         topology_graphs[suffix_name] = create_topology_graph(
-            suffix_to_masters[suffix_name], segments)
+            suffix_to_masters[suffix_name], segments.get(suffix_name, []))
 
     return topology_graphs
 
 
+def get_topology_graphs(api_instance):
+    """
+    Get a topology graph for each topology suffix
+
+    The graphs are cached for the rest of the request; commands that modify
+    the topology have to call `invalidate_topology_graphs()`. The graphs
+    must not be modified.
+
+    :param api_instance: instance of IPA API
+    :returns: dict of suffix name: Graph
+    """
+    try:
+        return context.topology_graphs
+    except AttributeError:
+        graphs = context.topology_graphs = _create_topology_graphs(
+            api_instance)
+        return graphs
+
+
+def invalidate_topology_graphs():
+    """
+    Remove topology graphs cached for the current request
+    """
+    try:
+        del context.topology_graphs
+    except AttributeError:
+        pass
+
+
 def _format_topology_errors(topo_errors):
     msg_lines = []
     for error in topo_errors:
@@ -136,37 +223,48 @@ class TopologyConnectivity(object):
     def __init__(self, api_instance):
         self.api = api_instance
 
-        self.graphs = _create_topology_graphs(self.api)
+        self.graphs = get_topology_graphs(self.api)
 
     @property
     def errors(self):
+        return self._get_errors()
+
+    def _get_errors(self, removed=frozenset()):
         errors_by_suffix = {}
         for suffix in self.graphs:
             errors_by_suffix[suffix] = get_topology_connection_errors(
-                self.graphs[suffix]
+                self.graphs[suffix], removed
             )
 
         return errors_by_suffix
 
     def errors_after_master_removal(self, master_cn):
-        graphs_before = deepcopy(self.graphs)
-
-        for s in self.graphs:
-            try:
-                self.graphs[s].remove_vertex(master_cn)
-            except ValueError:
-                pass
-
-        errors_after_removal = self.errors
-
-        self.graphs = graphs_before
-
-        return errors_after_removal
+        return self._get_errors(frozenset([master_cn]))
+
+    def errors_after_masters_removal(self, master_cns, together=False):
+        """
+        Evaluate removal of masters without modifying the topology.
+
+        :param master_cns: masters to evaluate
+        :param together: if True, evaluate removal of all the masters at
+            once, otherwise evaluate removal of each master separately
+        :returns: errors by suffix after removal of all the masters if
+            ``together`` is True, otherwise a dict of errors by suffix for
+            each master
+        """
+        if together:
+            return self._get_errors(frozenset(master_cns))
+
+        return {
+            master_cn: self.errors_after_master_removal(master_cn)
+            for master_cn in master_cns
+        }
 
     def check_current_state(self):
         err_msg = ""
-        for suffix in self.errors:
-            errors = self.errors[suffix]
+        errors_by_suffix = self.errors
+        for suffix in errors_by_suffix:
+            errors = errors_by_suffix[suffix]
             if errors:
                 err_msg = "\n".join([
                     err_msg,
@@ -0,0 +1,287 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for prefetching, parse cache and update state of
+`ipaserver.install.ldapupdate`
+"""
+
+from __future__ import absolute_import
+
+import json
+
+import ldap
+import pytest
+
+from ipalib import errors
+from ipapython import ipaldap
+from ipapython.dn import DN
+from ipaserver.install import ldapupdate
+from ipaserver.install.ldapupdate import LDAPUpdate
+
+SUFFIX = DN(('dc', 'ipa'), ('dc', 'test'))
+
+UPDATE = u"""\
+dn: cn=test,cn=accounts,$SUFFIX
+default: objectClass: top
+default: objectClass: nsContainer
+default: cn: test
+
+dn: cn=one,cn=test,cn=accounts,$SUFFIX
+default: objectClass: top
+default: objectClass: nsContainer
+default: cn: one
+add: description: one
+
+dn: cn=two,cn=test,cn=accounts,$SUFFIX
+default: objectClass: top
+default: objectClass: nsContainer
+default: cn: two
+add: description: two
+
+dn: cn=missing,cn=test,cn=accounts,$SUFFIX
+addifexist: description: missing
+"""
+
+
+class FakeLDAP(ipaldap.LDAPClient):
+    """LDAP client storing entries in a dict"""
+    def __init__(self):
+        super(FakeLDAP, self).__init__('ldap://localhost', no_schema=True,
+                                       decode_attrs=False)
+        self.entries = {}
+        self.searches = []
+        # called with the DN of each written entry, like a 389-DS plugin
+        self.plugin = None
+
+    def _connect(self):
+        return None
+
+    def _make(self, dn):
+        entry = self.make_entry(dn)
+        entry.raw.update(
+            (attr, list(values)) for attr, values in self.entries[dn].items())
+        entry.reset_modlist()
+        return entry
+
+    def get_entries(self, base_dn, scope=ldap.SCOPE_SUBTREE, filter=None,
+                    attrs_list=None, **kwargs):
+        self.searches.append((base_dn, scope))
+        if scope == ldap.SCOPE_BASE:
+            dns = [dn for dn in self.entries if dn == base_dn]
+        else:
+            dns = [dn for dn in self.entries if dn[1:] == base_dn]
+        if not dns:
+            raise errors.NotFound(reason='no such entry')
+        return [self._make(dn) for dn in dns]
+
+    def add_entry(self, entry):
+        if entry.dn in self.entries:
+            raise errors.DuplicateEntry()
+        if entry.dn[1:] not in self.entries:
+            raise errors.NotFound(reason='no parent')
+        self.entries[entry.dn] = {
+            attr: list(values) for attr, values in entry.raw.items()}
+        if self.plugin is not None:
+            self.plugin(entry.dn)
+
+    def update_entry(self, entry):
+        self.entries[entry.dn] = {
+            attr: list(values) for attr, values in entry.raw.items()}
+        entry.reset_modlist()
+        if self.plugin is not None:
+            self.plugin(entry.dn)
+
+    def delete_entry(self, dn):
+        del self.entries[dn]
+
+
+def make_updater(tmpdir, monkeypatch, text):
+    update_file = tmpdir.join('10-test.update')
+    update_file.write(text)
+
+    conn = FakeLDAP()
+    accounts = DN(('cn', 'accounts'), SUFFIX)
+    conn.entries[accounts] = {'cn': [b'accounts']}
+    conn.entries[DN(('cn', 'one'), ('cn', 'test'), accounts)] = {
+        'cn': [b'one'], 'objectClass': [b'top', b'nsContainer']}
+
+    ld = LDAPUpdate.__new__(LDAPUpdate)
+    ld.__dict__.update(
+        sub_dict=dict(SUFFIX=SUFFIX, TIME=1),
+        conn=None,
+        modified=False,
+        online=True,
+        state_file=str(tmpdir.join('ldapupdate.json')),
+        summary=None,
+        _prefetched={},
+        _entry_timings=[],
+        _incomplete=False,
+    )
+    monkeypatch.setattr(LDAPUpdate, 'create_connection',
+                        lambda self: setattr(self, 'conn', conn))
+    monkeypatch.setattr(LDAPUpdate, 'close_connection',
+                        lambda self: setattr(self, 'conn', None))
+    monkeypatch.setattr(ldapupdate, '_parsed_updates', {})
+    return ld, conn, str(update_file)
+
+
+@pytest.fixture
+def updater(tmpdir, monkeypatch):
+    return make_updater(tmpdir, monkeypatch, UPDATE)
+
+
+@pytest.mark.tier0
+class TestIncrementalUpdate(object):
+    def test_fingerprint(self):
+        text = u'dn: cn=$TIME,$SUFFIX\n'
+        sub_dict = dict(SUFFIX=SUFFIX, TIME=1, REALM=u'IPA.TEST')
+        fingerprint = ldapupdate.update_fingerprint(text, sub_dict)
+        sub_dict['REALM'] = u'EXAMPLE.TEST'
+        assert ldapupdate.update_fingerprint(text, sub_dict) == fingerprint
+        sub_dict['TIME'] = 2
+        assert ldapupdate.update_fingerprint(text, sub_dict) != fingerprint
+
+    def test_update(self, updater):
+        ld, conn, filename = updater
+        assert ld.update([filename])
+
+        test_dn = DN(('cn', 'test'), ('cn', 'accounts'), SUFFIX)
+        assert conn.entries[DN(('cn', 'one'), test_dn)]['description'] == [
+            b'one']
+        assert conn.entries[DN(('cn', 'two'), test_dn)]['description'] == [
+            b'two']
+        assert DN(('cn', 'missing'), test_dn) not in conn.entries
+
+        summary = ld.summary['files'][0]
+        assert not summary['skipped']
+        assert not summary['parse_cached']
+        assert sorted(e['result'] for e in summary['entries']) == [
+            'added', 'added', 'unchanged', 'updated']
+        # one search for the parent and one for the children of test,
+        # repeated to record the state after the update
+        assert summary['searches'] == 4
+        assert ld.summary['modified']
+        json.dumps(ld.summary)
+
+    def test_skip_applied(self, updater):
+        ld, conn, filename = updater
+        ld.update([filename])
+        num_searches = len(conn.searches)
+
+        assert not ld.update([filename])
+        summary = ld.summary['files'][0]
+        assert summary['skipped']
+        assert summary['parse_cached']
+        assert summary['entries'] == []
+        assert len(conn.searches) - num_searches == 2
+
+        # modified entry is updated again
+        one = DN(('cn', 'one'), ('cn', 'test'), ('cn', 'accounts'), SUFFIX)
+        conn.entries[one]['description'] = [b'changed']
+        assert ld.update([filename])
+        assert not ld.summary['files'][0]['skipped']
+        assert conn.entries[one]['description'] == [b'changed', b'one']
+
+    def test_no_state_file(self, updater):
+        ld, _conn, filename = updater
+        ld.state_file = None
+        ld.update([filename])
+        ld.update([filename])
+        summary = ld.summary['files'][0]
+        assert not summary['skipped']
+        assert sorted(e['result'] for e in summary['entries']) == [
+            'unchanged'] * 4
+
+    def test_changed_file(self, updater):
+        ld, _conn, filename = updater
+        ld.update([filename])
+        with open(filename, 'a') as f:
+            f.write(u'add: description: another\n')
+        ld.update([filename])
+        summary = ld.summary['files'][0]
+        assert not summary['skipped']
+        assert not summary['parse_cached']
+
+    def test_incomplete_not_recorded(self, updater):
+        ld, conn, filename = updater
+        del conn.entries[DN(('cn', 'accounts'), SUFFIX)]
+        ld.update([filename])
+        assert 'failed' in [
+            e['result'] for e in ld.summary['files'][0]['entries']]
+        ld.update([filename])
+        assert not ld.summary['files'][0]['skipped']
+
+
+PLUGIN_UPDATE = u"""\
+dn: cn=test,cn=accounts,$SUFFIX
+default: objectClass: top
+default: objectClass: nsContainer
+default: cn: test
+
+dn: cn=origin,cn=test,cn=accounts,$SUFFIX
+default: objectClass: top
+default: objectClass: nsContainer
+default: cn: origin
+add: description: origin
+
+dn: cn=managed,cn=test,cn=accounts,$SUFFIX
+default: objectClass: top
+default: objectClass: nsContainer
+default: cn: managed
+add: description: managed
+"""
+
+TEST_DN = DN(('cn', 'test'), ('cn', 'accounts'), SUFFIX)
+ORIGIN_DN = DN(('cn', 'origin'), TEST_DN)
+MANAGED_DN = DN(('cn', 'managed'), TEST_DN)
+
+
+@pytest.mark.tier0
+class TestPluginChanges(object):
+    @pytest.fixture
+    def updater(self, tmpdir, monkeypatch):
+        return make_updater(tmpdir, monkeypatch, PLUGIN_UPDATE)
+
+    def test_created_by_plugin(self, updater):
+        """An entry prefetched as missing is created by a plugin"""
+        ld, conn, filename = updater
+
+        def plugin(dn):
+            if dn == ORIGIN_DN:
+                conn.entries[MANAGED_DN] = {
+                    'cn': [b'managed'],
+                    'objectClass': [b'top', b'nsContainer'],
+                    'mepManagedBy': [str(ORIGIN_DN).encode('utf-8')]}
+        conn.plugin = plugin
+
+        assert ld.update([filename])
+        assert conn.entries[MANAGED_DN]['description'] == [b'managed']
+        assert conn.entries[MANAGED_DN]['mepManagedBy'] == [
+            str(ORIGIN_DN).encode('utf-8')]
+        results = [e['result'] for e in ld.summary['files'][0]['entries']]
+        assert results == ['added', 'added', 'updated']
+        assert not ld._incomplete
+
+    def test_managed_entry_changed(self, updater):
+        """A write of a managed entry origin drops prefetched entries"""
+        ld, conn, filename = updater
+        conn.entries[TEST_DN] = {
+            'cn': [b'test'], 'objectClass': [b'top', b'nsContainer']}
+        conn.entries[ORIGIN_DN] = {
+            'cn': [b'origin'],
+            'objectClass': [b'top', b'nsContainer', b'mepOriginEntry']}
+        conn.entries[MANAGED_DN] = {
+            'cn': [b'managed'], 'objectClass': [b'top', b'nsContainer']}
+
+        def plugin(dn):
+            if dn == ORIGIN_DN:
+                conn.entries[MANAGED_DN]['mepManagedBy'] = [
+                    str(ORIGIN_DN).encode('utf-8')]
+        conn.plugin = plugin
+
+        ld.update([filename])
+        # the managed entry is updated from its live state
+        assert conn.entries[MANAGED_DN]['description'] == [b'managed']
+        assert conn.entries[MANAGED_DN]['mepManagedBy'] == [
+            str(ORIGIN_DN).encode('utf-8')]
@@ -0,0 +1,139 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the dnsrecord-export client plugin
+"""
+
+import json
+
+import pytest
+
+from ipalib import messages
+from ipaclient.plugins import dns
+from ipapython.dnsutil import DNSName
+
+ZONE = DNSName(u'example.test.')
+
+ZONE_ENTRY = {
+    u'idnsname': [u'example.test.'],
+    u'idnsSOAmName': [u'ns1.example.test.'],
+    u'idnsSOArName': [u'hostmaster.example.test.'],
+    u'idnsSOAserial': [u'1'],
+    u'idnsSOArefresh': [u'3600'],
+    u'idnsSOAretry': [u'900'],
+    u'idnsSOAexpire': [u'604800'],
+    u'idnsSOAminimum': [u'86400'],
+    u'dnsdefaultttl': [u'3600'],
+    u'nSRecord': [u'ns1'],
+}
+
+# entries in the order of the paged search
+RECORD_ENTRIES = [
+    {u'idnsname': [u'@'], u'nSRecord': [u'ns1'],
+     u'mXRecord': [u'10 mail']},
+    {u'idnsname': [u'mail'], u'dnsTTL': [u'60'],
+     u'aRecord': [u'192.0.2.2'], u'aAAARecord': [u'2001:db8::2']},
+    {u'idnsname': [u'ns1'], u'aRecord': [u'192.0.2.1', u'192.0.2.3']},
+    {u'idnsname': [u'www'], u'cNAMERecord': [u'mail.example.test.'],
+     u'objectClass': [u'top', u'idnsrecord']},
+]
+
+
+class FakeBackend(object):
+    def isconnected(self):
+        return True
+
+
+class FakeCommands(object):
+    def __init__(self):
+        self.searches = []
+
+    def dnszone_show(self, zone, **options):
+        assert zone == ZONE
+        return dict(result=ZONE_ENTRY)
+
+    def dnsrecord_find(self, zone, **options):
+        assert zone == ZONE
+        self.searches.append(options)
+        start = int(options.get('cursor', 0))
+        end = start + options['page_size']
+        result = dict(result=RECORD_ENTRIES[start:end])
+        if end < len(RECORD_ENTRIES):
+            result['messages'] = [
+                messages.SearchResultPaged(cursor=end).to_dict()]
+        return result
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.Command = FakeCommands()
+        self.Backend = type('Backend', (object,), {})()
+        self.Backend.ldap2 = FakeBackend()
+        self.env = type('Env', (object,), {})()
+        self.env.in_server = True
+
+
+@pytest.fixture
+def export(tmpdir):
+    api = FakeAPI()
+    cmd = dns.dnsrecord_export(api)
+    out = str(tmpdir.join('example.test.db'))
+
+    def export(**options):
+        result = cmd.execute(ZONE, out=out, **options)
+        with open(out) as f:
+            return result, f.read()
+
+    export.api = api
+    return export
+
+
+@pytest.mark.tier0
+class TestDNSRecordExport(object):
+    def test_zone_file(self, export):
+        result, text = export(format=u'zone', page_size=3)
+        assert result['count'] == 8
+        assert text.splitlines() == [
+            u'$ORIGIN example.test.',
+            u'$TTL 3600',
+            u'@\t\tIN\tSOA\tns1.example.test. hostmaster.example.test. '
+            u'1 3600 900 604800 86400',
+            u'@\t\tIN\tMX\t10 mail',
+            u'@\t\tIN\tNS\tns1',
+            u'mail\t60\tIN\tAAAA\t2001:db8::2',
+            u'mail\t60\tIN\tA\t192.0.2.2',
+            u'ns1\t\tIN\tA\t192.0.2.1',
+            u'ns1\t\tIN\tA\t192.0.2.3',
+            u'www\t\tIN\tCNAME\tmail.example.test.',
+        ]
+        # the zone file can be imported back
+        assert len(dns.zone_file_records(text, ZONE)) == 7
+
+    def test_summary(self, export, monkeypatch):
+        result, _text = export(format=u'zone', page_size=10)
+        assert result['summary'].startswith(u'Exported 8 records to ')
+
+        monkeypatch.setattr(export.api.Command, 'dnsrecord_find',
+                            lambda zone, **options: dict(result=[]))
+        result, _text = export(format=u'zone', page_size=10)
+        assert result['count'] == 1
+        assert result['summary'].startswith(u'Exported 1 record to ')
+
+    def test_paging(self, export):
+        result, _text = export(format=u'zone', page_size=1)
+        assert result['count'] == 8
+        searches = export.api.Command.searches
+        assert len(searches) == len(RECORD_ENTRIES)
+        assert 'cursor' not in searches[0]
+        assert all(s['page_size'] == 1 for s in searches)
+
+    def test_jsonl(self, export):
+        _result, text = export(format=u'jsonl', page_size=2)
+        records = [json.loads(line) for line in text.splitlines()]
+        assert len(records) == 8
+        assert records[0]['type'] == u'SOA'
+        assert records[4] == dict(name=u'mail.example.test.', ttl=60,
+                                  type=u'A', data=u'192.0.2.2')
+        assert records[5] == dict(name=u'ns1.example.test.', ttl=3600,
+                                  type=u'A', data=u'192.0.2.1')
@@ -0,0 +1,53 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for zone file parsing of the dnsrecord-import client plugin
+"""
+
+import pytest
+
+from ipalib import errors
+from ipaclient.plugins import dns
+from ipapython.dnsutil import DNSName
+
+ZONE_FILE = u"""\
+$ORIGIN example.test.
+$TTL 3600
+@       IN SOA ns1 hostmaster 1 3600 900 604800 86400
+        IN NS ns1
+        IN MX 10 mail
+ns1     IN A 192.0.2.1
+mail 60 IN A 192.0.2.2
+        IN AAAA 2001:db8::2
+www     IN CNAME mail.example.test.
+txt     IN TXT "two words" (
+                   "continued" )
+"""
+
+
+@pytest.mark.tier0
+class TestZoneFileRecords(object):
+    def test_records(self):
+        records = dns.zone_file_records(ZONE_FILE, DNSName(u'example.test'))
+        assert records == [
+            u'example.test. 3600 IN NS ns1.example.test.',
+            u'example.test. 3600 IN MX 10 mail.example.test.',
+            u'mail.example.test. 60 IN A 192.0.2.2',
+            u'mail.example.test. 3600 IN AAAA 2001:db8::2',
+            u'ns1.example.test. 3600 IN A 192.0.2.1',
+            u'txt.example.test. 3600 IN TXT "two words" "continued"',
+            u'www.example.test. 3600 IN CNAME mail.example.test.',
+        ]
+
+    def test_invalid(self):
+        with pytest.raises(errors.ValidationError):
+            dns.zone_file_records(u'www IN A\n', DNSName(u'example.test'))
+
+    def test_batches(self):
+        records = [u'a A 192.0.2.1', u'a A 192.0.2.2', u'a A 192.0.2.3',
+                   u'b A 192.0.2.4', u'c A 192.0.2.5']
+        batches = list(dns._import_batches(records, size=2))
+        # records of a name are kept in one batch
+        assert batches == [records[:3], records[3:]]
+        assert list(dns._import_batches(records, size=100)) == [records]
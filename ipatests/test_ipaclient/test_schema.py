@@ -0,0 +1,170 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the schema cache of `ipaclient.remote_plugins.schema`
+"""
+
+import json
+import marshal
+import os
+import zipfile
+
+import pytest
+
+from ipaclient.remote_plugins import schema as schema_module
+from ipaclient.remote_plugins.schema import (
+    Schema, _SchemaCommandPlugin, _SchemaMethod)
+
+FINGERPRINT = u'0123456789abcdef'
+NUM_OBJECTS = 100
+
+
+class FakeAPI(object):
+    def is_production_mode(self):
+        return False
+
+
+def make_schema():
+    commands = {}
+    classes = {}
+    topics = {}
+    for i in range(NUM_OBJECTS):
+        obj = u'object{}'.format(i)
+        classes[u'{}/1'.format(obj)] = dict(
+            name=obj,
+            version=u'1',
+            full_name=u'{}/1'.format(obj),
+            params=[dict(name=u'cn', type=u'str', primary_key=True)],
+        )
+        topics[u'{}/1'.format(obj)] = dict(
+            name=obj,
+            version=u'1',
+            full_name=u'{}/1'.format(obj),
+            doc=u'Topic {}'.format(i),
+        )
+        for verb in (u'add', u'del', u'find', u'mod', u'show'):
+            name = u'{}_{}'.format(obj, verb)
+            commands[u'{}/1'.format(name)] = dict(
+                name=name,
+                version=u'1',
+                full_name=u'{}/1'.format(name),
+                doc=u'{} {}.\n\nLong description.'.format(verb, obj),
+                topic_topic=u'{}/1'.format(obj),
+                obj_class=u'{}/1'.format(obj),
+                attr_name=verb,
+                params=[
+                    dict(name=u'cn', type=u'str', cli_name=u'name'),
+                    dict(name=u'description', type=u'str', required=False),
+                    dict(name=u'all', type=u'bool', required=False,
+                         default=[u'False']),
+                ],
+                output=[
+                    dict(name=u'summary', type=u'unicode', required=False),
+                    dict(name=u'result', type=u'dict'),
+                    dict(name=u'value', type=u'unicode'),
+                ],
+            )
+    return dict(classes=classes, commands=commands, topics=topics)
+
+
+@pytest.fixture
+def schema_dirs(tmpdir, monkeypatch):
+    schema_dir = tmpdir.mkdir('schema')
+    compiled_dir = tmpdir.join('compiled')
+    monkeypatch.setattr(Schema, '_DIR', str(schema_dir))
+    monkeypatch.setattr(Schema, '_COMPILED_DIR', str(compiled_dir))
+
+    data = make_schema()
+    halp = Schema._generate_help(None, data)
+    filename = str(schema_dir.join(FINGERPRINT))
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as f:
+        for ns, members in data.items():
+            for member, value in members.items():
+                f.writestr(u'{}/{}'.format(ns, member),
+                           json.dumps(value).encode('utf-8'))
+        f.writestr('_help', json.dumps(halp).encode('utf-8'))
+
+    return str(schema_dir), str(compiled_dir)
+
+
+@pytest.mark.tier0
+class TestSchemaCache(object):
+    def test_compiled_cache(self, schema_dirs):
+        _schema_dir, compiled_dir = schema_dirs
+        from_zip = Schema(None, FINGERPRINT)
+        assert from_zip._loads is schema_module._json_loads
+        assert os.path.exists(os.path.join(compiled_dir, FINGERPRINT))
+
+        compiled = Schema(None, FINGERPRINT)
+        assert compiled._loads is marshal.loads
+        for ns in Schema.namespaces:
+            assert sorted(compiled[ns]) == sorted(from_zip[ns])
+            for member in from_zip[ns]:
+                assert compiled[ns][member] == from_zip[ns][member]
+        assert (compiled['commands'].get_help(u'object1_show/1') ==
+                from_zip['commands'].get_help(u'object1_show/1'))
+
+    def test_corrupted_compiled_cache(self, schema_dirs):
+        _schema_dir, compiled_dir = schema_dirs
+        Schema(None, FINGERPRINT)
+        with open(os.path.join(compiled_dir, FINGERPRINT), 'wb') as f:
+            f.write(b'garbage')
+
+        schema = Schema(None, FINGERPRINT)
+        assert schema._loads is schema_module._json_loads
+        member = schema['commands'][u'object1_show/1']
+        assert member['name'] == u'object1_show'
+
+        # the compiled cache is rewritten
+        assert Schema(None, FINGERPRINT)._loads is marshal.loads
+
+    def test_lazy_class(self, schema_dirs):
+        schema = Schema(None, FINGERPRINT)
+        plugin = _SchemaCommandPlugin(schema, 'object1_show/1')
+        command = plugin(FakeAPI())
+
+        assert isinstance(command, _SchemaMethod)
+        assert command.name == 'object1_show'
+        assert command.obj_full_name == 'object1/1'
+        assert command.attr_name == 'show'
+        assert command.topic == 'object1'
+        assert command.summary == u'show object1.'
+        # the schema of the command is not decoded until needed
+        assert isinstance(schema._dict['commands'][u'object1_show/1'], bytes)
+
+        assert command.doc == u'show object1.\n\nLong description.'
+        attributes = plugin.get_attributes(FakeAPI())
+        assert [p.name for p in attributes['takes_args']] == ['cn']
+        assert ([p.name for p in attributes['takes_options']] ==
+                ['description', 'all'])
+        assert ([o.name for o in attributes['has_output']] ==
+                ['summary', 'result', 'value'])
+        assert plugin.get_attributes(FakeAPI()) is attributes
+
+    def test_startup_equivalent(self, schema_dirs, monkeypatch):
+        """
+        Loading the schema and creating a command gives the same result
+        with the compiled cache and with the zip file.
+        """
+        Schema(None, FINGERPRINT)
+
+        def startup():
+            schema = Schema(None, FINGERPRINT)
+            helps = [schema['commands'].get_help(full_name)
+                     for full_name in sorted(schema['commands'])]
+            plugin = _SchemaCommandPlugin(schema, 'object1_show/1')
+            command = plugin(FakeAPI())
+            attributes = plugin.get_attributes(FakeAPI())
+            return (helps, command.doc,
+                    [repr(p) for p in attributes['takes_args']],
+                    [repr(p) for p in attributes['takes_options']],
+                    [o.name for o in attributes['has_output']])
+
+        compiled = startup()
+
+        monkeypatch.setattr(Schema, '_read_compiled_schema',
+                            lambda self, fingerprint: False)
+        monkeypatch.setattr(Schema, '_write_compiled_schema',
+                            lambda self, fingerprint: None)
+        assert startup() == compiled
@@ -23,7 +23,13 @@ Test the `ipalib.aci` module.
 """
 from __future__ import print_function
 
-from ipalib.aci import ACI
+import re
+import shlex
+
+import six
+
+from ipalib import aci as aci_module
+from ipalib.aci import ACI, ACIIndex, parse_aci
 
 import pytest
 
@@ -174,3 +180,206 @@ def test_aci_parsing_10():
                       '(version 3.0;acl "Allow trust agents to retrieve '
                       'keytab keys for cross realm principals";allow (read) '
                       'userattr = "ipaAllowedToPerform;read_keys#GROUPDN";)')
+
+
+def shlex_parse_target(aci):
+    """Reference implementation of target parsing using shlex"""
+    if six.PY2:
+        aci = aci.encode('utf-8')
+    lexer = shlex.shlex(aci)
+    lexer.wordchars = lexer.wordchars + "."
+
+    target = {}
+    for token in lexer:
+        if token == "(":
+            var = next(lexer).strip()
+            operator = next(lexer)
+            if operator not in ("=", "!="):
+                operator = operator + next(lexer)
+            val = next(lexer).strip().strip('"')
+            assert next(lexer) == ")"
+            if var == 'targetattr':
+                val = re.split(r'[^a-zA-Z0-9;\*]+', val)
+            target[var] = dict(operator=operator, expression=val)
+    return target
+
+
+def make_aci_corpus(count):
+    """ACIs similar to the ones of managed permissions and self service"""
+    basedn = 'dc=ipa,dc=test'
+    corpus = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            corpus.append(
+                '(targetattr = "cn || description || gidnumber || member || '
+                'memberof || objectclass || ipauniqueid")'
+                '(targetfilter = "(|(objectclass=ipausergroup)'
+                '(objectclass=posixgroup))")'
+                '(target = "ldap:///cn=*,cn=groups,cn=accounts,{0}")'
+                '(version 3.0;acl "permission:System: Read Groups {1}";'
+                'allow (compare,read,search) groupdn = "ldap:///'
+                'cn=System: Read Groups {1},cn=permissions,cn=pbac,{0}";)'
+                .format(basedn, i))
+        elif kind == 1:
+            corpus.append(
+                '(targetattr = "givenname || sn || cn || displayname || '
+                'title || initials")(version 3.0;acl "selfservice:Self '
+                'service {0}";allow (write) userdn = "ldap:///self";)'
+                .format(i))
+        elif kind == 2:
+            corpus.append(
+                '(targetattr != "aci || userPassword || krbPrincipalKey")'
+                '(version 3.0; acl "Anonymous access {0}"; allow (read, '
+                'search, compare) userdn = "ldap:///anyone";)'.format(i))
+        else:
+            corpus.append(
+                '(targetattr=member)(target = "ldap:///cn=ipausers,'
+                'cn=groups,cn=accounts,{0}")(version 3.0;acl "delegation:'
+                'Delegation {1}";allow (write) groupdn = "ldap:///cn=admins,'
+                'cn=groups,cn=accounts,{0}";)'.format(basedn, i))
+    return corpus
+
+
+def test_aci_parse_corpus():
+    for acistr in make_aci_corpus(40):
+        a = ACI(acistr)
+        vstart = acistr.find('version 3.0')
+        assert a.target == shlex_parse_target(acistr[:vstart - 1])
+        # export and parse again gives the same ACI
+        exported = a.export_to_string()
+        assert ACI(exported).export_to_string() == exported
+        assert ACI(exported).isequal(a)
+
+
+def test_aci_parse_errors():
+    for acistr in ('(targetattr = "cn"(version 3.0;acl "a";allow (read) '
+                   'userdn = "ldap:///self";)',
+                   '(targetattr "cn")(version 3.0;acl "a";allow (read) '
+                   'userdn = "ldap:///self";)',
+                   'garbage(version 3.0;acl "a";allow (read) '
+                   'userdn = "ldap:///self";)',
+                   '(targetattr = "cn")(acl "a";allow (read) '
+                   'userdn = "ldap:///self";)'):
+        with pytest.raises(SyntaxError):
+            ACI(acistr)
+
+
+def test_aci_parse_cache(monkeypatch):
+    monkeypatch.setattr(aci_module, 'ACI_CACHE_SIZE', 2)
+    monkeypatch.setattr(aci_module, '_parsed_acis',
+                        aci_module.collections.OrderedDict())
+    first, second, third = make_aci_corpus(3)
+
+    parsed = parse_aci(first)
+    assert parse_aci(first) is parsed
+    with pytest.raises(AttributeError):
+        parsed.name = 'other'
+
+    # ACI instances do not share the cached parse
+    a = ACI(first)
+    a.set_target_attr(['title'])
+    a.permissions.append('write')
+    assert ACI(first).target['targetattr']['expression'] == [
+        'cn', 'description', 'gidnumber', 'member', 'memberof',
+        'objectclass', 'ipauniqueid']
+    assert ACI(first).permissions == ['compare', 'read', 'search']
+
+    # least recently used ACI is evicted
+    parse_aci(second)
+    parse_aci(first)
+    parse_aci(third)
+    assert list(aci_module._parsed_acis) == [first, third]
+
+
+def test_aci_parse_uncached(monkeypatch):
+    """
+    Parsing with the parse cache gives the same ACIs as parsing without
+    the cache and as the shlex based target parser.
+    """
+    corpus = make_aci_corpus(200)
+    monkeypatch.setattr(aci_module, '_parsed_acis',
+                        aci_module.collections.OrderedDict())
+    for acistr in corpus:
+        ACI(acistr)
+    cached = [ACI(acistr) for acistr in corpus]
+
+    aci_module._parsed_acis.clear()
+    for acistr, a in zip(corpus, cached):
+        uncached = ACI(acistr)
+        target = acistr[:acistr.find('version 3.0') - 1]
+        assert uncached.target == shlex_parse_target(target)
+        assert a.isequal(uncached)
+        assert a.export_to_string() == uncached.export_to_string()
+
+
+def linear_find(acistrs, name=None, attrs=(), permissions=(), bindrule=None):
+    """Reference implementation filtering all ACIs"""
+    results = []
+    for acistr in acistrs:
+        a = ACI(acistr)
+        if name is not None and a.name != name:
+            continue
+        if attrs:
+            if 'targetattr' not in a.target:
+                continue
+            targetattrs = {t.lower()
+                           for t in a.target['targetattr']['expression']}
+            if not {t.lower() for t in attrs} <= targetattrs:
+                continue
+        if not set(permissions) <= set(a.permissions):
+            continue
+        if bindrule is not None and a.bindrule['expression'] != bindrule:
+            continue
+        results.append(acistr)
+    return results
+
+
+def test_aci_index():
+    corpus = make_aci_corpus(40)
+    index = ACIIndex(corpus + ['garbage'])
+    assert len(index) == 40
+    assert index.unparseable == ['garbage']
+    assert index.find() == corpus
+
+    assert index.get('PERMISSION:System: Read Groups 4') == [corpus[4]]
+    assert index.get('permission:System: Read Groups 5') == []
+    assert index.find(('name', 'selfservice:Self service 5')) == [corpus[5]]
+
+    for kwargs in (dict(attrs=['CN', 'description']),
+                   dict(attrs=['member'], permissions=['write']),
+                   dict(permissions=['read', 'search']),
+                   dict(bindrule='ldap:///self', attrs=['title']),
+                   dict(bindrule='ldap:///anyone', permissions=['write'])):
+        criteria = [('targetattr', a) for a in kwargs.get('attrs', ())]
+        criteria += [('permission', p)
+                     for p in kwargs.get('permissions', ())]
+        if 'bindrule' in kwargs:
+            criteria.append(('bindrule', kwargs['bindrule']))
+        assert index.find(*criteria) == linear_find(corpus, **kwargs)
+
+    # callable criteria are called with each distinct value
+    values = []
+    results = index.find(
+        ('target', lambda target: values.append(target) or
+         target.startswith('ldap:///cn=ipausers')),
+        ('permission', 'write'))
+    assert results == corpus[3::4]
+    assert sorted(values) == [
+        'ldap:///cn=*,cn=groups,cn=accounts,dc=ipa,dc=test',
+        'ldap:///cn=ipausers,cn=groups,cn=accounts,dc=ipa,dc=test']
+
+
+def test_aci_index_large():
+    """
+    Lookups by name and by bind rule in 2000 ACIs give the same results as
+    filtering all of them.
+    """
+    corpus = make_aci_corpus(2000)
+    index = ACIIndex(corpus)
+    for i in range(1, 2000, 40):
+        name = 'selfservice:Self service {}'.format(i)
+        assert index.find(('name', name)) == linear_find(corpus, name=name)
+    assert (
+        index.find(('bindrule', 'ldap:///self'), ('targetattr', 'title')) ==
+        linear_find(corpus, bindrule='ldap:///self', attrs=['title']))
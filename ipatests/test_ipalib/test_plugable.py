@@ -26,6 +26,7 @@ Test the `ipalib.plugable` module.
 
 import os
 import textwrap
+import threading
 
 from ipalib import plugable, errors, create_api
 from ipatests.util import raises, read_only
@@ -247,6 +248,67 @@ class test_API(ClassChecker):
         e = raises(Exception, api.finalize)
         assert str(e) == 'API.finalize() already called', str(e)
 
+    def test_plugins_on_demand(self):
+        """
+        Test creating plugins on demand in `ipalib.plugable.API`.
+        """
+        class base0(plugable.Plugin):
+            created = []
+
+            def __init__(self, api):
+                super(base0, self).__init__(api)
+                self.created.append(self)
+
+            def _on_finalize(self):
+                self.value = self.name.upper()
+                super(base0, self)._on_finalize()
+
+        class API(plugable.API):
+            bases = (base0,)
+            modules = ()
+
+        api = API()
+        api.env.mode = 'unit_test'
+        api.env.in_tree = True
+        api.env.plugins_on_demand = True
+        api.env.startup_report = True
+
+        class plugin0(base0):
+            pass
+        api.add_plugin(plugin0)
+
+        class plugin1(base0):
+            pass
+        api.add_plugin(plugin1)
+
+        api.finalize()
+        assert base0.created == []
+        assert api.get_startup_report() == []
+
+        results = []
+
+        def worker():
+            results.append(api.base0.plugin0)
+
+        threads = [threading.Thread(target=worker) for _i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(base0.created) == 1
+        assert all(r is base0.created[0] for r in results)
+
+        report = api.get_startup_report()
+        assert [r[0] for r in report] == ['plugin0/1']
+        assert report[0][2] is None
+
+        plugin = api.base0.plugin0
+        plugin.ensure_finalized()
+        assert plugin.value == 'PLUGIN0'
+        report = api.get_startup_report()
+        assert report[0][2] >= 0
+
     def test_bootstrap(self):
         """
         Test the `ipalib.plugable.API.bootstrap` method.
@@ -22,12 +22,17 @@ Test the `ipalib.rpc` module.
 """
 from __future__ import print_function
 
+import datetime
+import json
+import threading
 import unittest
 
 import pytest
 import six
 # pylint: disable=import-error
 from six.moves.xmlrpc_client import Binary, Fault, dumps, loads
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.http_client import HTTPConnection
 # pylint: enable=import-error
 from six.moves import urllib
 
@@ -36,7 +41,8 @@ from ipatests.util import Fuzzy
 from ipatests.data import binary_bytes, utf8_bytes, unicode_str
 from ipalib.frontend import Command
 from ipalib.request import context, Connection
-from ipalib import rpc, errors, api, request
+from ipalib import rpc, errors, api, request, util
+from ipapython.dn import DN
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -201,6 +207,73 @@ def test_xml_loads():
         assert type(e.faultString) is unicode
 
 
+def make_find_result(count):
+    """Result of a find command with ``count`` host-like entries"""
+    entries = []
+    for i in range(count):
+        fqdn = u'host{:06d}.ipa.test'.format(i)
+        entries.append({
+            'dn': DN(('fqdn', fqdn), ('cn', 'computers'), ('cn', 'accounts'),
+                     ('dc', 'ipa'), ('dc', 'test')),
+            'fqdn': (fqdn,),
+            'description': (u'Host {} \u017ea'.format(i),),
+            'krbprincipalname': (u'host/{}@IPA.TEST'.format(fqdn),),
+            'krblastpwdchange': (
+                datetime.datetime(2026, 1, 1, 12, 0, i % 60),),
+            'usercertificate': (binary_bytes * 16,),
+            'has_keytab': True,
+        })
+    return dict(
+        result=dict(result=entries, count=count, truncated=False,
+                    summary=None),
+        error=None,
+        id=0,
+        principal=u'admin@IPA.TEST',
+        version=u'4.7.90',
+    )
+
+
+def test_json_iterencode_binary():
+    """
+    Test the `ipalib.rpc.json_iterencode_binary` function.
+    """
+    values = [
+        make_find_result(10),
+        dict(empty_dict={}, empty_list=[], nested=dict(a=[{}, []]),
+             keys={1: None, 2: None, None: 2.5},
+             bool_key={True: u'x'}),
+        [binary_bytes, utf8_bytes, unicode_str, None, (1, 2)],
+        unicode_str,
+        None,
+    ]
+    for value in values:
+        for version in (API_VERSION, u'2.0'):
+            chunks = list(rpc.json_iterencode_binary(value, version,
+                                                     chunk_size=100))
+            assert u''.join(chunks) == rpc.json_encode_binary(value, version)
+            assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+
+
+def test_json_iterencode_binary_chunks():
+    """
+    Test that `ipalib.rpc.json_iterencode_binary` encodes a large find
+    result in chunks bounded by the chunk size and the size of one entry.
+    """
+    value = make_find_result(1000)
+    entries = value['result']['result']
+    max_entry = max(len(rpc.json_encode_binary(entry, API_VERSION))
+                    for entry in entries)
+    chunk_size = 4096
+
+    chunks = rpc.json_iterencode_binary(value, API_VERSION,
+                                        chunk_size=chunk_size)
+    size = 0
+    for chunk in chunks:
+        assert len(chunk) < chunk_size + max_entry
+        size += len(chunk)
+    assert size == len(rpc.json_encode_binary(value, API_VERSION))
+
+
 class test_xmlclient(PluginTester):
     """
     Test the `ipalib.rpc.xmlclient` plugin.
@@ -396,3 +469,131 @@ class test_rpcclient_context(PluginTester):
         # pylint: disable=E1121
         unquoted = urllib.parse.unquote(session_cookie)
         assert(unquoted == fuzzy_cookie)
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Echo server counting connections and requests"""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        request = json.loads(body.decode('utf-8'))
+        self.server.requests.append(
+            (request['method'], self.headers.get('Cookie')))
+        if request['method'] == 'fail':
+            response = {'error': {'code': 4001, 'message': u'not found',
+                                  'name': 'NotFound'},
+                        'result': None, 'id': 0}
+        else:
+            response = {'error': None, 'result': request['params'][0],
+                        'id': 0}
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header(
+            'Set-Cookie', 'ipa_session=MagBearerToken=%d; path=/ipa' %
+            len(self.server.requests))
+        if request['method'] == 'close':
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalTransport(rpc.KerbTransport):
+    """KerbTransport using plain HTTP connections"""
+    def make_connection(self, host):
+        host, self._extra_headers, _x509 = self.get_host_info(host)
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        self._connection = host, HTTPConnection(host)
+        return self._connection[1]
+
+
+@pytest.fixture
+def json_server():
+    server = HTTPServer(('127.0.0.1', 0), JSONHandler)
+    server.connections = 0
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%d/ipa/json' % server.server_port
+
+    context.session_cookie = 'ipa_session=MagBearerToken=0;'
+    context.request_url = url
+    proxy = rpc.JSONServerProxy(url, LocalTransport(protocol='json'),
+                                'UTF-8', 0, True)
+    try:
+        yield server, proxy
+    finally:
+        proxy._ServerProxy__transport.close()
+        server.shutdown()
+        server.server_close()
+        del context.session_cookie
+        del context.request_url
+
+
+@pytest.mark.tier0
+class test_keep_alive(object):
+    """
+    Test connection reuse and pipelining of `ipalib.rpc.KerbTransport`
+    """
+    def test_session_cookie(self, json_server):
+        server, proxy = json_server
+        options = {'version': API_VERSION}
+        assert proxy.ping((u'a',), options) == (u'a',)
+        assert proxy.ping((u'b',), options) == (u'b',)
+        assert server.connections == 1
+        # the cookie received with the first response is used
+        assert server.requests == [
+            ('ping', 'ipa_session=MagBearerToken=0;'),
+            ('ping', 'ipa_session=MagBearerToken=1;'),
+        ]
+
+    def test_pipelined(self, json_server):
+        server, proxy = json_server
+        options = {'version': API_VERSION}
+        calls = [('ping', ((unicode(i),), options)) for i in range(10)]
+        calls[3] = ('fail', ((), options))
+        results = proxy._request_pipelined(calls)
+
+        assert len(results) == 10
+        assert isinstance(results[3], errors.NotFound)
+        assert results[:3] + results[4:] == [
+            (unicode(i),) for i in range(10) if i != 3]
+        assert server.connections == 1
+        assert len(server.requests) == 10
+
+    def test_pipelined_close(self, json_server):
+        server, proxy = json_server
+        options = {'version': API_VERSION}
+        calls = [('ping', ((unicode(i),), options)) for i in range(5)]
+        calls[1] = ('close', ((u'1',), options))
+        results = proxy._request_pipelined(calls)
+
+        assert results == [(unicode(i),) for i in range(5)]
+        # the requests not answered before the server closed the
+        # connection are sent again on a new connection
+        assert server.connections == 2
+        assert [r[0] for r in server.requests[-3:]] == ['ping'] * 3
+
+    def test_tls_session(self):
+        class Socket(object):
+            session = object()
+
+            def close(self):
+                pass
+
+        conn = util.ResumableHTTPSConnection('ipa.example.test', 443)
+        conn.sock = Socket()
+        conn.close()
+        assert conn.tls_session is Socket.session
@@ -1,10 +1,15 @@
 import contextlib
+import os
+import pickle
+import subprocess
+import sys
 import unittest
 import pytest
 
 from cryptography import x509
 import six
 
+from ipapython import dn as dn_module
 from ipapython.dn import DN, RDN, AVA
 
 if six.PY3:
@@ -1344,5 +1349,81 @@ class TestInternationalization(unittest.TestCase):
             self.assertEqual(str(dn1), b'cn=' + self.arabic_hello_utf8)
 
 
+class TestPickle(unittest.TestCase):
+    # pickles a hashed DN in a process with another string hash seed
+    script = (
+        "import pickle, sys\n"
+        "from ipapython.dn import DN\n"
+        "dn = DN('cn=x,dc=example,dc=test')\n"
+        "hash(dn); hash(dn[0]); hash(dn[0][0])\n"
+        "out = getattr(sys.stdout, 'buffer', sys.stdout)\n"
+        "out.write(pickle.dumps([dn, dn[0], dn[0][0]], 2))\n"
+    )
+
+    def test_cross_process(self):
+        seed = '2' if os.environ.get('PYTHONHASHSEED') == '1' else '1'
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [p for p in sys.path if p] + [env.get('PYTHONPATH', '')])
+        data = subprocess.check_output(
+            [sys.executable, '-c', self.script], env=env)
+        dn, rdn, ava = pickle.loads(data)
+
+        expected = DN('cn=x,dc=example,dc=test')
+        self.assertEqual(dn, expected)
+        self.assertEqual(rdn, expected[0])
+        self.assertEqual(ava, expected[0][0])
+        self.assertIn(dn, {expected: None})
+        self.assertIn(rdn, {expected[0]: None})
+        self.assertIn(ava, {expected[0][0]: None})
+
+    def test_cache_not_pickled(self):
+        dn = DN('cn=x,dc=example,dc=test')
+        hash(dn)
+        copy = pickle.loads(pickle.dumps(dn))
+        self.assertNotIn('_hash', copy.__dict__)
+        self.assertNotIn('_key', copy.__dict__)
+        self.assertEqual(copy, dn)
+        self.assertEqual(hash(copy), hash(dn))
+
+
+class TestCache(unittest.TestCase):
+    """
+    The cached normalized form of DN objects gives the same results as
+    the equivalent uncached operations.
+    """
+    def setUp(self):
+        self.suffix = DN('cn=accounts,dc=ipa,dc=example,dc=test')
+        self.dns = [
+            DN(('uid', 'user%d' % i), ('cn', 'users'), self.suffix)
+            for i in range(20)
+        ]
+
+    def test_hash(self):
+        for dn in self.dns:
+            hash(dn)
+            upper = DN(str(dn).upper())
+            self.assertEqual(hash(dn), hash(upper))
+            self.assertEqual(dn, upper)
+
+    def test_endswith(self):
+        for dn in self.dns:
+            self.assertEqual(
+                dn.endswith(self.suffix),
+                dn._cmp_sequence(self.suffix,
+                                 len(dn) - len(self.suffix),
+                                 len(self.suffix)) == 0)
+        self.assertFalse(self.suffix.endswith(self.dns[0]))
+
+    def test_parse(self):
+        value = str(self.suffix)
+        cached = DN(value)
+        dn_module._parse_cache.clear()
+        uncached = DN(value)
+        self.assertEqual(cached, uncached)
+        self.assertEqual(cached.rdns, uncached.rdns)
+        self.assertEqual(hash(cached), hash(uncached))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,201 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the keep-alive HTTPS connection pool of ipapython.dogtag
+"""
+
+import socket
+
+import pytest
+import six
+
+from ipalib import errors
+from ipapython import dogtag
+
+if six.PY3:
+    # pylint: disable=import-error
+    from http.client import RemoteDisconnected
+else:
+    from httplib import BadStatusLine
+
+    def RemoteDisconnected(msg):
+        return BadStatusLine("''")
+
+
+class FakeResponse(object):
+    status = 200
+    msg = {}
+
+    def __init__(self, will_close=False):
+        self.will_close = will_close
+
+    def read(self):
+        return b'body'
+
+
+class FakeConnection(object):
+    tls_session = None
+    fail = None
+    response_fail = None
+    will_close = False
+
+    def __init__(self, host, port, context=None):
+        self.host = host
+        self.port = port
+        self.context = context
+        self.sock = None
+        self.closed = False
+
+    def request(self, method, url, body=None, headers=None):
+        if self.fail is not None:
+            raise self.fail
+        self.sock = object()
+
+    def getresponse(self):
+        if self.response_fail is not None:
+            raise self.response_fail
+        return FakeResponse(self.will_close)
+
+    def close(self):
+        self.sock = None
+        self.closed = True
+
+
+SSL_OPTIONS = dict(cafile='/etc/ipa/ca.crt', client_certfile=None,
+                   client_keyfile=None)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(dogtag, 'ResumableHTTPSConnection', FakeConnection)
+    monkeypatch.setattr(dogtag, 'create_https_context',
+                        lambda **kwargs: object())
+    return dogtag.HTTPSConnectionPool(max_per_host=2, timeout=0)
+
+
+@pytest.mark.tier0
+class TestHTTPSConnectionPool(object):
+    def test_keep_alive(self, pool):
+        res, body = pool.request('ca.example.test', 443, 'GET', '/', None,
+                                 {}, **SSL_OPTIONS)
+        assert body == b'body'
+        conn = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        assert conn.sock is not None
+        pool.release(conn)
+        stats = pool.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['size'] == 1
+        assert stats['active'] == 0
+
+    def test_context_shared(self, pool):
+        first = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        second = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        assert first is not second
+        assert first.context is second.context
+        pool.release(first)
+        pool.release(second)
+
+    def test_will_close(self, pool, monkeypatch):
+        monkeypatch.setattr(FakeConnection, 'will_close', True)
+        pool.request('ca.example.test', 443, 'GET', '/', None, {},
+                     **SSL_OPTIONS)
+        assert pool.stats()['size'] == 0
+
+    def test_per_host_limit(self, pool):
+        conns = [pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+                 for _i in range(2)]
+        with pytest.raises(errors.NetworkError):
+            pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        # other hosts are not affected
+        other = pool.acquire('kra.example.test', 443, **SSL_OPTIONS)
+        pool.release(other)
+        conns[0].sock = object()
+        pool.release(conns[0])
+        conn = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        assert conn is conns[0]
+
+    def test_idle_eviction(self, pool):
+        pool.idle_timeout = -1
+        conn = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        conn.sock = object()
+        pool.release(conn)
+        other = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        assert other is not conn
+        assert conn.closed
+        assert pool.stats()['evictions'] == 1
+
+    def test_reconnect(self, pool):
+        conn = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        conn.sock = object()
+        conn.fail = socket.error('Connection reset by peer')
+        pool.release(conn)
+        _res, body = pool.request('ca.example.test', 443, 'GET', '/', None,
+                                  {}, **SSL_OPTIONS)
+        assert body == b'body'
+        assert conn.closed
+        assert pool.stats()['reconnects'] == 1
+
+    def test_new_connection_failure(self, pool, monkeypatch):
+        monkeypatch.setattr(FakeConnection, 'fail',
+                            socket.error('Connection refused'))
+        with pytest.raises(socket.error):
+            pool.request('ca.example.test', 443, 'GET', '/', None, {},
+                         **SSL_OPTIONS)
+        assert pool.stats()['active'] == 0
+
+    def stale_connection(self, pool):
+        conn = pool.acquire('ca.example.test', 443, **SSL_OPTIONS)
+        conn.sock = object()
+        pool.release(conn)
+        return conn
+
+    def test_no_retry_after_send(self, pool):
+        conn = self.stale_connection(pool)
+        conn.response_fail = socket.error('Connection reset by peer')
+        # the server may have processed the request
+        with pytest.raises(socket.error):
+            pool.request('ca.example.test', 443, 'POST', '/', b'data', {},
+                         **SSL_OPTIONS)
+        assert pool.stats()['reconnects'] == 0
+
+        # idempotent requests are retried
+        conn = self.stale_connection(pool)
+        conn.response_fail = socket.error('Connection reset by peer')
+        _res, body = pool.request('ca.example.test', 443, 'GET', '/', None,
+                                  {}, **SSL_OPTIONS)
+        assert body == b'body'
+        assert pool.stats()['reconnects'] == 1
+
+    def test_retry_closed_before_response(self, pool):
+        conn = self.stale_connection(pool)
+        conn.response_fail = RemoteDisconnected('Remote end closed connection')
+        _res, body = pool.request('ca.example.test', 443, 'POST', '/',
+                                  b'data', {}, **SSL_OPTIONS)
+        assert body == b'body'
+        assert pool.stats()['reconnects'] == 1
+
+    def test_no_retry_timeout(self, pool):
+        conn = self.stale_connection(pool)
+        conn.fail = socket.timeout('timed out')
+        with pytest.raises(socket.timeout):
+            pool.request('ca.example.test', 443, 'GET', '/', None, {},
+                         **SSL_OPTIONS)
+        assert pool.stats()['reconnects'] == 0
+
+    def test_single_retry(self, pool, monkeypatch):
+        class StaleConnection(FakeConnection):
+            fail = socket.error('Connection reset by peer')
+
+            def __init__(self, *args, **kwargs):
+                super(StaleConnection, self).__init__(*args, **kwargs)
+                self.sock = object()
+
+        # every connection, even a new one, looks reused and fails
+        monkeypatch.setattr(dogtag, 'ResumableHTTPSConnection',
+                            StaleConnection)
+        with pytest.raises(socket.error):
+            pool.request('ca.example.test', 443, 'GET', '/', None, {},
+                         **SSL_OPTIONS)
+        assert pool.stats()['reconnects'] == 1
@@ -0,0 +1,135 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the streamed paged search of `ipapython.ipaldap.LDAPClient`
+"""
+
+import ldap
+from ldap.controls import SimplePagedResultsControl
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipapython.ipaldap import LDAPClient
+
+BASE_DN = DN(('ou', 'people'), ('dc', 'example'), ('dc', 'test'))
+
+
+def make_entries(count):
+    return [('uid=user%d,%s' % (i, BASE_DN), {'uid': [b'user%d' % i]})
+            for i in range(count)]
+
+
+class FakePagedConnection(object):
+    """python-ldap connection serving entries page by page"""
+    def __init__(self, entries, fail_page=None):
+        self.entries = entries
+        self.fail_page = fail_page
+        # (start, size) of every search
+        self.searches = []
+        self.pending = {}
+        self.abandoned = []
+        self.cancelled = []
+        self.msgid = 0
+
+    @staticmethod
+    def _page(serverctrls):
+        ctrl, = serverctrls
+        return int(ctrl.cookie or 0), ctrl.size
+
+    def search_ext(self, base, scope, filter, attrs, serverctrls, timeout):
+        assert base == str(BASE_DN)
+        start, size = self._page(serverctrls)
+        self.searches.append((start, size))
+        if len(self.searches) == self.fail_page:
+            raise ldap.TIMELIMIT_EXCEEDED({'desc': 'Time limit exceeded'})
+        self.msgid += 1
+        end = start + size
+        cookie = str(end).encode('ascii') if end < len(self.entries) else b''
+        results = [(ldap.RES_SEARCH_ENTRY, [entry], self.msgid, [])
+                   for entry in self.entries[start:end]]
+        results.append((ldap.RES_SEARCH_RESULT, [], self.msgid,
+                        [SimplePagedResultsControl(True, size, cookie)]))
+        self.pending[self.msgid] = results
+        return self.msgid
+
+    def result3(self, msgid, all):
+        assert all == 0
+        result = self.pending[msgid].pop(0)
+        if result[0] == ldap.RES_SEARCH_RESULT:
+            del self.pending[msgid]
+        return result
+
+    def abandon(self, msgid):
+        del self.pending[msgid]
+        self.abandoned.append(msgid)
+
+    def search_ext_s(self, base, scope, filter, attrs, serverctrls,
+                     timeout):
+        start, size = self._page(serverctrls)
+        assert size == 0
+        self.cancelled.append(start)
+        return []
+
+
+def make_client(entries, **kwargs):
+    client = LDAPClient('ldap://ldap.example.test', no_schema=True)
+    conn = FakePagedConnection(entries, **kwargs)
+    client._conn = conn
+    return client, conn
+
+
+def iter_dns(client, **kwargs):
+    entries = client.iter_entries(base_dn=BASE_DN, time_limit=0, **kwargs)
+    return (entry.dn for entry in entries)
+
+
+@pytest.mark.tier0
+class TestIterEntries(object):
+    def test_pages(self):
+        entries = make_entries(5)
+        client, conn = make_client(entries)
+        dns = list(iter_dns(client, page_size=2))
+        assert dns == [DN(entry[0]) for entry in entries]
+        assert conn.searches == [(0, 2), (2, 2), (4, 2)]
+        assert conn.abandoned == []
+        assert conn.cancelled == []
+        assert conn.pending == {}
+
+    def test_empty(self):
+        client, conn = make_client([])
+        assert list(iter_dns(client)) == []
+        assert conn.searches == [(0, 1000)]
+
+    def test_streamed(self):
+        client, conn = make_client(make_entries(5))
+        dns = iter_dns(client, page_size=2)
+        next(dns)
+        # the next page is not requested before it is needed
+        assert conn.searches == [(0, 2)]
+        next(dns)
+        assert conn.searches == [(0, 2)]
+        next(dns)
+        assert conn.searches == [(0, 2), (2, 2)]
+
+    def test_close_abandons(self):
+        client, conn = make_client(make_entries(5))
+        entries = client.iter_entries(base_dn=BASE_DN, page_size=2)
+        for _i in range(3):
+            next(entries)
+        entries.close()
+        assert conn.abandoned == [2]
+        assert conn.cancelled == []
+        assert conn.pending == {}
+
+    def test_error_cancels(self):
+        client, conn = make_client(make_entries(5), fail_page=2)
+        dns = iter_dns(client, page_size=2)
+        assert next(dns) == DN(make_entries(1)[0][0])
+        next(dns)
+        with pytest.raises(errors.TimeLimitExceeded):
+            next(dns)
+        # the paged search is released with its cookie
+        assert conn.cancelled == [2]
+        assert conn.abandoned == []
@@ -20,7 +20,10 @@
 Test the `kernel_keyring.py` module.
 """
 
+import os
+
 from ipapython import kernel_keyring
+from ipaplatform.paths import paths
 
 import pytest
 
@@ -164,3 +167,49 @@ class test_keyring(object):
         assert(result == TEST_VALUE)
 
         kernel_keyring.del_key(TEST_UNICODEKEY)
+
+
+def test_fallback():
+    """
+    keyctl is executed when libkeyutils is not available
+    """
+    keyctl = kernel_keyring._get_keyctl('libkeyutils-missing.so')
+    assert type(keyctl) is kernel_keyring.KeyctlCommand
+
+
+@pytest.mark.skipif(not os.path.exists(paths.KEYCTL),
+                    reason="keyctl is not installed")
+def test_backends_agree(monkeypatch):
+    """
+    libkeyutils and keyctl give the same results and see each other's keys
+    """
+    try:
+        libkeyutils = kernel_keyring.LibKeyutils()
+    except OSError:
+        pytest.skip("libkeyutils is not available")
+    keyctl = kernel_keyring.KeyctlCommand()
+
+    def session():
+        results = []
+        kernel_keyring.add_key(TEST_KEY, TEST_VALUE)
+        results.append(kernel_keyring.has_key(TEST_KEY))
+        results.append(kernel_keyring.read_key(TEST_KEY))
+        kernel_keyring.update_key(TEST_KEY, UPDATE_VALUE)
+        results.append(kernel_keyring.read_key(TEST_KEY))
+        kernel_keyring.del_key(TEST_KEY)
+        results.append(kernel_keyring.has_key(TEST_KEY))
+        return results
+
+    monkeypatch.setattr(kernel_keyring, '_keyctl', libkeyutils)
+    lib_results = session()
+    monkeypatch.setattr(kernel_keyring, '_keyctl', keyctl)
+    assert session() == lib_results == [True, TEST_VALUE, UPDATE_VALUE,
+                                        False]
+
+    # a key added by one backend is read and removed by the other
+    kernel_keyring.add_key(TEST_KEY, TEST_VALUE)
+    monkeypatch.setattr(kernel_keyring, '_keyctl', libkeyutils)
+    assert kernel_keyring.read_key(TEST_KEY) == TEST_VALUE
+    kernel_keyring.del_key(TEST_KEY)
+    monkeypatch.setattr(kernel_keyring, '_keyctl', keyctl)
+    assert not kernel_keyring.has_key(TEST_KEY)
@@ -0,0 +1,90 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the ACI index cache of `ipaserver.plugins.aci`
+"""
+
+import pytest
+
+from ipalib import errors
+from ipalib.request import context
+from ipapython.dn import DN
+from ipaserver.plugins import aci as aci_plugin
+from ipaserver.plugins.aci import get_aci_index
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+
+ACIS = [
+    u'(targetattr = "cn")(version 3.0;acl "permission:Read Groups";'
+    u'allow (read) groupdn = "ldap:///cn=Read Groups,cn=permissions,'
+    u'cn=pbac,dc=ipa,dc=test";)',
+    u'(targetattr = "title")(version 3.0;acl "selfservice:Self service";'
+    u'allow (write) userdn = "ldap:///self";)',
+]
+
+
+class FakeLDAP(object):
+    def __init__(self):
+        self.acis = list(ACIS)
+        self.usn = 1
+        self.readers = None
+        self.aci_reads = 0
+
+    def modify(self, acis):
+        self.acis = acis
+        self.usn += 1
+
+    def get_entry(self, dn, attrs_list):
+        if dn != BASEDN:
+            raise errors.NotFound(reason='no such entry')
+        entry = {'entryusn': [self.usn],
+                 'modifytimestamp': [u'20260101000000Z']}
+        if 'aci' in attrs_list:
+            self.aci_reads += 1
+            principal = getattr(context, 'principal', None)
+            if self.readers is None or principal in self.readers:
+                entry['aci'] = list(self.acis)
+        return entry
+
+
+@pytest.mark.tier0
+class TestACIIndexCache(object):
+    @pytest.fixture(autouse=True)
+    def clean_cache(self, monkeypatch):
+        monkeypatch.setattr(aci_plugin, '_aci_indexes', {})
+        context.principal = u'admin@IPA.TEST'
+        yield
+        del context.principal
+
+    def test_cached(self):
+        ldap = FakeLDAP()
+        index = get_aci_index(ldap, BASEDN)
+        assert index.find(('bindrule', u'ldap:///self')) == [ACIS[1]]
+        assert get_aci_index(ldap, BASEDN) is index
+        assert ldap.aci_reads == 1
+
+        ldap.modify(ACIS[:1])
+        index = get_aci_index(ldap, BASEDN)
+        assert index.acistrs == tuple(ACIS[:1])
+        assert ldap.aci_reads == 2
+
+        with pytest.raises(errors.NotFound):
+            get_aci_index(ldap, DN(('cn', 'missing'), BASEDN))
+
+    def test_principals(self):
+        ldap = FakeLDAP()
+        ldap.readers = {u'admin@IPA.TEST', u'other@IPA.TEST'}
+        index = get_aci_index(ldap, BASEDN)
+
+        # another principal reads the ACIs once before the index is shared
+        context.principal = u'other@IPA.TEST'
+        assert get_aci_index(ldap, BASEDN) is index
+        assert get_aci_index(ldap, BASEDN) is index
+        assert ldap.aci_reads == 2
+
+        # principals which can't read the ACIs don't get the index
+        context.principal = u'user@IPA.TEST'
+        assert len(get_aci_index(ldap, BASEDN)) == 0
+        context.principal = u'admin@IPA.TEST'
+        assert len(get_aci_index(ldap, BASEDN)) == 2
@@ -0,0 +1,368 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for adding and removing group members in bulk
+"""
+
+import re
+
+import ldap
+import pytest
+import six
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins.baseldap import LDAPAddMember, LDAPRemoveMember
+from ipaserver.plugins.ldap2 import ldap2
+
+if six.PY3:
+    unicode = str
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+USERS = DN(('cn', 'users'), ('cn', 'accounts'), BASEDN)
+GROUPS = DN(('cn', 'groups'), ('cn', 'accounts'), BASEDN)
+
+
+def user(name):
+    return DN(('uid', name), USERS)
+
+
+def group(name):
+    return DN(('cn', name), GROUPS)
+
+
+class FakeEntry(object):
+    def __init__(self, dn, attrs=None):
+        self.dn = dn
+        self.attrs = attrs or {}
+
+    def items(self):
+        return self.attrs.items()
+
+
+class FakeLDAP(ldap2):
+    """ldap2 backend with an in-memory directory"""
+    ldap_uri = 'ldapi://'
+    member_chunk_size = 3
+
+    def __init__(self, refused=()):
+        # bypass plugin initialization
+        self._pool_key_attr = 'ldap2_pool_key'
+        self.entries = [user('u%d' % i) for i in range(10)]
+        self.entries += [group('g1'), group('g2')]
+        self.members = {group('g1'): [user('u1')], group('g2'): []}
+        # members which the caller is not allowed to write
+        self.refused = set(refused)
+        self.searches = []
+        # number of values of every modify operation
+        self.modifies = []
+
+    @property
+    def conn(self):
+        return self
+
+    def get_entries(self, base_dn, scope=ldap2.SCOPE_SUBTREE, filter=None,
+                    attrs_list=None, **kwargs):
+        self.searches.append(scope)
+        if scope == self.SCOPE_BASE:
+            found = [dn for dn in self.entries if dn == base_dn]
+        else:
+            assert scope == self.SCOPE_ONELEVEL
+            rdns = set(
+                (attr.lower(), value.lower())
+                for attr, value in re.findall(r'\((\w+)=([^()]*)\)', filter))
+            found = [dn for dn in self.entries
+                     if dn[1:] == base_dn and
+                     (dn[0].attr.lower(), dn[0].value.lower()) in rdns]
+        if not found:
+            raise errors.NotFound(reason='no such entry')
+        return [FakeEntry(dn, dict(member=self.members.get(dn, [])))
+                for dn in found]
+
+    def modify_s(self, dn, modlist):
+        (op, attr, values), = modlist
+        assert attr == 'member'
+        values = [DN(value.decode('utf-8')) for value in values]
+        self.modifies.append(len(values))
+        members = self.members[DN(dn)]
+        for value in values:
+            if value in self.refused:
+                raise ldap.INSUFFICIENT_ACCESS({
+                    'desc': 'Insufficient access',
+                    'info': "Insufficient 'write' privilege to the 'member' "
+                            "attribute of entry '%s'." % dn})
+        duplicate = len(set(values)) < len(values)
+        if op == ldap.MOD_ADD:
+            if duplicate or any(value in members for value in values):
+                raise ldap.TYPE_OR_VALUE_EXISTS({
+                    'desc': 'Type or value exists', 'info': ''})
+            members.extend(values)
+        else:
+            if duplicate or any(value not in members for value in values):
+                raise ldap.NO_SUCH_ATTRIBUTE({
+                    'desc': 'No such attribute', 'info': ''})
+            for value in values:
+                members.remove(value)
+
+
+def add_one_by_one(backend, dns, group_dn, allow_same=False):
+    failed = []
+    for dn in dns:
+        try:
+            backend.add_entry_to_group(dn, group_dn, allow_same=allow_same)
+        except errors.PublicError as e:
+            failed.append((dn, e))
+    return failed
+
+
+def remove_one_by_one(backend, dns, group_dn):
+    failed = []
+    for dn in dns:
+        try:
+            backend.remove_entry_from_group(dn, group_dn)
+        except errors.PublicError as e:
+            failed.append((dn, e))
+    return failed
+
+
+def failures(failed):
+    return [(dn, type(e), unicode(e)) for dn, e in failed]
+
+
+def compare_add(dns, group_dn, **kwargs):
+    allow_same = kwargs.pop('allow_same', False)
+    old, new = FakeLDAP(**kwargs), FakeLDAP(**kwargs)
+    old_failed = add_one_by_one(old, dns, group_dn, allow_same)
+    new_failed = new.add_entries_to_group(
+        dns, group_dn, allow_same=allow_same)
+    assert failures(new_failed) == failures(old_failed)
+    assert new.members == old.members
+    return failures(new_failed), new
+
+
+def compare_remove(dns, group_dn, members, **kwargs):
+    old, new = FakeLDAP(**kwargs), FakeLDAP(**kwargs)
+    old.members[group_dn] = list(members)
+    new.members[group_dn] = list(members)
+    old_failed = remove_one_by_one(old, dns, group_dn)
+    new_failed = new.remove_entries_from_group(dns, group_dn)
+    assert failures(new_failed) == failures(old_failed)
+    assert new.members == old.members
+    return failures(new_failed), new
+
+
+ALREADY_MEMBER = unicode(errors.AlreadyGroupMember())
+NOT_MEMBER = unicode(errors.NotGroupMember())
+
+
+@pytest.mark.tier0
+class TestAddEntriesToGroup(object):
+    def test_chunks(self):
+        dns = [user('u%d' % i) for i in range(2, 10)]
+        failed, backend = compare_add(dns, group('g2'))
+        assert failed == []
+        assert backend.members[group('g2')] == dns
+        assert backend.modifies == [3, 3, 2]
+        # existence is checked with one search per chunk
+        assert backend.searches == [ldap2.SCOPE_ONELEVEL] * 3
+
+    def test_fallback(self):
+        dns = [user('u%d' % i) for i in range(6)]
+        failed, backend = compare_add(dns, group('g1'))
+        assert failed == [
+            (user('u1'), errors.AlreadyGroupMember, ALREADY_MEMBER)]
+        # the first chunk is retried one member at a time
+        assert backend.modifies == [3, 1, 1, 1, 3]
+
+    def test_refused(self):
+        dns = [user('u%d' % i) for i in range(2, 6)]
+        failed, backend = compare_add(dns, group('g1'), refused=[user('u3')])
+        assert [f[:2] for f in failed] == [(user('u3'), errors.ACIError)]
+        assert u'Insufficient' in failed[0][2]
+        assert backend.members[group('g1')] == [
+            user('u1'), user('u2'), user('u4'), user('u5')]
+
+    def test_duplicates(self):
+        dns = [user('u2'), user('u3'), user('u2'), user('U3'), user('u4')]
+        failed, backend = compare_add(dns, group('g2'))
+        assert failed == [
+            (user('u2'), errors.AlreadyGroupMember, ALREADY_MEMBER),
+            (user('U3'), errors.AlreadyGroupMember, ALREADY_MEMBER),
+        ]
+        assert backend.modifies == [3]
+
+    def test_same_group(self):
+        dns = [group('g1'), user('u2')]
+        failed, _backend = compare_add(dns, group('g1'))
+        assert failed == [(group('g1'), errors.SameGroupError,
+                           unicode(errors.SameGroupError()))]
+
+        failed, backend = compare_add(dns, group('g1'), allow_same=True)
+        assert failed == []
+        assert group('g1') in backend.members[group('g1')]
+
+    def test_missing(self):
+        dns = [user('u2'), user('nosuchuser'), group('nosuchgroup'),
+               user('u3')]
+        failed, backend = compare_add(dns, group('g2'))
+        assert failed == [
+            (user('nosuchuser'), errors.NotFound, u'no such entry'),
+            (group('nosuchgroup'), errors.NotFound, u'no such entry'),
+        ]
+        assert backend.members[group('g2')] == [user('u2'), user('u3')]
+
+    def test_empty(self):
+        failed, backend = compare_add([], group('g2'))
+        assert failed == []
+        assert backend.modifies == []
+
+
+@pytest.mark.tier0
+class TestRemoveEntriesFromGroup(object):
+    members = [user('u%d' % i) for i in range(10)]
+
+    def test_chunks(self):
+        dns = [user('u%d' % i) for i in range(1, 9)]
+        failed, backend = compare_remove(dns, group('g1'), self.members)
+        assert failed == []
+        assert backend.members[group('g1')] == [user('u0'), user('u9')]
+        assert backend.modifies == [3, 3, 2]
+
+    def test_fallback(self):
+        dns = [user('u1'), group('g2'), user('u2'), user('u3')]
+        failed, backend = compare_remove(dns, group('g1'), self.members)
+        assert failed == [(group('g2'), errors.NotGroupMember, NOT_MEMBER)]
+        assert backend.modifies == [3, 1, 1, 1, 1]
+
+    def test_duplicates(self):
+        dns = [user('u1'), user('u2'), user('u1')]
+        failed, backend = compare_remove(dns, group('g1'), self.members)
+        assert failed == [(user('u1'), errors.NotGroupMember, NOT_MEMBER)]
+        assert backend.modifies == [2]
+
+    def test_refused(self):
+        dns = [user('u1'), user('u2')]
+        failed, _backend = compare_remove(
+            dns, group('g1'), self.members, refused=[user('u2')])
+        assert [f[:2] for f in failed] == [(user('u2'), errors.ACIError)]
+
+
+class FakeMemberObject(object):
+    def __init__(self, name, make_dn):
+        self.name = name
+        self.make_dn = make_dn
+
+    def get_dn(self, name):
+        if name == u'invalid':
+            raise errors.ValidationError(name=self.name, error=u'invalid')
+        return self.make_dn(name)
+
+    def get_primary_key_from_dn(self, dn):
+        return dn[0].value
+
+
+class FakeGroupObject(object):
+    attribute_members = {'member': ['user', 'group']}
+    default_attributes = ['cn']
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_dn(self, *keys, **options):
+        return group(keys[0])
+
+    def get_indirect_members(self, entry_attrs, attrs_list):
+        pass
+
+    def convert_attribute_members(self, entry_attrs, *keys, **options):
+        pass
+
+
+class FakeAPI(object):
+    def __init__(self, backend):
+        self.Object = {
+            'user': FakeMemberObject('user', user),
+            'group': FakeMemberObject('group', group),
+            ('group', '1'): FakeGroupObject(backend),
+        }
+
+
+class group_add_member(LDAPAddMember):
+    pass
+
+
+class group_remove_member(LDAPRemoveMember):
+    pass
+
+
+def old_execute(cmd, modify, *keys, **options):
+    """Member loop of LDAPAddMember/LDAPRemoveMember before bulk changes"""
+    member_dns, failed = cmd.get_member_dns(**options)
+    dn = cmd.obj.get_dn(*keys)
+    completed = 0
+    for attr, objs in member_dns.items():
+        for ldap_obj_name, m_dns in objs.items():
+            for m_dn in m_dns:
+                try:
+                    modify(m_dn, dn, attr)
+                except errors.PublicError as e:
+                    ldap_obj = cmd.api.Object[ldap_obj_name]
+                    failed[attr][ldap_obj_name].append((
+                        ldap_obj.get_primary_key_from_dn(m_dn),
+                        unicode(e),))
+                else:
+                    completed += 1
+    return dict(completed=completed, failed=failed)
+
+
+def compare_command(cls, members=None, **options):
+    old, new = FakeLDAP(), FakeLDAP()
+    if members is not None:
+        old.members[group('g1')] = list(members)
+        new.members[group('g1')] = list(members)
+    if cls is group_add_member:
+        modify = old.add_entry_to_group
+    else:
+        modify = old.remove_entry_from_group
+    expected = old_execute(cls(FakeAPI(old)), modify, u'g1', **options)
+    result = cls(FakeAPI(new)).execute(u'g1', **options)
+    assert result['completed'] == expected['completed']
+    assert result['failed'] == expected['failed']
+    assert new.members == old.members
+    assert result['result']['member'] == new.members[group('g1')]
+    return result
+
+
+@pytest.mark.tier0
+class TestModMemberCommands(object):
+    def test_add(self):
+        result = compare_command(
+            group_add_member,
+            user=[u'u0', u'u1', u'nosuchuser', u'invalid', u'u2', u'u0'],
+            group=[u'g2', u'g1', u'nosuchgroup'])
+        assert result['completed'] == 3
+        assert result['failed'] == dict(member=dict(
+            user=[(u'invalid', u"invalid 'user': invalid"),
+                  (u'u1', ALREADY_MEMBER),
+                  (u'nosuchuser', u'no such entry'),
+                  (u'u0', ALREADY_MEMBER)],
+            group=[(u'g1', unicode(errors.SameGroupError())),
+                   (u'nosuchgroup', u'no such entry')],
+        ))
+
+    def test_add_nothing(self):
+        result = compare_command(group_add_member)
+        assert result['completed'] == 0
+
+    def test_remove(self):
+        result = compare_command(
+            group_remove_member,
+            members=[user('u%d' % i) for i in range(5)] + [group('g2')],
+            user=[u'u0', u'u9', u'u1', u'u0', u'u2', u'u3'],
+            group=[u'g2', u'nosuchgroup'])
+        assert result['completed'] == 5
+        assert result['failed'] == dict(member=dict(
+            user=[(u'u9', NOT_MEMBER), (u'u0', NOT_MEMBER)],
+            group=[(u'nosuchgroup', NOT_MEMBER)],
+        ))
@@ -0,0 +1,219 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for `ipaserver.dns_zone_tree`
+"""
+
+import re
+
+import pytest
+
+from ipalib import errors
+from ipalib.request import context
+from ipapython.dn import DN
+from ipapython.dnsutil import DNSName
+from ipaserver import dns_zone_tree
+from ipaserver.dns_zone_tree import (
+    DNSZoneTree, get_dns_zone_tree, invalidate_dns_zone_tree)
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+CONTAINER_DNS = DN(('cn', 'dns'))
+DNS_DN = DN(CONTAINER_DNS, BASEDN)
+
+# name, forward, active
+ZONES = [
+    (u'.', False, True),
+    (u'example.test.', False, True),
+    (u'sub.example.test.', False, False),
+    (u'fw.example.test.', True, True),
+    (u'a.fw.example.test.', True, True),
+    (u'b.fw.example.test.', True, False),
+    (u'deep.x.sub.example.test.', True, True),
+    (u'Upper.Example.Test.', False, True),
+    (u'other.test.', True, True),
+]
+
+
+def zone_dn(name):
+    return DN(('idnsname', name), DNS_DN)
+
+
+def make_tree(zones=ZONES):
+    tree = DNSZoneTree()
+    for name, forward, active in zones:
+        tree.add_zone(DNSName(name), zone_dn(name), forward=forward,
+                      active=active)
+    return tree
+
+
+def linear_auth_zone(name, zones=ZONES):
+    """Reference implementation checking all zones"""
+    matches = [DNSName(z) for z, forward, active in zones
+               if active and not forward and name.is_subdomain(DNSName(z))]
+    if not matches:
+        return None
+    return max(matches, key=len)
+
+
+@pytest.mark.tier0
+class TestDNSZoneTree(object):
+    @pytest.mark.parametrize('name', [
+        u'host.example.test.', u'x.sub.example.test.', u'example.test.',
+        u'host.deep.x.sub.example.test.', u'HOST.UPPER.example.test.',
+        u'nowhere.', u'host.fw.example.test.'])
+    def test_auth_zone(self, name):
+        tree = make_tree()
+        name = DNSName(name)
+        assert tree.get_auth_zone(name) == linear_auth_zone(name)
+
+    def test_no_root_zone(self):
+        tree = make_tree(ZONES[1:])
+        assert tree.get_auth_zone(DNSName(u'nowhere.')) is None
+
+    def test_subtree_forward_zones(self):
+        tree = make_tree()
+
+        def find(name, child_zones_only=False):
+            return [
+                z.ToASCII() for z in tree.find_subtree_forward_zones(
+                    DNSName(name), child_zones_only=child_zones_only)]
+
+        assert find(u'fw.example.test.') == [
+            u'fw.example.test.', u'a.fw.example.test.']
+        assert find(u'fw.example.test.', child_zones_only=True) == [
+            u'a.fw.example.test.']
+        assert find(u'example.test.', child_zones_only=True) == [
+            u'fw.example.test.', u'a.fw.example.test.',
+            u'deep.x.sub.example.test.']
+        assert find(u'missing.') == []
+
+    def test_get_zone(self):
+        tree = make_tree()
+        zone = tree.get_zone(DNSName(u'FW.example.test.'))
+        assert zone.dn == zone_dn(u'fw.example.test.')
+        assert zone.forward
+        assert tree.get_zone(DNSName(u'x.sub.example.test.')) is None
+
+
+class FakeEntry(dict):
+    def __init__(self, dn, **attrs):
+        super(FakeEntry, self).__init__(attrs)
+        self.dn = dn
+
+    @property
+    def single_value(self):
+        return {k: v[0] for k, v in self.items()}
+
+
+class FakeLDAP(object):
+    SCOPE_ONELEVEL = 1
+
+    def __init__(self):
+        self.zones = {}
+        self.usn = 0
+        self.searches = 0
+        for name, forward, active in ZONES[1:]:
+            self.add_zone(name, forward, active)
+
+    def add_zone(self, name, forward=False, active=True):
+        self.usn += 1
+        self.zones[name] = FakeEntry(
+            zone_dn(name),
+            idnsname=[DNSName(name)],
+            objectclass=[u'top', u'idnsforwardzone' if forward
+                         else u'idnsZone'],
+            idnszoneactive=[u'TRUE' if active else u'FALSE'],
+            entryusn=[u'%d' % self.usn])
+
+    def get_entry(self, dn, attrs_list):
+        assert dn == DNS_DN
+        return FakeEntry(dn, numsubordinates=[u'%d' % len(self.zones)])
+
+    def find_entries(self, filter, attrs_list, base_dn, scope,
+                     size_limit=None):
+        self.searches += 1
+        entries = list(self.zones.values())
+        match = re.search(r'\(entryusn>=(\d+)\)', filter)
+        if match:
+            entries = [e for e in entries
+                       if int(e['entryusn'][0]) >= int(match.group(1))]
+        if not entries:
+            raise errors.NotFound(reason='no such entry')
+        return entries, False
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.Backend = type('Backend', (object,), {})()
+        self.Backend.ldap2 = FakeLDAP()
+        self.env = type('Env', (object,), {})()
+        self.env.basedn = BASEDN
+        self.env.container_dns = CONTAINER_DNS
+
+
+@pytest.mark.tier0
+class TestDNSZoneTreeCache(object):
+    @pytest.fixture(autouse=True)
+    def clean_cache(self, monkeypatch):
+        monkeypatch.setattr(dns_zone_tree, '_dns_zone_trees',
+                            dns_zone_tree.collections.OrderedDict())
+        invalidate_dns_zone_tree()
+        yield
+        invalidate_dns_zone_tree()
+
+    def test_cached(self):
+        api = FakeAPI()
+        ldap = api.Backend.ldap2
+        tree = get_dns_zone_tree(api)
+        assert tree.get_auth_zone(DNSName(u'host.example.test.')) == DNSName(
+            u'example.test.')
+        # cached for the rest of the request
+        assert get_dns_zone_tree(api) is tree
+        assert ldap.searches == 1
+
+        # validated by the next request
+        invalidate_dns_zone_tree()
+        assert get_dns_zone_tree(api) is tree
+        assert ldap.searches == 2
+
+        ldap.add_zone(u'new.example.test.')
+        invalidate_dns_zone_tree()
+        tree = get_dns_zone_tree(api)
+        assert tree.get_zone(DNSName(u'new.example.test.')) is not None
+        assert ldap.searches == 3
+
+        # modified zone
+        ldap.add_zone(u'new.example.test.', active=False)
+        invalidate_dns_zone_tree()
+        tree = get_dns_zone_tree(api)
+        assert not tree.get_zone(DNSName(u'new.example.test.')).active
+        assert ldap.searches == 5
+
+        # deleted zone
+        ldap.zones.pop(u'new.example.test.')
+        invalidate_dns_zone_tree()
+        tree = get_dns_zone_tree(api)
+        assert tree.get_zone(DNSName(u'new.example.test.')) is None
+
+    def test_principals(self):
+        api = FakeAPI()
+        context.principal = u'admin@IPA.TEST'
+        try:
+            tree = get_dns_zone_tree(api)
+            invalidate_dns_zone_tree()
+            context.principal = u'host/a.ipa.test@IPA.TEST'
+            assert get_dns_zone_tree(api) is not tree
+        finally:
+            del context.principal
+
+    def test_lookup_searches(self):
+        """
+        Authoritative zone lookups of 1000 names do a single search
+        """
+        api = FakeAPI()
+        for i in range(1000):
+            name = DNSName(u'host%d.sub.example.test.' % i)
+            tree = get_dns_zone_tree(api)
+            assert tree.get_auth_zone(name) == DNSName(u'example.test.')
+        assert api.Backend.ldap2.searches == 1
@@ -0,0 +1,34 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for parsing records of the dnsrecord_import command
+"""
+
+import pytest
+
+from ipalib import errors
+from ipaserver.plugins.dns import _split_import_record
+
+
+@pytest.mark.tier0
+class TestSplitImportRecord(object):
+    @pytest.mark.parametrize('record,expected', [
+        (u'www A 192.0.2.1', (u'www', None, u'A', u'192.0.2.1')),
+        (u'www 3600 IN A 192.0.2.1', (u'www', 3600, u'A', u'192.0.2.1')),
+        (u'www in 1h a 192.0.2.1', (u'www', 3600, u'A', u'192.0.2.1')),
+        (u'@ MX 10 mail.example.test.',
+         (u'@', None, u'MX', u'10 mail.example.test.')),
+        (u'txt.example.test. 60 TXT "two  words"',
+         (u'txt.example.test.', 60, u'TXT', u'"two  words"')),
+    ])
+    def test_split(self, record, expected):
+        assert _split_import_record(record) == expected
+
+    @pytest.mark.parametrize('record', [
+        u'www', u'www A', u'www 3600 IN', u'www 1x A 192.0.2.1',
+        u'www CH A 192.0.2.1',
+    ])
+    def test_invalid(self, record):
+        with pytest.raises(errors.ValidationError):
+            _split_import_record(record)
@@ -0,0 +1,149 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for concurrent certificate retrieval of `ipaserver.plugins.dogtag`
+"""
+
+import random
+import threading
+import time
+
+import pytest
+
+from ipalib import errors
+from ipalib.request import context, destroy_context
+from ipaserver.plugins import cert
+
+try:
+    from ipaserver.plugins import dogtag
+except errors.SkipPluginModule:
+    # ra_plugin is not dogtag
+    dogtag = None
+
+
+class FakeRA(object):
+    """RA backend with a stubbed get_certificate"""
+    def __init__(self, fail=()):
+        # the plugin is not bound to an API
+        self._ca_host = 'ca.ipa.test'
+        self.fail = set(fail)
+        self.requested = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def get_certificate(self, serial_number):
+        with self.lock:
+            self.requested.append(serial_number)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            # finish in a different order than requested
+            time.sleep(random.random() / 1000)
+            if serial_number in self.fail:
+                raise errors.CertificateOperationError(
+                    error=u'cannot retrieve %s' % serial_number)
+            return dict(serial_number=serial_number,
+                        certificate=u'cert%s' % serial_number)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def fake_ra():
+    if dogtag is None:
+        pytest.skip('dogtag is not the RA plugin')
+    return type('FakeDogtagRA', (FakeRA, dogtag.ra), {})
+
+
+@pytest.mark.tier0
+class TestGetCertificates(object):
+    def test_results(self, fake_ra):
+        ra = fake_ra()
+        serials = [str(i) for i in range(50)]
+        results = ra.get_certificates(iter(serials))
+        assert sorted(results) == sorted(serials)
+        for serial in serials:
+            assert results[serial] == dict(serial_number=serial,
+                                           certificate=u'cert%s' % serial)
+        assert sorted(ra.requested) == sorted(serials)
+        assert 1 < ra.max_active <= ra.max_concurrent_requests
+
+    def test_sequential(self, fake_ra, monkeypatch):
+        monkeypatch.setattr(fake_ra, 'max_concurrent_requests', 1)
+        ra = fake_ra()
+        serials = [str(i) for i in range(5)]
+        assert sorted(ra.get_certificates(serials)) == serials
+        assert ra.requested == serials
+        assert ra.max_active == 1
+
+    def test_empty(self, fake_ra):
+        assert fake_ra().get_certificates([]) == {}
+
+    def test_first_error(self, fake_ra):
+        serials = [str(i) for i in range(100)]
+        ra = fake_ra(fail=['3'])
+        with pytest.raises(errors.CertificateOperationError) as e:
+            ra.get_certificates(serials)
+        assert u'cannot retrieve 3' in str(e.value)
+        # no new requests are started after the failure
+        assert len(ra.requested) < len(serials)
+
+    def test_first_of_several_errors(self, fake_ra, monkeypatch):
+        monkeypatch.setattr(fake_ra, 'max_concurrent_requests', 1)
+        ra = fake_ra(fail=['2', '4'])
+        with pytest.raises(errors.CertificateOperationError) as e:
+            ra.get_certificates([str(i) for i in range(6)])
+        assert u'cannot retrieve 2' in str(e.value)
+        assert ra.requested == ['0', '1', '2']
+
+
+class FakeCommands(object):
+    def __init__(self):
+        self.calls = []
+
+    def ca_show(self, cacn, all=False):
+        self.calls.append(cacn)
+        return dict(result=dict(cn=[cacn]))
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.Command = FakeCommands()
+
+
+@pytest.mark.tier0
+class TestCAObjCache(object):
+    @pytest.fixture(autouse=True)
+    def clean_context(self):
+        destroy_context()
+        yield
+        destroy_context()
+
+    def test_cached_per_request(self):
+        api = FakeAPI()
+        ipa = cert.get_ca_obj(api, u'ipa')
+        assert cert.get_ca_obj(api, u'ipa') is ipa
+        assert cert.get_ca_obj(api, u'sub')['cn'] == [u'sub']
+        assert api.Command.calls == [u'ipa', u'sub']
+        assert sorted(context.ca_objs) == [u'ipa', u'sub']
+
+        # the next request retrieves the CA again
+        destroy_context()
+        cert.get_ca_obj(api, u'ipa')
+        assert api.Command.calls == [u'ipa', u'sub', u'ipa']
+
+    def test_not_cached_on_error(self):
+        class FailingCommands(FakeCommands):
+            def ca_show(self, cacn, all=False):
+                super(FailingCommands, self).ca_show(cacn, all)
+                raise errors.NotFound(reason=u'no such CA')
+
+        api = FakeAPI()
+        api.Command = FailingCommands()
+        for _i in range(2):
+            with pytest.raises(errors.NotFound):
+                cert.get_ca_obj(api, u'missing')
+        assert api.Command.calls == [u'missing', u'missing']
@@ -0,0 +1,251 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for indirect membership of search results in `baseldap`
+"""
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipapython.ipaldap import LDAPClient
+from ipaserver.plugins.baseldap import LDAPObject
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+MEMBER_ATTRS = ('member', 'memberuser', 'memberhost')
+
+
+def user(name):
+    return DN(('uid', name), ('cn', 'users'), ('cn', 'accounts'), BASEDN)
+
+
+def group(name):
+    return DN(('cn', name), ('cn', 'groups'), ('cn', 'accounts'), BASEDN)
+
+
+def hostgroup(name):
+    return DN(('cn', name), ('cn', 'hostgroups'), ('cn', 'accounts'),
+              BASEDN)
+
+
+def host(name):
+    return DN(('fqdn', name), ('cn', 'computers'), ('cn', 'accounts'),
+              BASEDN)
+
+
+def rule(name):
+    return DN(('ipauniqueid', name), ('cn', 'hbac'), BASEDN)
+
+
+# direct members of the groups
+GRAPH = {
+    group('g1'): dict(member=[user('u1')]),
+    group('g2'): dict(member=[group('g1'), user('u2')]),
+    # u1 is both a direct and an indirect member
+    group('g3'): dict(member=[group('g2'), user('u1')]),
+    group('g4'): dict(member=[user('u3'), group('g3')]),
+    group('g5'): dict(member=[user('u4')]),
+    hostgroup('hg1'): dict(member=[host('h1.ipa.test')]),
+    hostgroup('hg2'): dict(member=[hostgroup('hg1')]),
+    rule('r1'): dict(memberuser=[group('g2'), user('u4')],
+                     memberhost=[hostgroup('hg2')]),
+    rule('r2'): dict(memberuser=[user('u2')]),
+}
+ENTRIES = (
+    [user('u%d' % i) for i in range(1, 6)] +
+    [host('h1.ipa.test')] +
+    list(GRAPH)
+)
+
+
+def parse_filter(text, pos=0):
+    """Parse an LDAP filter into a predicate on attribute dicts"""
+    assert text[pos] == '('
+    op = text[pos + 1]
+    if op in '&|!':
+        pos += 2
+        subs = []
+        while text[pos] == '(':
+            sub, pos = parse_filter(text, pos)
+            subs.append(sub)
+        assert text[pos] == ')'
+        if op == '&':
+            return (lambda attrs: all(f(attrs) for f in subs)), pos + 1
+        elif op == '|':
+            return (lambda attrs: any(f(attrs) for f in subs)), pos + 1
+        return (lambda attrs: not subs[0](attrs)), pos + 1
+
+    end = text.index(')', pos)
+    attr, value = text[pos + 1:end].split('=', 1)
+    attr = attr.lower()
+    if value == '*':
+        return (lambda attrs: bool(attrs.get(attr))), end + 1
+    value = DN(value)
+    return (lambda attrs: value in attrs.get(attr, ())), end + 1
+
+
+class FakeEntry(object):
+    def __init__(self, dn, raw=None):
+        self.dn = dn
+        self.raw = raw or {}
+
+    def get(self, name, default=None):
+        if name not in self.raw:
+            return default
+        return [DN(v.decode('utf-8')) for v in self.raw[name]]
+
+
+class FakeLDAP(LDAPClient):
+    """Directory of the membership graph"""
+    member_chunk_size = 3
+
+    def __init__(self, graph, hidden=(), memberof_hidden=False):
+        self.attrs = {dn: {} for dn in ENTRIES}
+        for dn, members in graph.items():
+            for attr, values in members.items():
+                self.attrs[dn][attr] = list(values)
+        for dn in self.attrs:
+            memberof = self._memberof(graph, dn)
+            if memberof:
+                self.attrs[dn]['memberof'] = memberof
+        # entries which are not visible to the caller
+        self.hidden = set(hidden)
+        # memberof can be searched but not read
+        self.memberof_hidden = memberof_hidden
+        self.searches = []
+
+    @staticmethod
+    def _memberof(graph, dn):
+        memberof = []
+        todo = [dn]
+        while todo:
+            current = todo.pop()
+            for group_dn, members in graph.items():
+                if group_dn in memberof:
+                    continue
+                if any(current in members.get(attr, ())
+                       for attr in MEMBER_ATTRS):
+                    memberof.append(group_dn)
+                    todo.append(group_dn)
+        return memberof
+
+    def make_entry(self, dn, *args, **kwargs):
+        return FakeEntry(dn)
+
+    def get_raw_entry(self, dn, attrs_list):
+        entry = FakeEntry(dn)
+        for attr, values in self.attrs[dn].items():
+            if attr not in attrs_list:
+                continue
+            if attr == 'memberof' and self.memberof_hidden:
+                continue
+            entry.raw[attr] = [
+                str(value).encode('utf-8') for value in values]
+        return entry
+
+    def get_entries(self, base_dn, scope=LDAPClient.SCOPE_SUBTREE,
+                    filter=None, attrs_list=None, **kwargs):
+        self.searches.append((base_dn, scope))
+        match, end = parse_filter(filter)
+        assert end == len(filter)
+        result = [
+            self.get_raw_entry(dn, attrs_list)
+            for dn in ENTRIES
+            if dn not in self.hidden and
+            (dn == base_dn if scope == self.SCOPE_BASE
+             else dn.endswith(base_dn)) and
+            match(self.attrs[dn])
+        ]
+        if not result:
+            raise errors.NotFound(reason='no such entry')
+        return result
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.env = type('Env', (object,), {})()
+        self.env.basedn = BASEDN
+
+
+def make_obj(**kwargs):
+    obj = LDAPObject(FakeAPI())
+    obj.backend = FakeLDAP(GRAPH, **kwargs)
+    return obj
+
+
+def read_entries(obj, dns):
+    return [obj.backend.get_raw_entry(dn, ['member', 'memberof'])
+            for dn in dns]
+
+
+def memberships(entries):
+    return {
+        entry.dn: dict(
+            (attr, sorted(entry.raw.get(attr, [])))
+            for attr in ('member', 'memberindirect', 'memberof',
+                         'memberofindirect'))
+        for entry in entries
+    }
+
+
+def compare(obj, dns, attr):
+    old = read_entries(obj, dns)
+    for entry in old:
+        obj.get_indirect_members(entry, [attr])
+    new = read_entries(obj, dns)
+    obj.backend.searches = []
+    obj.get_indirect_members_batch(new, [attr])
+    assert memberships(new) == memberships(old)
+    return memberships(new), obj.backend.searches
+
+
+@pytest.mark.tier0
+class TestIndirectMembers(object):
+    def test_memberof(self):
+        result, searches = compare(make_obj(), ENTRIES, 'memberofindirect')
+        u1 = result[user('u1')]
+        assert u1['memberof'] == sorted(
+            str(dn).encode('utf-8') for dn in (group('g1'), group('g3')))
+        assert u1['memberofindirect'] == sorted(
+            str(dn).encode('utf-8')
+            for dn in (group('g2'), group('g4'), rule('r1')))
+        h1 = result[host('h1.ipa.test')]
+        assert h1['memberofindirect'] == sorted(
+            str(dn).encode('utf-8') for dn in (hostgroup('hg2'), rule('r1')))
+
+        # one search per chunk of the 15 entries and of their 9 groups,
+        # and a base search for g3 which has u1 both as a direct and as an
+        # indirect member
+        subtree = [s for s in searches if s[1] != LDAPClient.SCOPE_BASE]
+        assert len(subtree) == 5 + 3
+        assert (group('g3'), LDAPClient.SCOPE_BASE) in searches
+
+    def test_memberindirect(self):
+        result, _searches = compare(make_obj(), ENTRIES, 'memberindirect')
+        assert result[group('g4')]['memberindirect'] == sorted(
+            str(dn).encode('utf-8')
+            for dn in (group('g2'), group('g1'), user('u1'), user('u2')))
+        assert result[rule('r1')]['memberindirect'] == sorted(
+            str(dn).encode('utf-8')
+            for dn in (group('g1'), user('u1'), user('u2'), hostgroup('hg1'),
+                       host('h1.ipa.test')))
+
+    @pytest.mark.parametrize('attr', ['memberindirect', 'memberofindirect'])
+    def test_memberof_not_readable(self, attr):
+        compare(make_obj(memberof_hidden=True), ENTRIES, attr)
+
+    @pytest.mark.parametrize('attr', ['memberindirect', 'memberofindirect'])
+    def test_hidden_groups(self, attr):
+        compare(make_obj(hidden=[group('g2'), rule('r2')]), ENTRIES, attr)
+
+    @pytest.mark.parametrize('attr', ['memberindirect', 'memberofindirect'])
+    def test_single_entry(self, attr):
+        for dn in ENTRIES:
+            compare(make_obj(), [dn], attr)
+
+    def test_no_entries(self):
+        obj = make_obj()
+        obj.get_indirect_members_batch(
+            [], ['memberindirect', 'memberofindirect'])
+        assert obj.backend.searches == []
@@ -317,3 +317,21 @@ class test_LDAPEntry(object):
 
         e.raw['test'].append(b'second')
         assert e['test'] == ['not list', u'second']
+
+    def test_lazy_decode(self):
+        e = self.entry
+        e.raw['member'] = [b'cn=a', b'cn=b']
+        e.raw['description'] = [b'\xff']
+        # values are decoded only when accessed
+        assert e['member'] == [DN('cn=a'), DN('cn=b')]
+        assert e.raw['member'] == [b'cn=a', b'cn=b']
+        with pytest.raises(ValueError):
+            e['description']
+
+    def test_attribute_type_cache(self):
+        assert self.conn.get_attribute_type('member') is DN
+        assert self.conn.get_attribute_type('MEMBER') is DN
+        assert self.conn.get_attribute_type('2.5.4.31') is DN
+        assert self.conn.get_attribute_type('usercertificate;binary') is (
+            self.conn.get_attribute_type('userCertificate;binary'))
+        assert self.conn.get_attribute_type('nonexistent') is unicode
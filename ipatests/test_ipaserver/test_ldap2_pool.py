@@ -0,0 +1,80 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the per-process LDAP connection pool of the ldap2 backend
+"""
+
+import ldap
+import pytest
+
+from ipaserver.plugins.ldap2 import LDAPConnectionPool
+
+
+class FakeConnection(object):
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.unbound = False
+
+    def whoami_s(self):
+        if not self.alive:
+            raise ldap.SERVER_DOWN({'desc': "Can't contact LDAP server"})
+        return u'dn:uid=admin'
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+KEY = ('ldapi://', u'admin@EXAMPLE.TEST', '/tmp/ccache')
+OTHER_KEY = ('ldapi://', u'user@EXAMPLE.TEST', '/tmp/ccache2')
+
+
+@pytest.mark.tier0
+class TestLDAPConnectionPool(object):
+    def test_disabled(self):
+        pool = LDAPConnectionPool(max_size=0)
+        assert not pool.enabled
+
+    def test_hit_and_miss(self):
+        pool = LDAPConnectionPool(max_size=2)
+        conn = FakeConnection()
+        assert pool.acquire(KEY) is None
+        pool.release(KEY, conn)
+        assert pool.acquire(OTHER_KEY) is None
+        assert pool.acquire(KEY) is conn
+        stats = pool.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['size'] == 0
+
+    def test_max_size(self):
+        pool = LDAPConnectionPool(max_size=1)
+        first, second = FakeConnection(), FakeConnection()
+        pool.release(KEY, first)
+        pool.release(KEY, second)
+        assert first.unbound
+        assert pool.acquire(KEY) is second
+        assert pool.stats()['evictions'] == 1
+
+    def test_idle_eviction(self):
+        pool = LDAPConnectionPool(max_size=2, idle_timeout=-1)
+        conn = FakeConnection()
+        pool.release(KEY, conn)
+        assert pool.acquire(KEY) is None
+        assert conn.unbound
+
+    def test_dead_connection(self):
+        pool = LDAPConnectionPool(max_size=2, check_interval=-1)
+        conn = FakeConnection(alive=False)
+        pool.release(KEY, conn)
+        assert pool.acquire(KEY) is None
+        assert conn.unbound
+        assert pool.stats()['reconnects'] == 1
+
+    def test_clear(self):
+        pool = LDAPConnectionPool(max_size=2)
+        conn = FakeConnection()
+        pool.release(KEY, conn)
+        pool.clear()
+        assert conn.unbound
+        assert pool.acquire(KEY) is None
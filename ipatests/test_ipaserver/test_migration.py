@@ -0,0 +1,122 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for resuming an interrupted `migrate_ds`
+"""
+
+import pytest
+import six
+
+from ipalib import api
+from ipapython.dn import DN
+from ipaserver.plugins import migration
+
+if six.PY3:
+    unicode = str
+
+BASE_DN = DN(('ou', 'people'), ('dc', 'example'), ('dc', 'test'))
+
+
+def user_dn(i):
+    return DN(('uid', 'user%d' % i), BASE_DN)
+
+
+class FakeEntry(object):
+    def __init__(self, dn):
+        self.dn = dn
+
+
+class FakeDS(object):
+    """Source directory streaming entries in the given order"""
+    def __init__(self, dns):
+        self.dns = dns
+        self.searches = 0
+        self.active = 0
+
+    def iter_entries(self, filter, attrs_list, base_dn, scope, time_limit,
+                     page_size):
+        assert base_dn == BASE_DN
+        self.searches += 1
+        self.active += 1
+        try:
+            for dn in self.dns:
+                yield FakeEntry(dn)
+        finally:
+            self.active -= 1
+
+
+def iter_ds_entries(ds, count=0, last_dn=None):
+    cmd = migration.migrate_ds(api)
+    checkpoint = dict(count=count, last_dn=last_dn, done=False)
+    stats = dict(processed=0, skipped=0, seconds=0.0, rate=0.0)
+    entries = cmd._iter_ds_entries(
+        ds, u'(objectclass=person)', BASE_DN, migration.SCOPE_SUBTREE, 2,
+        checkpoint, stats)
+    return entries, stats
+
+
+def positions(entries):
+    return [(position, entry.dn) for position, entry in entries]
+
+
+@pytest.mark.tier0
+class TestIterDSEntries(object):
+    def test_no_checkpoint(self):
+        ds = FakeDS([user_dn(i) for i in range(1, 4)])
+        entries, stats = iter_ds_entries(ds)
+        assert positions(entries) == [(i, user_dn(i)) for i in range(1, 4)]
+        assert stats['skipped'] == 0
+        assert ds.searches == 1
+        assert ds.active == 0
+
+    def test_resume(self):
+        ds = FakeDS([user_dn(i) for i in range(1, 6)])
+        entries, stats = iter_ds_entries(ds, 2, unicode(user_dn(2)))
+        assert positions(entries) == [(i, user_dn(i)) for i in range(3, 6)]
+        assert stats['skipped'] == 2
+        assert ds.searches == 1
+        assert ds.active == 0
+
+    def test_resume_done(self):
+        # all entries were processed before the interruption
+        ds = FakeDS([user_dn(i) for i in range(1, 3)])
+        entries, stats = iter_ds_entries(ds, 2, unicode(user_dn(2)))
+        assert positions(entries) == []
+        assert stats['skipped'] == 2
+        assert ds.searches == 1
+
+    def test_reordered(self):
+        dns = [user_dn(i) for i in (2, 1, 3, 4)]
+        ds = FakeDS(dns)
+        entries, stats = iter_ds_entries(ds, 2, unicode(user_dn(2)))
+        assert positions(entries) == list(enumerate(dns, 1))
+        assert stats['skipped'] == 0
+        assert ds.searches == 2
+        assert ds.active == 0
+
+    def test_fewer_entries(self):
+        # entries were deleted in the source since the interruption
+        dns = [user_dn(i) for i in range(1, 3)]
+        ds = FakeDS(dns)
+        entries, stats = iter_ds_entries(ds, 4, unicode(user_dn(4)))
+        assert positions(entries) == list(enumerate(dns, 1))
+        assert stats['skipped'] == 0
+        assert ds.searches == 2
+        assert ds.active == 0
+
+    def test_empty_source(self):
+        ds = FakeDS([])
+        entries, stats = iter_ds_entries(ds, 4, unicode(user_dn(4)))
+        assert positions(entries) == []
+        assert stats['skipped'] == 0
+
+    def test_close(self):
+        ds = FakeDS([user_dn(i) for i in range(1, 6)])
+        entries, _stats = iter_ds_entries(ds, 2, unicode(user_dn(2)))
+        position, entry = next(entries)
+        assert (position, entry.dn) == (3, user_dn(3))
+        assert ds.active == 1
+        entries.close()
+        # the search is released when the migration stops early
+        assert ds.active == 0
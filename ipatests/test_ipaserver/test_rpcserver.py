@@ -28,6 +28,7 @@ import six
 
 from ipatests.util import assert_equal, raises, PluginTester
 from ipalib import errors
+from ipapython.version import API_VERSION
 from ipaserver import rpcserver
 
 if six.PY3:
@@ -261,3 +262,57 @@ class test_jsonserver(PluginTester):
         options = dict(givenname=u'John', sn='Doe')
         d = dict(method=u'user_add', params=(args, options), id=18)
         assert o.unmarshal(json.dumps(d)) == (u'user_add', args, options, 18)
+
+    def test_marshal(self):
+        """
+        Test the `ipaserver.rpcserver.jsonserver.marshal` method.
+        """
+        o, _api, _home = self.instance('Backend', in_server=True, debug=False)
+
+        # the response is streamed in chunks
+        result = dict(result=[dict(cn=(u'test',), data=(b'\x00\xff',))],
+                      count=1)
+        response = o.marshal(result, None, 18, API_VERSION)
+        assert not isinstance(response, bytes)
+        d = json.loads(b''.join(response).decode('utf-8'))
+        assert d['id'] == 18
+        assert d['error'] is None
+        assert d['result'] == dict(
+            result=[dict(cn=[u'test'], data=[{u'__base64__': u'AP8='}])],
+            count=1)
+
+        response = o.marshal(None, errors.NotFound(reason=u'no such entry'),
+                             18, API_VERSION)
+        d = json.loads(b''.join(response).decode('utf-8'))
+        assert d['result'] is None
+        assert d['error']['code'] == errors.NotFound.errno
+        assert d['error']['message'] == u'no such entry'
+
+    def test_unencodable_result(self, monkeypatch):
+        """
+        Test responses which cannot be serialized.
+        """
+        o, _api, _home = self.instance('Backend', in_server=True, debug=False)
+
+        def call(result):
+            monkeypatch.setattr(
+                type(o), 'wsgi_execute',
+                lambda self, environ: self.marshal(
+                    result, None, 18, API_VERSION))
+            s = StartResponse()
+            return s, o(dict(), s)
+
+        # the beginning of the response fails before the status is sent
+        s, response = call(dict(result=[object()], count=1))
+        assert s.status == rpcserver.HTTP_STATUS_SERVER_ERROR
+        assert list(response) == [
+            rpcserver.HTTP_STATUS_SERVER_ERROR.encode('utf-8')]
+
+        # a failure later in the response aborts it
+        entries = [dict(cn=(u'test%d' % i,)) for i in range(10000)]
+        s, response = call(dict(result=entries + [object()], count=10001))
+        assert s.status == rpcserver.HTTP_STATUS_SUCCESS
+        chunks = iter(response)
+        assert next(chunks).startswith(b'{')
+        with pytest.raises(TypeError):
+            list(chunks)
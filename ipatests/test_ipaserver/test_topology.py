@@ -0,0 +1,287 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for connectivity analysis of `ipaserver.topology`
+"""
+
+import random
+
+import pytest
+
+from ipalib import errors
+from ipalib.request import context
+from ipapython.dn import DN
+from ipapython.graph import Graph
+from ipaserver.topology import (
+    TopologyConnectivity, get_topology_connection_errors,
+    get_topology_graphs, invalidate_topology_graphs)
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+
+
+def bfs_connection_errors(graph, removed=()):
+    """Reference implementation traversing the graph from each master"""
+    connect_errors = []
+    masters = graph.vertices - set(removed)
+    for m in sorted(masters):
+        visited = graph.bfs(m, excluded=frozenset(removed))
+        not_visited = masters - visited
+        if not_visited:
+            connect_errors.append((m, visited, not_visited))
+    return connect_errors
+
+
+def normalize(errors):
+    return [(m, set(visited), set(not_visited))
+            for m, visited, not_visited in errors]
+
+
+def create_topology(num_masters, seed=0, disconnect=False):
+    """
+    Create a synthetic topology: a ring of masters with bidirectional
+    segments and a few random chords, each master has at most 4 segments.
+    With ``disconnect``, some segments are made one-way and the ring is cut.
+    """
+    rnd = random.Random(seed)
+    graph = Graph()
+    masters = ['master{:04d}.ipa.test'.format(i) for i in range(num_masters)]
+    for m in masters:
+        graph.add_vertex(m)
+
+    def add_segment(left, right):
+        graph.add_edge(left, right)
+        graph.add_edge(right, left)
+
+    for i, m in enumerate(masters):
+        add_segment(m, masters[(i + 1) % num_masters])
+    for _i in range(num_masters // 2):
+        left, right = rnd.sample(masters, 2)
+        if len(graph.get_heads(left)) < 4 and len(graph.get_heads(right)) < 4:
+            add_segment(left, right)
+
+    if disconnect and num_masters > 2:
+        graph.remove_edge(masters[0], masters[-1])
+        graph.remove_edge(masters[-1], masters[0])
+        for _i in range(max(1, num_masters // 3)):
+            tail = rnd.choice(masters)
+            heads = graph.get_heads(tail)
+            if heads:
+                graph.remove_edge(tail, rnd.choice(heads))
+
+    return graph, masters
+
+
+@pytest.mark.tier0
+class TestGraph(object):
+    def test_adjacency(self):
+        graph = Graph()
+        for v in 'abc':
+            graph.add_vertex(v)
+        graph.add_edge('a', 'b')
+        graph.add_edge('b', 'c')
+        graph.add_edge('c', 'b')
+        assert sorted(graph.edges) == [('a', 'b'), ('b', 'c'), ('c', 'b')]
+        assert sorted(graph.get_tails('b')) == ['a', 'c']
+        assert graph.get_heads('b') == ['c']
+
+        graph.remove_edge('c', 'b')
+        assert graph.get_tails('b') == ['a']
+        with pytest.raises(ValueError):
+            graph.remove_edge('c', 'b')
+
+        graph.remove_vertex('b')
+        assert graph.edges == []
+        assert graph.get_heads('a') == []
+        assert graph.get_tails('c') == []
+        assert graph.get_tails('b') == []
+
+    def test_strongly_connected_components(self):
+        graph = Graph()
+        for v in 'abcdef':
+            graph.add_vertex(v)
+        for tail, head in ('ab', 'ba', 'bc', 'cd', 'dc', 'de', 'ef', 'fe'):
+            graph.add_edge(tail, head)
+
+        components = graph.get_strongly_connected_components()
+        # components reachable from a component come before it
+        assert components == [{'e', 'f'}, {'c', 'd'}, {'a', 'b'}]
+
+        components = graph.get_strongly_connected_components(
+            excluded=frozenset(['d']))
+        assert sorted(sorted(c) for c in components) == [
+            ['a', 'b'], ['c'], ['e', 'f']]
+
+        reachable = graph.get_reachable()
+        assert reachable['a'] == set('abcdef')
+        assert reachable['c'] == set('cdef')
+        assert reachable['e'] == set('ef')
+
+
+@pytest.mark.tier0
+class TestConnectionErrors(object):
+    @pytest.mark.parametrize('seed', range(20))
+    def test_compare_with_bfs(self, seed):
+        graph, masters = create_topology(30, seed=seed, disconnect=True)
+        assert (normalize(get_topology_connection_errors(graph)) ==
+                bfs_connection_errors(graph))
+
+        removed = random.Random(seed).sample(masters, 3)
+        assert (
+            normalize(get_topology_connection_errors(graph, removed)) ==
+            bfs_connection_errors(graph, removed))
+        # the graph is not modified
+        assert graph.vertices == set(masters)
+
+    def test_connected(self):
+        graph, _masters = create_topology(30)
+        assert get_topology_connection_errors(graph) == []
+
+    def test_empty(self):
+        assert get_topology_connection_errors(Graph()) == []
+
+    def test_errors_after_masters_removal(self):
+        graph = Graph()
+        masters = ['master{}.ipa.test'.format(i) for i in range(6)]
+        for m in masters:
+            graph.add_vertex(m)
+        for i, m in enumerate(masters):
+            graph.add_edge(m, masters[(i + 1) % 6])
+            graph.add_edge(masters[(i + 1) % 6], m)
+
+        connectivity = TopologyConnectivity.__new__(TopologyConnectivity)
+        connectivity.graphs = {u'domain': graph}
+
+        errors = connectivity.errors_after_masters_removal(masters[:3:2])
+        assert errors == {
+            masters[0]: {u'domain': []},
+            masters[2]: {u'domain': []},
+        }
+
+        errors = connectivity.errors_after_masters_removal(
+            masters[:3:2], together=True)
+        assert [e[0] for e in errors[u'domain']] == [masters[1]] + masters[3:]
+        assert graph.vertices == set(masters)
+
+    @pytest.mark.parametrize('num_masters', [10, 100])
+    def test_large_topology(self, num_masters):
+        """
+        Connectivity of a larger topology and after removal of each of 10
+        masters matches traversal of the graph from each master.
+        """
+        graph, masters = create_topology(num_masters, disconnect=True)
+        assert (normalize(get_topology_connection_errors(graph)) ==
+                bfs_connection_errors(graph))
+        for m in masters[:10]:
+            assert (normalize(get_topology_connection_errors(graph, [m])) ==
+                    bfs_connection_errors(graph, [m]))
+
+
+class FakeEntry(dict):
+    def __init__(self, dn, **attrs):
+        super(FakeEntry, self).__init__(attrs)
+        self.dn = dn
+
+    @property
+    def single_value(self):
+        return {k: v[0] for k, v in self.items()}
+
+
+class FakeLDAP(object):
+    SCOPE_SUBTREE = 2
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.searches = 0
+
+    def get_entries(self, base_dn, scope, filter, attrs_list, **kwargs):
+        self.searches += 1
+        if not self.entries:
+            raise errors.NotFound(reason='no such entry')
+        return [e for e in self.entries if e.dn.endswith(base_dn)]
+
+
+class FakeAPI(object):
+    def __init__(self, entries):
+        self.Backend = type('Backend', (object,), {})()
+        self.Backend.ldap2 = FakeLDAP(entries)
+        self.env = type('Env', (object,), {})()
+        self.env.basedn = BASEDN
+        self.env.container_masters = DN(
+            ('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'))
+        self.env.container_topology = DN(
+            ('cn', 'topology'), ('cn', 'ipa'), ('cn', 'etc'))
+
+
+def master_entry(name, *suffixes):
+    return FakeEntry(
+        DN(('cn', name), ('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'),
+           BASEDN),
+        cn=[name],
+        iparepltopomanagedsuffix=list(suffixes))
+
+
+def suffix_entry(name, root):
+    return FakeEntry(
+        DN(('cn', name), ('cn', 'topology'), ('cn', 'ipa'), ('cn', 'etc'),
+           BASEDN),
+        cn=[name],
+        iparepltopoconfroot=[root])
+
+
+def segment_entry(suffix, left, right, direction=u'both'):
+    return FakeEntry(
+        DN(('cn', '{}-to-{}'.format(left, right)), ('cn', suffix),
+           ('cn', 'topology'), ('cn', 'ipa'), ('cn', 'etc'), BASEDN),
+        cn=[u'{}-to-{}'.format(left, right)],
+        iparepltoposegmentdirection=[direction],
+        iparepltoposegmentleftnode=[left],
+        iparepltoposegmentrightnode=[right])
+
+
+@pytest.mark.tier0
+class TestTopologyGraphs(object):
+    @pytest.fixture(autouse=True)
+    def clean_context(self):
+        invalidate_topology_graphs()
+        yield
+        invalidate_topology_graphs()
+
+    def test_load(self):
+        api = FakeAPI([
+            suffix_entry(u'domain', BASEDN),
+            suffix_entry(u'ca', DN(('o', 'ipaca'))),
+            master_entry(u'a.ipa.test', BASEDN, DN(('o', 'ipaca'))),
+            master_entry(u'b.ipa.test', BASEDN),
+            master_entry(u'c.ipa.test', BASEDN),
+            segment_entry(u'domain', u'a.ipa.test', u'b.ipa.test'),
+            segment_entry(u'domain', u'b.ipa.test', u'c.ipa.test',
+                          u'left-right'),
+        ])
+
+        graphs = get_topology_graphs(api)
+        assert sorted(graphs) == [u'ca', u'domain']
+        assert graphs[u'ca'].vertices == {u'a.ipa.test'}
+        assert graphs[u'domain'].vertices == {
+            u'a.ipa.test', u'b.ipa.test', u'c.ipa.test'}
+        assert sorted(graphs[u'domain'].edges) == [
+            (u'a.ipa.test', u'b.ipa.test'),
+            (u'b.ipa.test', u'a.ipa.test'),
+            (u'b.ipa.test', u'c.ipa.test'),
+        ]
+        connect_errors = get_topology_connection_errors(graphs[u'domain'])
+        assert [e[0] for e in connect_errors] == [u'c.ipa.test']
+
+        # cached for the rest of the request
+        assert get_topology_graphs(api) is graphs
+        assert TopologyConnectivity(api).graphs is graphs
+        assert api.Backend.ldap2.searches == 1
+
+        invalidate_topology_graphs()
+        assert get_topology_graphs(api) is not graphs
+        assert api.Backend.ldap2.searches == 2
+
+    def test_empty(self):
+        api = FakeAPI([])
+        assert get_topology_graphs(api) == {}
+        assert context.topology_graphs == {}
@@ -0,0 +1,275 @@
+#
+# Copyright (C) 2026  FreeIPA Contributors see COPYING for license
+#
+"""
+Tests for the concurrent master queries of `user_status`
+"""
+
+import contextlib
+import threading
+
+import pytest
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipaserver.plugins import user
+from ipaserver.plugins.ldap2 import LDAPConnectionPool
+
+BASEDN = DN(('dc', 'ipa'), ('dc', 'test'))
+USER_DN = DN(('uid', 'tuser'), ('cn', 'users'), ('cn', 'accounts'), BASEDN)
+LOCAL = u'master.ipa.test'
+
+
+class FakeMaster(object):
+    """LDAP server of another master"""
+    def __init__(self, host, failed=0, connect_error=None, error=None,
+                 gate=None):
+        self.host = host
+        self.failed = failed
+        self.connect_error = connect_error
+        self.error = error
+        # get_entry blocks until the gate is set
+        self.gate = gate
+        self.binds = 0
+        self.searches = 0
+
+    def entry(self):
+        return {'krbloginfailedcount': [u'%d' % self.failed],
+                'krblastfailedauth': [u'20260101000000Z']}
+
+
+class FakeConn(object):
+    def __init__(self, master):
+        self.master = master
+        self.options = {}
+        self.unbound = False
+
+    def set_option(self, option, value):
+        self.options[option] = value
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+def fake_client(masters, conns):
+    class FakeLDAPClient(object):
+        def __init__(self, ldap_uri):
+            assert ldap_uri.startswith('ldap://')
+            self._conn = FakeConn(masters[ldap_uri[len('ldap://'):]])
+            conns.append(self._conn)
+
+        @property
+        def conn(self):
+            return self._conn
+
+        @contextlib.contextmanager
+        def error_handler(self):
+            yield
+
+        def gssapi_bind(self):
+            master = self.conn.master
+            if master.connect_error is not None:
+                raise master.connect_error
+            master.binds += 1
+
+        def get_entry(self, dn, attrs_list):
+            assert dn == USER_DN
+            master = self.conn.master
+            master.searches += 1
+            if master.gate is not None:
+                assert master.gate.wait(10)
+            if master.error is not None:
+                raise master.error
+            return master.entry()
+
+        def unbind(self):
+            self.conn.unbind_s()
+
+        def close(self):
+            self._conn = None
+
+    return FakeLDAPClient
+
+
+class FakeBackend(object):
+    SCOPE_ONELEVEL = 1
+
+    def __init__(self, hosts, pool):
+        self.hosts = hosts
+        self.connection_pool = pool
+
+    def find_entries(self, filter, attrs_list, base_dn, scope):
+        return [{'cn': [host]} for host in self.hosts], False
+
+    def get_entry(self, dn, attrs_list):
+        assert dn == USER_DN
+        return FakeMaster(LOCAL, failed=9).entry()
+
+
+class FakeUser(object):
+    def get_either_dn(self, *keys, **options):
+        return USER_DN
+
+    def handle_not_found(self, *keys):
+        return errors.NotFound(reason=u'%s: user not found' % keys[0])
+
+    def get_preserved_attribute(self, entry, options):
+        pass
+
+
+class FakeObjects(object):
+    def __init__(self, backend):
+        self.user = FakeUser()
+        self.userstatus = type('userstatus', (object,), {})()
+        self.userstatus.backend = backend
+
+    def __getitem__(self, key):
+        assert key == ('userstatus', '1')
+        return self.userstatus
+
+
+class FakeAPI(object):
+    def __init__(self, backend, timeout):
+        self.Object = FakeObjects(backend)
+        self.env = type('Env', (object,), {})()
+        self.env.host = LOCAL
+        self.env.basedn = BASEDN
+        self.env.ldap_replica_timeout = timeout
+
+
+class UserStatus(object):
+    def __init__(self, monkeypatch, masters, pool_size=0, timeout=10):
+        self.masters = dict((m.host, m) for m in masters)
+        self.conns = []
+        self.pool = LDAPConnectionPool(max_size=pool_size)
+        hosts = [LOCAL] + [m.host for m in masters]
+        self.api = FakeAPI(FakeBackend(hosts, self.pool), timeout)
+        monkeypatch.setattr(user, 'api', self.api)
+        monkeypatch.setattr(user, 'LDAPClient',
+                            fake_client(self.masters, self.conns))
+        self.cmd = user.user_status(self.api)
+
+    def __call__(self):
+        return self.cmd.execute(u'tuser')
+
+
+@pytest.mark.tier0
+class TestUserStatus(object):
+    def test_order(self, monkeypatch):
+        masters = [
+            FakeMaster(u'm1.ipa.test', failed=1),
+            FakeMaster(u'm2.ipa.test', connect_error=errors.NetworkError(
+                uri='ldap://m2.ipa.test', error=u'connection refused')),
+            FakeMaster(u'm3.ipa.test', error=errors.DatabaseError(
+                desc=u'busy', info=u'')),
+            FakeMaster(u'm4.ipa.test', failed=4),
+        ]
+        # the first master answers last
+        masters[0].gate = threading.Event()
+        threading.Timer(0.1, masters[0].gate.set).start()
+
+        result = UserStatus(monkeypatch, masters)()
+        entries = result['result']
+        assert result['count'] == 5
+        assert [e['server'] for e in entries] == [
+            LOCAL,
+            u'm1.ipa.test',
+            u'm2.ipa.test failed: cannot connect to \'ldap://m2.ipa.test\': '
+            u'connection refused',
+            u'm3.ipa.test failed',
+            u'm4.ipa.test',
+        ]
+        assert entries[0]['krbloginfailedcount'] == [u'9']
+        assert entries[1]['krbloginfailedcount'] == [u'1']
+        assert entries[4]['krbloginfailedcount'] == [u'4']
+        assert entries[1]['krblastfailedauth'] == [u'2026-01-01T00:00:00Z']
+
+    def test_not_found(self, monkeypatch):
+        masters = [FakeMaster(u'm1.ipa.test'),
+                   FakeMaster(u'm2.ipa.test',
+                              error=errors.NotFound(reason=u'no entry'))]
+        with pytest.raises(errors.NotFound) as e:
+            UserStatus(monkeypatch, masters)()
+        assert u'tuser: user not found' in str(e.value)
+
+    def test_concurrent(self, monkeypatch):
+        # every master waits until all of them are queried
+        masters = [FakeMaster(u'm%d.ipa.test' % i) for i in range(5)]
+        lock = threading.Lock()
+        gate = threading.Event()
+        searching = []
+
+        class Gate(object):
+            def wait(self, timeout):
+                with lock:
+                    searching.append(None)
+                    if len(searching) == len(masters):
+                        gate.set()
+                return gate.wait(timeout)
+
+        for master in masters:
+            master.gate = Gate()
+
+        result = UserStatus(monkeypatch, masters)()
+        assert [e['server'] for e in result['result']] == (
+            [LOCAL] + [m.host for m in masters])
+
+    def test_timeout(self, monkeypatch):
+        fast = FakeMaster(u'fast.ipa.test', failed=1)
+        slow = FakeMaster(u'slow.ipa.test', failed=2,
+                          gate=threading.Event())
+        status = UserStatus(monkeypatch, [fast, slow], pool_size=10,
+                            timeout=0.2)
+        try:
+            entries = status()['result']
+        finally:
+            slow.gate.set()
+
+        assert [e['server'] for e in entries] == [
+            LOCAL,
+            u'fast.ipa.test',
+            u'slow.ipa.test failed: cannot connect to '
+            u'\'ldap://slow.ipa.test\': timed out',
+        ]
+        for conn in status.conns:
+            assert conn.options == {
+                user._ldap.OPT_NETWORK_TIMEOUT: 0.2,
+                user._ldap.OPT_TIMEOUT: 0.2,
+            }
+
+        for thread in threading.enumerate():
+            if thread.name == 'user_status slow.ipa.test':
+                thread.join(10)
+        # the connection of the late thread is not reused
+        slow_conn = [c for c in status.conns if c.master is slow]
+        assert len(slow_conn) == 1
+        assert slow_conn[0].unbound
+        assert status.pool.stats()['size'] == 1
+
+    def test_connection_reuse(self, monkeypatch):
+        masters = [FakeMaster(u'm1.ipa.test'), FakeMaster(u'm2.ipa.test')]
+        status = UserStatus(monkeypatch, masters, pool_size=10)
+        for _i in range(3):
+            entries = status()['result']
+            assert [e['server'] for e in entries] == (
+                [LOCAL] + [m.host for m in masters])
+
+        for master in masters:
+            assert master.binds == 1
+            assert master.searches == 3
+        stats = status.pool.stats()
+        assert stats['size'] == 2
+        assert stats['misses'] == 2
+        assert stats['hits'] == 4
+        assert not any(conn.unbound for conn in status.conns)
+
+    def test_no_pool(self, monkeypatch):
+        masters = [FakeMaster(u'm1.ipa.test'), FakeMaster(u'm2.ipa.test')]
+        status = UserStatus(monkeypatch, masters)
+        status()
+        status()
+        for master in masters:
+            assert master.binds == 2
+        # fresh connections are unbound after use
+        assert len(status.conns) == 4
+        assert all(conn.unbound for conn in status.conns)
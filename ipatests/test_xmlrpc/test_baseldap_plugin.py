@@ -221,3 +221,78 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_container_index():
+    basedn = DN('dc=example,dc=test')
+    users = DN('cn=users,cn=accounts', basedn)
+    groups = DN('cn=groups,cn=accounts', basedn)
+    accounts = DN('cn=accounts', basedn)
+
+    index = baseldap.ContainerIndex()
+    index.add(users, 'user')
+    index.add(groups, 'group')
+    index.add(accounts, 'account')
+    # containers added again keep their first value
+    index.add(users, 'other')
+
+    assert index.find(DN(('uid', 'admin'), users)) == 'user'
+    assert index.find(DN(('cn', 'admins'), groups)) == 'group'
+    assert index.find(DN(('CN', 'ADMINS'), 'CN=Groups,CN=Accounts',
+                         basedn)) == 'group'
+    assert index.find(DN(('cn', 'x'), ('cn', 'y'), groups)) == 'group'
+    assert index.find(DN(('cn', 'hosts'), accounts)) == 'account'
+    assert index.find(accounts) == 'account'
+    assert index.find(basedn) is None
+    assert index.find(DN('cn=other'), 'default') == 'default'
+
+    # when several containers match, the first added one wins
+    index = baseldap.ContainerIndex()
+    index.add(accounts, 'account')
+    index.add(users, 'user')
+    assert index.find(DN(('uid', 'admin'), users)) == 'account'
+
+
+@pytest.mark.tier0
+def test_search_cursor():
+    class FakePrimaryKey(object):
+        name = 'uid'
+
+    class FakeObject(object):
+        name = 'user'
+        primary_key = FakePrimaryKey()
+
+    class user_find(baseldap.LDAPSearch):
+        obj = FakeObject()
+
+    class OtherObject(FakeObject):
+        name = 'other'
+
+    class other_find(user_find):
+        obj = OtherObject()
+
+    class FakeLDAPClient(ipaldap.LDAPClient):
+        def __init__(self):
+            super(FakeLDAPClient, self).__init__('ldap://test',
+                                                 force_schema_updates=False)
+            self._has_schema = True
+            self._schema = None
+
+    conn = FakeLDAPClient()
+    entry = ipaldap.LDAPEntry(
+        conn, DN(('uid', 'tuser*'), 'cn=users,cn=accounts,dc=example,dc=test'),
+        uid=[u'tuser*'])
+
+    command = user_find('the api instance')
+    cursor = command.make_cursor(entry)
+    # the filter matches entries sorting after the last returned entry
+    assert (command.get_cursor_filter(conn, cursor) ==
+            u'(&(uid>=tuser\\2a)(!(uid=tuser\\2a)))')
+
+    for invalid in (u'garbage', u'', cursor[:-4]):
+        with pytest.raises(errors.ValidationError):
+            command.get_cursor_filter(conn, invalid)
+    # cursor of another command
+    with pytest.raises(errors.ValidationError):
+        other_find('the api instance').get_cursor_filter(conn, cursor)
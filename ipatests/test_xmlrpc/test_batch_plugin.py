@@ -31,6 +31,7 @@ import pytest
 
 group1 = u'testgroup1'
 first1 = u'John'
+nonexistent = u'notagroup'
 
 
 def deepequal_list(*expected):
@@ -49,6 +50,16 @@ def deepequal_list(*expected):
     return checker
 
 
+def timings(concurrent):
+    """Factory for a function that checks timings of a batch"""
+    def checker(got):
+        assert got['concurrent'] is concurrent
+        assert got['total'] >= 0
+        assert all(t >= 0 for t in got['methods'])
+        return True
+    return checker
+
+
 @pytest.mark.tier1
 class test_batch(Declarative):
 
@@ -63,6 +74,7 @@ class test_batch(Declarative):
             command=('batch', [dict(method=u'ping', params=([], {}))], {}),
             expected=dict(
                 count=1,
+                timings=Fuzzy(type=dict),
                 results=[
                     dict(summary=Fuzzy('IPA server version .*'), error=None),
                 ]
@@ -74,6 +86,7 @@ class test_batch(Declarative):
             command=('batch', [dict(method=u'ping', params=([], {}))] * 2, {}),
             expected=dict(
                 count=2,
+                timings=Fuzzy(type=dict),
                 results=[
                     dict(summary=Fuzzy('IPA server version .*'), error=None),
                     dict(summary=Fuzzy('IPA server version .*'), error=None),
@@ -90,6 +103,7 @@ class test_batch(Declarative):
             ], {}),
             expected=dict(
                 count=2,
+                timings=Fuzzy(type=dict),
                 results=deepequal_list(
                     dict(
                         value=group1,
@@ -123,6 +137,7 @@ class test_batch(Declarative):
             ], {}),
             expected=dict(
                 count=2,
+                timings=Fuzzy(type=dict),
                 results=[
                     dict(
                         error=u'%s: group not found' % group1,
@@ -153,6 +168,7 @@ class test_batch(Declarative):
             ], {}),
             expected=dict(
                 count=2,
+                timings=Fuzzy(type=dict),
                 results=deepequal_list(
                     dict(
                         error=u'%s: group not found' % group1,
@@ -199,9 +215,12 @@ class test_batch(Declarative):
                 # bad type
                 dict(method=u'group_add', params=([group1], dict(
                         description=u't', gidnumber=u'bad'))),
+                # args are not a list
+                dict(method=u'user_show', params=(5, dict())),
             ], {}),
             expected=dict(
-                count=7,
+                count=8,
+                timings=Fuzzy(type=dict),
                 results=deepequal_list(
                     dict(
                         error=u"unknown command 'nonexistent_ipa_command'",
@@ -260,6 +279,85 @@ class test_batch(Declarative):
                             error=Fuzzy(u'.*'),
                         ),
                     ),
+                    dict(
+                        error=u"invalid 'params': must contain a tuple "
+                              u"(list, dict)",
+                        error_name=u'ConversionError',
+                        error_code=3008,
+                        error_kw=dict(
+                            name=u'params',
+                            error=u'must contain a tuple (list, dict)',
+                        ),
+                    ),
+                ),
+            ),
+        ),
+
+        dict(
+            desc='Execute read-only methods concurrently',
+            command=('batch', [
+                dict(method=u'group_show', params=([group1], dict())),
+                dict(method=u'group_show', params=([nonexistent], dict())),
+                dict(method=u'group_find', params=([nonexistent], dict())),
+            ], dict(concurrent=True)),
+            expected=dict(
+                count=3,
+                timings=timings(True),
+                results=deepequal_list(
+                    dict(
+                        value=group1,
+                        summary=None,
+                        result=dict(
+                            cn=[group1],
+                            description=[u'Test desc 1'],
+                            gidnumber=[fuzzy_digits],
+                            dn=DN(('cn', 'testgroup1'),
+                                  ('cn', 'groups'),
+                                  ('cn', 'accounts'),
+                                  api.env.basedn),
+                            ),
+                        error=None),
+                    dict(
+                        error=u'%s: group not found' % nonexistent,
+                        error_name=u'NotFound',
+                        error_code=4001,
+                        error_kw=dict(
+                            reason=u'%s: group not found' % nonexistent,
+                        ),
+                    ),
+                    dict(
+                        count=0,
+                        truncated=False,
+                        summary=u'0 groups matched',
+                        result=[],
+                        error=None),
+                ),
+            ),
+        ),
+
+        dict(
+            desc='Execute batch with a write method sequentially',
+            command=('batch', [
+                dict(method=u'group_del', params=([group1], dict())),
+                dict(method=u'group_show', params=([group1], dict())),
+            ], dict(concurrent=True)),
+            expected=dict(
+                count=2,
+                timings=timings(False),
+                results=deepequal_list(
+                    dict(
+                        summary=u'Deleted group "%s"' % group1,
+                        result=dict(failed=[]),
+                        value=[group1],
+                        error=None),
+                    dict(
+                        error=u'%s: group not found' % group1,
+                        error_name=u'NotFound',
+                        error_code=4001,
+                        error_kw=dict(
+                            reason=u'%s: group not found' % group1,
+                        ),
+                    ),
                 ),
             ),
         ),
@@ -28,6 +28,7 @@ from ipapython.dnsutil import DNSName
 from ipapython.dn import DN
 from ipatests.test_xmlrpc import objectclasses
 from ipatests.test_xmlrpc.xmlrpc_test import Declarative, fuzzy_digits
+from ipatests.util import Fuzzy
 import pytest
 
 try:
@@ -213,6 +214,21 @@ revname2_dnsname = DNSName(revname2)
 revname2_ip = revzone1_ipprefix + revname2
 revname2_dn = DN(('idnsname',revname2), revzone1_dn)
 
+import1 = u'testimport1'
+import1_dnsname = DNSName(import1)
+import1_dn = DN(('idnsname', import1), zone1_dn)
+import1_records = [
+    u'%s IN A 172.16.29.201' % import1,
+    u'%s TXT "imported record"' % import1,
+    u'%s A 172.16.29.999' % import1,
+    u'%s CAA 0 issue "ca.test"' % import1,
+]
+import2 = u'testimport2'
+import2_records = [
+    u'%s CNAME %s' % (import2, import1),
+    u'%s.%s IN A 172.16.29.202' % (import2, zone1_absolute),
+]
+
 cname = u'testcnamerec'
 cname_dnsname = DNSName(cname)
 cname_dn = DN(('idnsname',cname), zone1_dn)
@@ -1431,6 +1447,59 @@ class test_dns(Declarative):
         ),
 
 
+        dict(
+            desc='Import records to zone %r using dnsrecord_import' % (zone1),
+            command=('dnsrecord_import', [zone1,
+                                          import1_records + import2_records],
+                     {}),
+            expected={
+                'completed': 2,
+                'failed': {
+                    'dnsrecord': [
+                        (import1_records[2], Fuzzy(u'^invalid ')),
+                        (import1_records[3],
+                         u'invalid \'records\': unsupported DNS record type '
+                         u'"CAA"'),
+                        (import2_records[0],
+                         u"invalid 'cnamerecord': CNAME record is not "
+                         u"allowed to coexist with any other record "
+                         u"(RFC 1034, section 3.6.2)"),
+                        (import2_records[1],
+                         u"invalid 'cnamerecord': CNAME record is not "
+                         u"allowed to coexist with any other record "
+                         u"(RFC 1034, section 3.6.2)"),
+                    ],
+                },
+            },
+        ),
+
+
+        dict(
+            desc='Show imported record %r in zone %r' % (import1, zone1),
+            command=('dnsrecord_show', [zone1, import1], {}),
+            expected={
+                'value': import1_dnsname,
+                'summary': None,
+                'result': {
+                    'dn': import1_dn,
+                    'idnsname': [import1_dnsname],
+                    'arecord': [u'172.16.29.201'],
+                    'txtrecord': [u'"imported record"'],
+                },
+            },
+        ),
+
+
+        dict(
+            desc='Import already present record to zone %r' % (zone1),
+            command=('dnsrecord_import', [zone1, import1_records[:1]], {}),
+            expected={
+                'completed': 1,
+                'failed': {'dnsrecord': []},
+            },
+        ),
+
+
         dict(
             desc='Try to add unresolvable absolute NS record to %r using dnsrecord_add' % (name_ns),
             command=('dnsrecord_add', [zone1, name_ns], {'nsrecord': absnxname}),
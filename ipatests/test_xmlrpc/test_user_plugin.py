@@ -29,7 +29,7 @@ import datetime
 import ldap
 import re
 
-from ipalib import api, errors
+from ipalib import api, errors, messages
 from ipatests.test_xmlrpc import objectclasses
 from ipatests.util import (
     assert_deepequal, assert_equal, assert_not_equal, raises)
@@ -144,6 +144,16 @@ def group(request):
     return tracker.make_fixture(request)
 
 
+@pytest.fixture(scope='class')
+def paged_users(request):
+    trackers = [
+        UserTracker(name=u'tpaged%d' % i, givenname=u'Paged',
+                    sn=u'User%d' % i)
+        for i in range(5)
+    ]
+    return [tracker.make_fixture(request) for tracker in trackers]
+
+
 @pytest.mark.tier1
 class TestNonexistentUser(XMLRPC_test):
     def test_retrieve_nonexistent(self, user):
@@ -280,6 +290,51 @@ class TestFind(XMLRPC_test):
         user.enable()
 
 
+@pytest.mark.tier1
+class TestPagedFind(XMLRPC_test):
+    @staticmethod
+    def get_cursor(result):
+        for message in result.get('messages', ()):
+            if message['code'] == messages.SearchResultPaged.errno:
+                return message['data']['cursor']
+        return None
+
+    def find_pages(self, page_size, **options):
+        pages = []
+        while True:
+            result = api.Command['user_find'](
+                u'tpaged', page_size=page_size, pkey_only=True, **options)
+            assert not result['truncated']
+            assert result['count'] == len(result['result'])
+            pages.append([e['uid'][0] for e in result['result']])
+            options['cursor'] = self.get_cursor(result)
+            if options['cursor'] is None:
+                return pages
+
+    def test_paged_find(self, paged_users):
+        """ Walk user-find --page-size across several pages """
+        for user in paged_users:
+            user.ensure_exists()
+        uids = sorted(user.uid for user in paged_users)
+
+        # entries are sorted by uid and returned exactly once
+        assert self.find_pages(2) == [uids[0:2], uids[2:4], uids[4:]]
+        # the page size overrides the size limit
+        assert self.find_pages(3, sizelimit=1) == [uids[0:3], uids[3:]]
+        assert self.find_pages(5) == [uids]
+
+    def test_cursor_without_page_size(self, paged_users):
+        """ Try to continue user-find without --page-size """
+        for user in paged_users:
+            user.ensure_exists()
+        cursor = self.get_cursor(
+            api.Command['user_find'](u'tpaged', page_size=1))
+        assert cursor is not None
+        with raises_exact(errors.ValidationError(
+                name='cursor', error=u'page size is required')):
+            api.Command['user_find'](u'tpaged', cursor=cursor)
+
+
 @pytest.mark.tier1
 class TestActive(XMLRPC_test):
     def test_disable(self, user):